@@ -0,0 +1,2 @@
+# Importing tools puts the helper layer on sys.path, same as for the operational tools
+from tools import ROOT
@@ -0,0 +1,71 @@
+# Compares two benchmark result files, e.g. from the base branch and from a change:
+#
+#   python -m benchmarks.compare baseline.json results.json --threshold 1.2
+#
+# Exits non-zero when a file/target got slower, fetched more bytes or made more calls
+# than the threshold allows.
+import argparse
+import json
+import sys
+
+
+def _index(report):
+    return {(r['file'], r['target']): r for r in report['results']}
+
+
+def _total_calls(result):
+    return sum(result['s3_calls'].values()) + sum(result['dynamodb_calls'].values())
+
+
+def _metrics(result):
+    latency = result['latency_ms'] or {}
+    return {
+        'median_ms': latency.get('median'),
+        'peak_alloc_bytes': result['peak_alloc_bytes'],
+        's3_bytes': result['s3_bytes'],
+        'calls': _total_calls(result),
+    }
+
+
+def compare(baseline, current, threshold=1.2):
+    # Returns rows of (file, target, metric, old, new, ratio, regressed)
+    rows = []
+    old_results = _index(baseline)
+    for key, result in sorted(_index(current).items()):
+        if key not in old_results:
+            continue
+        old_metrics = _metrics(old_results[key])
+        for metric, new in _metrics(result).items():
+            old = old_metrics[metric]
+            if old is None or new is None:
+                continue
+            ratio = new / old if old else (1.0 if not new else float('inf'))
+            # Latency gets the threshold as noise margin; bytes and calls are exact
+            limit = threshold if metric in ('median_ms', 'peak_alloc_bytes') else 1.0
+            rows.append((*key, metric, old, new, round(ratio, 3), ratio > limit))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"{baseline.get('commit')} -> {current.get('commit')}")
+    regressions = 0
+    for file, target, metric, old, new, ratio, regressed in compare(baseline, current, args.threshold):
+        marker = 'REGRESSION' if regressed else ''
+        regressions += regressed
+        print(f"{file:40} {target:18} {metric:16} {old:>14} {new:>14} {ratio:>8} {marker}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# Synthetic objects for the benchmark suite. Every generator streams to disk, so the
+# multi-GB tiers never have to fit in memory.
+import csv
+import gzip
+import os
+import zipfile
+
+SIZE_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+# Columns of the narrow files; wide files get WIDE_COLUMNS generated names
+COLUMNS = ['id', 'customer', 'amount', 'currency', 'created_at', 'comment']
+WIDE_COLUMNS = 10000
+
+
+def parse_size(label):
+    # '64MB' -> 67108864
+    label = label.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if label.endswith(unit):
+            return int(float(label[:-len(unit)]) * factor)
+    return int(label)
+
+
+def _batch_rows(target_bytes, wide=False):
+    # Small tiers must not overshoot their size by a whole batch
+    if wide:
+        return 10
+    return max(1, min(1000, target_bytes // 4096))
+
+
+def _row(i, width=None):
+    if width:
+        return [str((i * 31 + c) % 1000) for c in range(width)]
+    return [str(i), f"customer_{i % 5000}", f"{(i * 37) % 100000 / 100:.2f}", 'EUR',
+            f"2024-01-{i % 28 + 1:02d}T12:{i % 60:02d}:00", f"note {i}"]
+
+
+def _write_rows(f, target_bytes, delimiter, columns, width=None):
+    writer = csv.writer(f, delimiter=delimiter, lineterminator='\n')
+    writer.writerow(columns)
+    i = 0
+    batch = _batch_rows(target_bytes, bool(width))
+    # Write in batches and check the size between them, the file position is cheap to read
+    while f.tell() < target_bytes:
+        writer.writerows(_row(n, width) for n in range(i, i + batch))
+        i += batch
+
+
+def _write_text(path, target_bytes, delimiter=',', columns=COLUMNS, width=None):
+    with open(path, 'w', newline='') as f:
+        _write_rows(f, target_bytes, delimiter, columns, width)
+
+
+def _write_gz(path, target_bytes):
+    # target_bytes is the compressed size; the text behind it is generated until it is reached
+    with open(path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+        writer = csv.writer(_TextSink(gz), lineterminator='\n')
+        writer.writerow(COLUMNS)
+        i = 0
+        batch = _batch_rows(target_bytes)
+        while raw.tell() < target_bytes:
+            writer.writerows(_row(n) for n in range(i, i + batch))
+            i += batch
+
+
+class _TextSink:
+    # csv.writer needs a text file; gzip/zip members want bytes
+    def __init__(self, binary):
+        self.binary = binary
+
+    def write(self, text):
+        self.binary.write(text.encode())
+
+
+def _write_zip(path, target_bytes):
+    # One CSV member, which is what the ZIP reader looks at
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        with zf.open('data/rows.csv', 'w', force_zip64=target_bytes > 2 ** 31) as member:
+            writer = csv.writer(_TextSink(member), lineterminator='\n')
+            writer.writerow(COLUMNS)
+            i = 0
+            batch = _batch_rows(target_bytes)
+            while os.path.getsize(path) < target_bytes:
+                writer.writerows(_row(n) for n in range(i, i + batch))
+                i += batch
+
+
+def _write_parquet(path, target_bytes, width=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    names = [f"c{c}" for c in range(width)] if width else COLUMNS
+    batch_rows = 10 if width else max(10, min(100000, target_bytes // 64))
+    writer = None
+    i = 0
+    try:
+        while writer is None or os.path.getsize(path) < target_bytes:
+            rows = [_row(n, width) for n in range(i, i + batch_rows)]
+            table = pa.table({name: [r[c] for r in rows] for c, name in enumerate(names)})
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            # Every batch is its own row group, so the footer grows with the file like real drops
+            writer.write_table(table)
+            i += batch_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# kind -> (key suffix, generator(path, target_bytes))
+KINDS = {
+    'csv': ('.csv', lambda path, size: _write_text(path, size)),
+    'psv': ('.psv', lambda path, size: _write_text(path, size, delimiter='|')),
+    'gz': ('.csv.gz', _write_gz),
+    'zip': ('.zip', _write_zip),
+    'parquet': ('.parquet', _write_parquet),
+    'wide_csv': ('.csv', lambda path, size: _write_text(
+        path, size, columns=[f"c{c}" for c in range(WIDE_COLUMNS)], width=WIDE_COLUMNS)),
+    'wide_parquet': ('.parquet', lambda path, size: _write_parquet(path, size, width=WIDE_COLUMNS)),
+}
+
+
+def corpus_file(corpus_dir, kind, size_label):
+    # Generates the file once and reuses it on later runs
+    suffix, generate = KINDS[kind]
+    path = os.path.join(corpus_dir, f"{kind}_{size_label}{suffix}")
+    if not os.path.exists(path):
+        os.makedirs(corpus_dir, exist_ok=True)
+        tmp = path + '.tmp'
+        generate(tmp, parse_size(size_label))
+        os.replace(tmp, path)
+    return path
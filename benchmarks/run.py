@@ -0,0 +1,239 @@
+# Offline benchmark of header extraction and the MetaData Lambda handler.
+#
+#   python -m benchmarks.run --sizes 1KB 1MB 64MB --output results.json
+#   python -m benchmarks.run --kinds wide_csv wide_parquet --sizes 1MB --repeat 5
+#   python -m benchmarks.compare baseline.json results.json
+#
+# Runs against moto by default, or any S3/DynamoDB stand-in with --endpoint-url. Latency
+# against an in-process fake is not S3 latency; S3 bytes and API call counts are exact
+# and are what I/O changes should be judged on. Peak RSS is the process high-water mark
+# (moto keeps objects in memory, so it includes the corpus), peak_alloc_bytes is the
+# Python heap peak while the target ran.
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+import boto3
+
+from benchmarks import ROOT
+from benchmarks.corpus import KINDS, corpus_file, parse_size
+from tools import local_aws
+from infra.file_metadata_tracker.config import *
+from helpers.fileparsing_helper import read_file_header
+from helpers.idempotency_helper import SeenCache
+
+BUCKET = 'benchmark-corpus'
+DEFAULT_SIZES = ['1KB', '1MB', '64MB']
+TARGETS = ['read_file_header', 'metadata_handler']
+
+
+class CallCounter:
+    # Counts API calls and GetObject payload bytes through botocore's event hooks
+    def __init__(self):
+        self.calls = Counter()
+        self.s3_bytes = 0
+
+    def attach(self, client):
+        service = client.meta.service_model.service_name
+        client.meta.events.register(f"before-call.{service}", self._before_call)
+        client.meta.events.register(f"after-call.{service}.GetObject", self._after_get)
+
+    def _before_call(self, model, **kwargs):
+        self.calls[f"{model.service_model.service_name}.{model.name}"] += 1
+
+    def _after_get(self, parsed, **kwargs):
+        self.s3_bytes += parsed.get('ContentLength') or 0
+
+    def reset(self):
+        self.calls.clear()
+        self.s3_bytes = 0
+
+    def snapshot(self):
+        by_service = {'s3': {}, 'dynamodb': {}}
+        for name, count in self.calls.items():
+            service, operation = name.split('.', 1)
+            by_service.setdefault(service, {})[operation] = count
+        return by_service
+
+
+def load_metadata_lambda():
+    # Same module the Lambda runs, with the table environment its stack gives it, set only
+    # while it loads. The column index and rollups stay off so results remain comparable
+    return local_aws.load_lambda('MetaData_lambda/metadata_extractor.py',
+                                 {ENV_COLUMN_INDEX_TABLE: '', ENV_ROLLUP_TABLE: ''})
+
+
+def s3_event(bucket, key, size, etag):
+    return {'detail': {'bucket': {'name': bucket}, 'object': {'key': key, 'size': size, 'etag': etag}}}
+
+
+def run_read_file_header(s3, bucket, key):
+    # The original path: download the whole object, then parse it
+    file_data = s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+    return read_file_header(file_data, key)
+
+
+def _measure(function, repeat, before=None):
+    # Returns (timings in ms, peak traced bytes, last result). The traced run is extra, so
+    # tracemalloc's overhead never shows up in the timings
+    timings = []
+    result = None
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    if before:
+        before()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return timings, peak, result
+
+
+def benchmark_file(s3, handler_module, counter, bucket, key, size, repeat, targets):
+    etag = s3.head_object(Bucket=bucket, Key=key)['ETag']
+    latest = handler_module.tables.latest
+
+    def fresh_state():
+        # Every run must do the full pipeline, not hit the duplicate check
+        latest.delete_item(Key={'filepath': f"{bucket}/{key}"})
+        handler_module.seen_events = SeenCache()
+        counter.reset()
+
+    functions = {
+        'read_file_header': (lambda: run_read_file_header(s3, bucket, key), counter.reset),
+        'metadata_handler': (lambda: handler_module.metadata_handler(s3_event(bucket, key, size, etag), None),
+                             fresh_state),
+    }
+
+    results = []
+    for target in targets:
+        function, before = functions[target]
+        try:
+            timings, peak_alloc, outcome = _measure(function, repeat, before)
+            # Counters hold the traced run, which does the same work as the timed ones
+            calls = counter.snapshot()
+            status = outcome.get('status') if isinstance(outcome, dict) else 'ok'
+            error = None
+        except Exception as e:
+            timings, peak_alloc, calls, status, error = [], None, counter.snapshot(), 'error', str(e)
+
+        results.append({
+            'target': target,
+            'status': status,
+            'error': error,
+            'latency_ms': {
+                'min': round(min(timings), 3),
+                'median': round(statistics.median(timings), 3),
+                'max': round(max(timings), 3),
+            } if timings else None,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'peak_alloc_bytes': peak_alloc,
+            's3_bytes': counter.s3_bytes,
+            's3_calls': calls.get('s3', {}),
+            'dynamodb_calls': calls.get('dynamodb', {}),
+        })
+    return results
+
+
+def run_benchmarks(s3, dynamodb, corpus_dir, kinds, sizes, repeat=3, targets=TARGETS, bucket=BUCKET):
+    handler_module = load_metadata_lambda()
+    counter = CallCounter()
+    for client in (s3, handler_module.s3, handler_module.dynamodb.meta.client):
+        counter.attach(client)
+
+    results = []
+    for kind in kinds:
+        for size_label in sizes:
+            path = corpus_file(corpus_dir, kind, size_label)
+            key = f"bench/{os.path.basename(path)}"
+            # upload_file switches to multipart for large files, like real producers
+            s3.upload_file(path, bucket, key)
+            size = os.path.getsize(path)
+            print(f"{kind} {size_label}: {key} ({size} bytes)")
+            for entry in benchmark_file(s3, handler_module, counter, bucket, key, size, repeat, targets):
+                results.append({'file': key, 'kind': kind, 'size_label': size_label,
+                                'object_bytes': size, **entry})
+            s3.delete_object(Bucket=bucket, Key=key)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, args):
+    return {
+        'commit': _git_commit(),
+        'created': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'backend': args.endpoint_url or 'moto',
+        'repeat': args.repeat,
+        'results': results,
+    }
+
+
+def _setup(s3, dynamodb):
+    s3.create_bucket(Bucket=BUCKET)
+    local_aws.create_tables(dynamodb)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark header extraction and metadata_handler")
+    parser.add_argument('--kinds', nargs='+', default=list(KINDS), choices=list(KINDS))
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES,
+                        help="Object sizes, e.g. 1KB 1MB 64MB 1GB 5GB")
+    parser.add_argument('--targets', nargs='+', default=TARGETS, choices=TARGETS)
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per file and target")
+    parser.add_argument('--corpus-dir', default=os.path.join(ROOT, '.benchmarks', 'corpus'))
+    parser.add_argument('--output', default=os.path.join(ROOT, '.benchmarks', 'results.json'))
+    parser.add_argument('--endpoint-url', help="Local S3/DynamoDB stand-in instead of moto")
+    args = parser.parse_args(argv)
+    for size in args.sizes:
+        parse_size(size)
+
+    # The Lambda module builds its own clients at import time, so region and endpoint are
+    # set for the run and restored afterwards
+    env = {'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'us-east-1')}
+    if args.endpoint_url:
+        env['AWS_ENDPOINT_URL'] = args.endpoint_url
+    with local_aws.environment(env):
+        if args.endpoint_url:
+            s3 = boto3.client('s3')
+            dynamodb = boto3.resource('dynamodb')
+            _setup(s3, dynamodb)
+            results = run_benchmarks(s3, dynamodb, args.corpus_dir, args.kinds, args.sizes,
+                                     repeat=args.repeat, targets=args.targets)
+        else:
+            from moto import mock_aws
+            with mock_aws():
+                s3 = boto3.client('s3')
+                dynamodb = boto3.resource('dynamodb')
+                _setup(s3, dynamodb)
+                results = run_benchmarks(s3, dynamodb, args.corpus_dir, args.kinds, args.sizes,
+                                         repeat=args.repeat, targets=args.targets)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report(results, args), f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,102 @@
 import os
-import json
 from datetime import datetime
 import boto3
 from botocore.exceptions import ClientError
-
-dynamodb = boto3.resource('dynamodb')
+from helpers.client_helper import client_config
+from helpers.fileparsing_helper import split_extension
+from helpers.index_helper import update_column_index
+from helpers.rollup_helper import RollupBuffer, apply_rollups, rollup_deltas
+from helpers.schema_helper import with_schema
+from helpers.metrics_helper import instrument_client, log_event, start_invocation
+from helpers.storage_helper import delete_latest, delete_latest_batch, normalize_sequencer
+
+# Client-side rate limiting when batched deletes get throttled; set here rather than through
+# AWS_RETRY_MODE so the router's other clients keep the standard mode when it runs this inprocess
+dynamodb = boto3.resource('dynamodb', config=client_config(retry_mode='adaptive'))
+instrument_client(dynamodb.meta.client)
 
 # Environment variables for table names
 
 latest_table = dynamodb.Table(os.environ['FILE_METADATA_LATEST'])
 deleted_table = dynamodb.Table(os.environ['FILE_DELETED'])
+column_table = dynamodb.Table(os.environ['FILE_COLUMN_INDEX']) if os.environ.get('FILE_COLUMN_INDEX') else None
+rollup_table = dynamodb.Table(os.environ['FOLDER_ROLLUP']) if os.environ.get('FOLDER_ROLLUP') else None
+schema_table = dynamodb.Table(os.environ['FILE_SCHEMA']) if os.environ.get('FILE_SCHEMA') else None
 
 def handler(event, context):
+    # Accepts a single S3 event, a list of them, or {"events": [...]} (prefix-wide deletes)
+    metrics = start_invocation('Deletion', context)
+    log_event(event)
+    try:
+        events = event if isinstance(event, list) else event.get("events")
+        if events is not None:
+            return track_deletions(events, metrics)
+        result = track_deletion(event, metrics)
+        metrics.increment(f"Deletes{(result or {}).get('status', 'deleted').capitalize()}")
+        return result
+    finally:
+        metrics.emit()
+
+
+def untracked_record(bucket, key, timestamp):
+    filename = key.split('/')[-1]
+    folder = '/'.join(key.split('/')[:-1])
+    file_type, compression = split_extension(filename)
+    # The object is already gone, so size and content type are unknown
+    size = 0
+    content_type = 'unknown'
+    column_count = None
+    header = None
+
+    metadata = {
+    'filepath': f"{bucket}/{key}",
+    'bucket': bucket,
+    'folder': folder,
+    'filename': filename,
+    'file_type': file_type,
+    'compression' : compression,
+    'size': size,
+    'content_type': content_type,
+    'timestamp': None,
+    'deletion_timestamp': timestamp,
+    'header' : header,
+    'column_count' : column_count
+    }
+    return {**metadata, 'Comment': 'Deleted file was not tracked'}
+
+
+def log_untracked(record):
+    # A redelivered delete finds no row because the first delivery already removed and
+    # logged it; that FileDeleted record must never be replaced by the stub
+    try:
+        deleted_table.put_item(Item=record, ConditionExpression='attribute_not_exists(filepath)')
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+
+
+def _drop_from_index(filepath, item, metrics):
+    # The deletion is already logged; a failed side effect is counted, never reported as a
+    # failed delete, or a retry would overwrite the FileDeleted record with an untracked stub
+    try:
+        with metrics.phase('ColumnIndex'):
+            update_column_index(column_table, filepath, old_item=with_schema(item, schema_table))
+    except Exception as e:
+        print(f"COLUMN INDEX FAILED: {filepath} | Error: {str(e)}")
+        metrics.increment('ColumnIndexErrors')
+
+
+def _apply_rollups_safely(deltas, filepath, metrics):
+    try:
+        with metrics.phase('Rollup'):
+            apply_rollups(rollup_table, deltas)
+    except Exception as e:
+        print(f"ROLLUP FAILED: {filepath} | Error: {str(e)}")
+        metrics.increment('RollupErrors')
+
+
+def track_deletion(event, metrics):
     try:
-        print("Received event:", json.dumps(event))
 
         bucket = event["detail"]["bucket"]["name"]
         key = event["detail"]["object"]["key"] 
@@ -26,48 +109,30 @@ def handler(event, context):
 
         # filepath = event['filepath']
 
-        # Step 1: Read from FileMetadataLatest
-        response = latest_table.get_item(Key={'filepath': filepath})
-        item = response.get('Item')
+        sequencer = normalize_sequencer(event["detail"]["object"].get("sequencer"))
+
+        # Step 1: Delete from FileMetadataLatest and log the removed item to FileDeleted,
+        # skipping the delete if a newer upload of this key was already stored
+        with metrics.phase('DeleteLatest'):
+            status, item = delete_latest(latest_table, deleted_table, filepath, timestamp, sequencer)
+
+        if status == 'stale':
+            print(f"STALE: {filepath} | newer upload already stored, delete ignored")
+            return {"status": "stale", "message": f"Newer record exists for {filepath}"}
 
         if not item:
-            filename = key.split('/')[-1]
-            folder = '/'.join(key.split('/')[:-1])
-            compression = None
-            if filename.endswith('.gz') or filename.endswith('.tar'):
-                compression = filename.split('.')[-1]
-                file_type = filename.split('.')[-2] if '.' in filename else 'unknown'
-            else:
-                file_type = filename.split('.')[-1] if '.' in filename else 'unknown'
-            size = response.get('ContentLength', 0)
-            content_type = response.get('ContentType', 'unknown')
-            column_count = None
-            header = None
-
-            metadata = {
-            'filepath': filepath,
-            'bucket': bucket,
-            'folder': folder,
-            'filename': filename,
-            'file_type': file_type,
-            'compression' : compression,
-            'size': size,
-            'content_type': content_type,
-            'timestamp': None,
-            'deletion_timestamp': timestamp,
-            'header' : header,
-            'column_count' : column_count
-            }
-
-            deleted_table.put_item(Item={**metadata, 'Comment': 'Deleted file was not tracked'})
+            log_untracked(untracked_record(bucket, key, timestamp))
             return {"status": "not_found", "message": f"No record found for {filepath}"}
             
 
-        # Step 2: Write to FileDeleted table
-        deleted_table.put_item(Item={**item, 'deletion_timestamp': timestamp})
+        # Drop the file from the column index; its columns come from the removed row's schema
+        if column_table is not None:
+            _drop_from_index(filepath, item, metrics)
+
+        # Take the removed file off the counters of its folder and every parent folder
+        if rollup_table is not None:
+            _apply_rollups_safely(rollup_deltas(old_item=item), filepath, metrics)
 
-        # Step 3: Delete from FileMetadataLatest
-        latest_table.delete_item(Key={'filepath': filepath})
         print(f"Deleted: {filepath}, stored log")
 
 
@@ -78,3 +143,78 @@ def handler(event, context):
     except Exception as e:
         print("Unexpected error:", str(e))
         return {"status": "error", "message": str(e)}
+
+
+def track_deletions(events, metrics):
+    # Batched twin of track_deletion: one BatchGetItem per 100 keys and one transaction per
+    # 50 deletes instead of a get/put/delete round trip per key. Each event gets the status
+    # and message track_deletion would have returned ('deleted' where it returns None); only
+    # keys left unfinished are reported as 'error', so a retry never redoes finished ones
+    timestamp = datetime.utcnow().isoformat()
+    parsed = []
+    results = []
+    for event in events:
+        try:
+            bucket = event["detail"]["bucket"]["name"]
+            key = event["detail"]["object"]["key"]
+            sequencer = normalize_sequencer(event["detail"]["object"].get("sequencer"))
+            parsed.append((bucket, key, sequencer))
+        except (KeyError, TypeError) as e:
+            print("Unexpected error:", str(e))
+            parsed.append(None)
+    metrics.increment('Events', len(events))
+
+    # Only the batch read can fail here, before anything was deleted
+    try:
+        with metrics.phase('DeleteLatest'):
+            outcomes = delete_latest_batch(
+                dynamodb, latest_table, deleted_table,
+                [(f"{bucket}/{key}", timestamp, sequencer) for bucket, key, sequencer in filter(None, parsed)])
+
+    except ClientError as e:
+        print("DynamoDB error:", e.response['Error']['Message'])
+        return {'results': [{"status": "error", "message": str(e)} for _ in events]}
+
+    except Exception as e:
+        print("Unexpected error:", str(e))
+        return {'results': [{"status": "error", "message": str(e)} for _ in events]}
+
+    statuses = {}
+    rollups = RollupBuffer()
+    # Keys repeated within the batch were deleted once, so they are handled once
+    keys = {f"{bucket}/{key}": (bucket, key) for bucket, key, _ in filter(None, parsed)}
+    for filepath, (bucket, key) in keys.items():
+        status, item = outcomes[filepath]
+        if status == 'not_found':
+            try:
+                with metrics.phase('DeleteLatest'):
+                    log_untracked(untracked_record(bucket, key, timestamp))
+            except Exception as e:
+                print(f"Untracked log failed for {filepath}: {str(e)}")
+                status = 'error'
+        elif status == 'deleted':
+            rollups.add(old_item=item)
+            if column_table is not None:
+                _drop_from_index(filepath, item, metrics)
+        statuses[filepath] = status
+
+    # Deltas of a whole prefix collapse into one update per folder level
+    if rollup_table is not None:
+        _apply_rollups_safely(rollups.drain(), f"{len(keys)} key(s)", metrics)
+
+    messages = {
+        'deleted': "Deleted: {}, stored log",
+        'stale': "Newer record exists for {}",
+        'not_found': "No record found for {}",
+        'error': "Delete of {} did not finish",
+    }
+    for entry in parsed:
+        if entry is None:
+            results.append({"status": "error", "message": "Malformed S3 event"})
+            continue
+        filepath = f"{entry[0]}/{entry[1]}"
+        status = statuses[filepath]
+        metrics.increment(f"Deletes{status.capitalize()}")
+        results.append({"filepath": filepath, "status": status, "message": messages[status].format(filepath)})
+    print(f"Batch delete: {len(outcomes)} key(s) from {len(events)} event(s)")
+    return {'results': results}
@@ -0,0 +1,39 @@
+import os
+import boto3
+from helpers.client_helper import client_config
+from helpers.export_helper import S3Store, compact, write_changes
+from helpers.metrics_helper import instrument_client, log_event, start_invocation
+
+s3 = instrument_client(boto3.client('s3', config=client_config()))
+store = S3Store(s3, os.environ['EXPORT_BUCKET'])
+
+# Stream ARNs carry the physical table names; change files are partitioned by role
+table_names = {
+    os.environ['FILE_METADATA_LATEST']: 'latest',
+    os.environ['FILE_DELETED']: 'deleted',
+}
+
+
+def handler(event, context):
+    # Stream batches from the latest and deleted tables ({"Records": [...]}), or the
+    # scheduled {"action": "compact"} that folds the change files into the snapshot.
+    # Errors are raised so the stream batch is retried (and bisected) rather than lost
+    metrics = start_invocation('Export', context)
+    log_event(event)
+    try:
+        if event.get('action') == 'compact':
+            with metrics.phase('Compact'):
+                summary = compact(store)
+            metrics.increment('SnapshotsRewritten', len(summary))
+            print(f"Compacted: {summary}")
+            return {'buckets': summary}
+
+        records = event.get('Records', [])
+        with metrics.phase('WriteChanges'):
+            written = write_changes(store, records, table_names)
+        metrics.increment('ChangesExported', len(records))
+        metrics.increment('ChangeFilesWritten', len(written))
+        print(f"Exported {len(records)} change(s) to {len(written)} file(s)")
+        return {'files': written}
+    finally:
+        metrics.emit()
@@ -1,103 +1,95 @@
 import boto3
 from datetime import datetime
 import os
-import pyarrow.parquet as pq
-from helpers.fileparsing_helper import *
-
-s3 = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from helpers.client_helper import client_config
+from helpers.idempotency_helper import SeenCache, event_fingerprint
+from helpers.metadata_helper import MetadataTables, flush_rollups, process_object
+from helpers.rollup_helper import RollupBuffer
+from helpers.metrics_helper import current_metrics, instrument_client, log_event, start_invocation
+
+# Upper bound on events processed concurrently within one invocation
+MAX_WORKERS = int(os.environ.get('METADATA_MAX_WORKERS', '8'))
+
+# Shared by all workers; the pool must be at least as large as the worker count.
+# Format readers (pyarrow etc.) are imported lazily by fileparsing_helper
+s3 = instrument_client(boto3.client('s3', config=client_config(MAX_WORKERS)))
+dynamodb = boto3.resource('dynamodb', config=client_config(MAX_WORKERS))
+instrument_client(dynamodb.meta.client)
 
 main_table = dynamodb.Table(os.environ['FILE_METADATA_LATEST'])
 skipped_table = dynamodb.Table(os.environ['FILE_METADATA_SKIPPED'])
 failed_table = dynamodb.Table(os.environ['FILE_METADATA_FAILED'])
 history_table = dynamodb.Table(os.environ['FILE_METADATA_HISTORY'])
+column_table = dynamodb.Table(os.environ['FILE_COLUMN_INDEX']) if os.environ.get('FILE_COLUMN_INDEX') else None
+rollup_table = dynamodb.Table(os.environ['FOLDER_ROLLUP']) if os.environ.get('FOLDER_ROLLUP') else None
+schema_table = dynamodb.Table(os.environ['FILE_SCHEMA']) if os.environ.get('FILE_SCHEMA') else None
 
+tables = MetadataTables(latest=main_table, skipped=skipped_table, failed=failed_table, history=history_table,
+                        columns=column_table, rollups=rollup_table, schemas=schema_table)
 
-def metadata_handler(event, context):
-    try:
-        bucket = event["detail"]["bucket"]["name"]
-        key = event["detail"]["object"]["key"]
-        filepath = f"{bucket}/{key}"
-        timestamp = datetime.utcnow().isoformat()
-        print(key)
+# Survives across warm invocations, catches burst redeliveries without a DynamoDB read
+seen_events = SeenCache(max_entries=int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '1024')))
 
-        try:
-            response = s3.head_object(Bucket=bucket, Key=key)
-            
-        except Exception as e:
-            print(f"FAILED: {filepath} | Error: {str(e)}")
-            failed_table.put_item(Item={
-                'filepath': filepath,
-                'bucket': bucket,
-                'timestamp': timestamp,
-                'error': str(e)
-            })
-            return
-
-        filename = key.split('/')[-1]
-        folder = '/'.join(key.split('/')[:-1])
-        compression = None
-        if filename.endswith('.gz') or filename.endswith('.tar'):
-            compression = filename.split('.')[-1]
-            file_type = filename.split('.')[-2] if '.' in filename else 'unknown'
-        else:
-            file_type = filename.split('.')[-1] if '.' in filename else 'unknown'
-        size = response.get('ContentLength', 0)
-        content_type = response.get('ContentType', 'unknown')
-        column_count = None
-        header = None
-
-        metadata = {
-            'filepath': filepath,
-            'bucket': bucket,
-            'folder': folder,
-            'filename': filename,
-            'file_type': file_type,
-            'compression' : compression,
-            'size': size,
-            'content_type': content_type,
-            'timestamp': timestamp,
-            'header' : header,
-            'column_count' : column_count
-        }
-
-        if key.endswith('/') or size == 0:
-            print(f"SKIPPED: {filepath}")
-            skipped_table.put_item(Item={**metadata, 'reason': 'folder-like or empty object'})
-            return
 
-        try:
-            # Download the full file content
-            obj = s3.get_object(Bucket=bucket, Key=key)
-            file_data = obj['Body'].read()
-
-            # Extract headers based on file type
-            metadata['header'] = read_file_header(file_data, key)
-            metadata['column_count'] = len(metadata['header'])
+def process_event(event, rollups=None):
+    bucket = event["detail"]["bucket"]["name"]
+    key = event["detail"]["object"]["key"]
+    timestamp = datetime.utcnow().isoformat()
+    print(key)
 
-        except Exception as e:
-            print(f"HEADER PARSE FAILED: {filepath} | Error: {str(e)}")
+    fingerprint = event_fingerprint(event["detail"]["object"])
+    status = process_object(s3, tables, bucket, key, timestamp, fingerprint, seen_events=seen_events,
+                            rollups=rollups)
+    current_metrics().increment(f"Files{status.capitalize()}")
+    return {'filepath': f"{bucket}/{key}", 'status': status}
 
-            failed_table.put_item(Item={**metadata, 'reason': 'Header parsing Issue'})
-            return
 
+def process_event_safely(event, rollups=None):
+    # Batch mode: one bad event must not take down the rest of the batch
+    try:
+        return process_event(event, rollups)
+    except Exception as e:
+        print(f"Error in metadata_handler: {e}")
+        current_metrics().increment('FilesError')
+        try:
+            filepath = f"{event['detail']['bucket']['name']}/{event['detail']['object']['key']}"
+        except (KeyError, TypeError):
+            filepath = None
+        return {'filepath': filepath, 'status': 'failed', 'error': str(e)}
 
 
-        # Check if file already exists
-        existing = main_table.get_item(Key={'filepath': filepath})
+def metadata_handler(event, context):
+    # Accepts a single S3 event, a list of them, or {"events": [...]}.
+    # Emits one metrics record per invocation, whatever the outcome
+    metrics = start_invocation('MetaData', context)
+    log_event(event)
+    try:
+        return handle_events(event, metrics)
+    finally:
+        metrics.emit()
 
-        if 'Item' in existing:
-            # Archive old version to history table
-            old_item = existing['Item']
-            history_table.put_item(Item={
-                **old_item,
-                #'timestamp': timestamp  # Timestamp is the sort key in history table
-            })
 
-        # Store new/updated metadata
-        print(f"STORED: {filepath}")
-        main_table.put_item(Item=metadata)
+def handle_events(event, metrics):
+    events = event if isinstance(event, list) else event.get("events")
 
-    except Exception as e:
-        print(f"Error in metadata_handler: {e}")
-        raise e
+    if events is None:
+        try:
+            metrics.set_property('filepath', f"{event['detail']['bucket']['name']}/{event['detail']['object']['key']}")
+            return process_event(event)
+        except Exception as e:
+            print(f"Error in metadata_handler: {e}")
+            metrics.increment('FilesError')
+            raise e
+
+    # Nearly all the time goes to S3/DynamoDB round trips, so overlap them
+    metrics.increment('Events', len(events))
+    # Folder counters of the whole batch are coalesced and written once at the end
+    rollups = RollupBuffer()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        results = list(pool.map(partial(process_event_safely, rollups=rollups), events))
+    if rollup_table is not None:
+        flush_rollups(rollup_table, rollups)
+
+    return {'results': results}
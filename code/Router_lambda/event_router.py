@@ -1,42 +1,197 @@
+import importlib
 import json
 import boto3
 import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from helpers.client_helper import client_config
+from helpers.metrics_helper import current_metrics, instrument_client, log_event, start_invocation
 
 
-# Initialize Step Functions client
-sf_client = boto3.client("stepfunctions")
+# Upper bound on concurrent start_execution calls per invocation
+MAX_WORKERS = int(os.environ.get("ROUTER_MAX_WORKERS", "16"))
 
-# Read ARNs from environment
-CREATED_SF_ARN = os.environ["CREATED_SF_ARN"]
-DELETED_SF_ARN = os.environ["DELETED_SF_ARN"]
+# Deletes per DeletionTracker execution; 1 keeps one execution per deleted key. Prefix-wide
+# deletes arrive as bursts, batching them turns thousands of executions into a few dozen
+DELETE_BATCH_SIZE = int(os.environ.get("ROUTER_DELETE_BATCH_SIZE", "1"))
+# Uploads per extraction execution/invoke; batches go through the extractor's thread pool
+# and write each folder's counters once
+CREATE_BATCH_SIZE = int(os.environ.get("ROUTER_CREATE_BATCH_SIZE", "1"))
+# Step Functions rejects inputs over 256 KB
+MAX_EXECUTION_INPUT_BYTES = 200 * 1024
 
-def handler(event, context):
-    for record in event["Records"]:
+# How events reach the extraction and deletion handlers:
+#   standard / express - start_execution on a Standard or Express state machine
+#   lambda             - asynchronous invoke of the handler Lambda
+#   inprocess          - the router imports the handlers and runs them itself
+DISPATCH_MODE = os.environ.get("ROUTER_DISPATCH_MODE", "standard")
+DISPATCH_MODES = ("standard", "express", "lambda", "inprocess")
+if DISPATCH_MODE not in DISPATCH_MODES:
+    raise ValueError(f"ROUTER_DISPATCH_MODE must be one of {', '.join(DISPATCH_MODES)}, got {DISPATCH_MODE!r}")
+
+CREATED = "created"
+DELETED = "deleted"
+
+# Clients sized so every worker gets its own pooled connection
+sf_client = None
+lambda_client = None
+if DISPATCH_MODE in ("standard", "express"):
+    sf_client = instrument_client(boto3.client("stepfunctions", config=client_config(MAX_WORKERS)))
+    # Read ARNs from environment
+    TARGETS = {CREATED: os.environ["CREATED_SF_ARN"], DELETED: os.environ["DELETED_SF_ARN"]}
+elif DISPATCH_MODE == "lambda":
+    lambda_client = instrument_client(boto3.client("lambda", config=client_config(MAX_WORKERS)))
+    TARGETS = {CREATED: os.environ["CREATED_FUNCTION_NAME"], DELETED: os.environ["DELETED_FUNCTION_NAME"]}
+else:
+    TARGETS = {CREATED: "metadata_extractor", DELETED: "deletion_tracker"}
+
+# Handler modules for inprocess mode; the stack ships them next to the router under code/
+HANDLER_DIRS = {"metadata_extractor": "MetaData_lambda", "deletion_tracker": "Deletion_lambda"}
+_loaded_handlers = {}
+_handler_lock = threading.Lock()
+
+
+def load_handler(module_name):
+    with _handler_lock:
+        if module_name not in _loaded_handlers:
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", HANDLER_DIRS[module_name])
+            if path not in sys.path:
+                sys.path.insert(0, path)
+            _loaded_handlers[module_name] = importlib.import_module(module_name)
+        return _loaded_handlers[module_name]
+
+
+def group_records(records):
+    # Splits an SQS batch into {CREATED/DELETED: [(messageId, body), ...]}
+    groups = {CREATED: [], DELETED: []}
+    for record in records:
         try:
             # EventBridge puts the full event as a JSON string inside the SQS message body
             body = json.loads(record["body"])
-            print("Received event:", json.dumps(body, indent=2))
-
-            #event_name = body["detail"]["eventName"]
-            event_name = body.get("detail-type", "")
-            print(event_name)
-            sf_input = json.dumps(body)  # Full event passed into Step Function
-
-            if event_name.startswith("Object Created"):
-                print(f"Routing to CREATED Step Function: {CREATED_SF_ARN}")
-                sf_client.start_execution(
-                    stateMachineArn=CREATED_SF_ARN,
-                    input=sf_input
-                )
-
-            elif event_name.startswith("Object Deleted"):
-                print(f"Routing to DELETED Step Function: {DELETED_SF_ARN}")
-                sf_client.start_execution(
-                    stateMachineArn=DELETED_SF_ARN,
-                    input=sf_input
-                )
-            else:
-                print(f"Unknown event type: {event_name}")
-        
-        except Exception as e:
-            print(f"Error processing record: {e}")
+        except (KeyError, TypeError, ValueError) as e:
+            # Redelivering a malformed message will never succeed, so it is dropped, not retried
+            print(f"Dropping malformed record {record.get('messageId')}: {e}")
+            current_metrics().increment('MalformedRecords')
+            continue
+
+        log_event(body)
+
+        #event_name = body["detail"]["eventName"]
+        event_name = body.get("detail-type", "")
+        if event_name.startswith("Object Created"):
+            groups[CREATED].append((record["messageId"], body))
+        elif event_name.startswith("Object Deleted"):
+            groups[DELETED].append((record["messageId"], body))
+        else:
+            print(f"Unknown event type: {event_name}")
+            current_metrics().increment('UnknownEvents')
+    return groups
+
+
+def start_execution(state_machine_arn, message_ids, payload):
+    # Returns the message ids to retry, i.e. all of them if the execution did not start
+    try:
+        sf_client.start_execution(
+            stateMachineArn=state_machine_arn,
+            input=json.dumps(payload)  # Full event(s) passed into Step Function
+        )
+        return []
+    except Exception as e:
+        print(f"Error processing record(s) {', '.join(message_ids)}: {e}")
+        return list(message_ids)
+
+
+def invoke_function(function_name, message_ids, payload):
+    # Asynchronous invoke; Lambda queues the event and retries handler errors itself
+    try:
+        lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType="Event",
+            Payload=json.dumps(payload)
+        )
+        return []
+    except Exception as e:
+        print(f"Error processing record(s) {', '.join(message_ids)}: {e}")
+        return list(message_ids)
+
+
+def run_handler(module_name, message_ids, payload):
+    # Same entry points the handler Lambdas use, recording into the router's metrics.
+    # Events that raised go back to the queue; recorded outcomes (failed/skipped/...) do not,
+    # just as a completed execution is not retried
+    metrics = current_metrics()
+    try:
+        module = load_handler(module_name)
+        if module_name == "metadata_extractor":
+            results = module.handle_events(payload, metrics)['results']
+            return [message_id for message_id, result in zip(message_ids, results) if 'error' in result]
+        results = module.track_deletions(payload["events"], metrics)['results']
+        return [message_id for message_id, result in zip(message_ids, results) if result['status'] == 'error']
+    except Exception as e:
+        print(f"Error processing record(s) {', '.join(message_ids)}: {e}")
+        return list(message_ids)
+
+
+def dispatch(flow, message_ids, payload):
+    # Returns the message ids to retry
+    if DISPATCH_MODE == "lambda":
+        return invoke_function(TARGETS[flow], message_ids, payload)
+    if DISPATCH_MODE == "inprocess":
+        return run_handler(TARGETS[flow], message_ids, payload)
+    return start_execution(TARGETS[flow], message_ids, payload)
+
+
+def batch_items(items, batch_size=DELETE_BATCH_SIZE, max_bytes=MAX_EXECUTION_INPUT_BYTES):
+    # Groups (messageId, body) pairs into {"events": [...]} payloads within count and size limits
+    batch, batch_bytes = [], 0
+    for message_id, body in items:
+        size = len(json.dumps(body))
+        if batch and (len(batch) >= batch_size or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append((message_id, body))
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def handler(event, context):
+    metrics = start_invocation('Router', context)
+    try:
+        return route_records(event["Records"], metrics)
+    finally:
+        metrics.emit()
+
+
+def route_records(records, metrics):
+    metrics.increment('Records', len(records))
+    with metrics.phase('GroupRecords'):
+        groups = group_records(records)
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for flow, items in groups.items():
+            if not items:
+                continue
+            print(f"Routing {len(items)} record(s) to {DISPATCH_MODE} target: {TARGETS[flow]}")
+            if DISPATCH_MODE == "inprocess" and flow == CREATED:
+                # The extractor's batch mode already runs the events concurrently
+                message_ids = [message_id for message_id, _ in items]
+                futures.append(pool.submit(dispatch, flow, message_ids, {"events": [body for _, body in items]}))
+                continue
+            batch_size = CREATE_BATCH_SIZE if flow == CREATED else DELETE_BATCH_SIZE
+            if batch_size > 1 or DISPATCH_MODE == "inprocess":
+                for batch in batch_items(items, batch_size=batch_size):
+                    message_ids = [message_id for message_id, _ in batch]
+                    payload = {"events": [body for _, body in batch]}
+                    futures.append(pool.submit(dispatch, flow, message_ids, payload))
+                continue
+            for message_id, body in items:
+                futures.append(pool.submit(dispatch, flow, [message_id], body))
+
+    failed = [message_id for future in futures for message_id in future.result()]
+    metrics.increment('FailedRecords', len(failed))
+
+    # Only the failed messages go back to the queue (ReportBatchItemFailures)
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed]}
@@ -4,8 +4,56 @@
 NEW_S3_BUCKET_NAME = "FileUploadBucket"
 S3_BUCKET_TO_TRACK = 'simpletest01'
 
+# router tuning (SQS batch -> Step Functions)
+ROUTER_TIMEOUT_SECONDS = 60
+ROUTER_BATCH_SIZE = 100
+ROUTER_BATCHING_WINDOW_SECONDS = 5
+ROUTER_MAX_WORKERS = 16
+# deleted keys per DeletionTracker execution (1 = one execution per key)
+ROUTER_DELETE_BATCH_SIZE = 50
+# uploads per MetaData execution/invoke (1 = one per upload); sized so a batch stays well
+# inside the 5 minute state machine timeout
+ROUTER_CREATE_BATCH_SIZE = 10
+
+# how the router hands events to the extraction/deletion handlers:
+#   standard  - Standard Step Functions execution per event (original behaviour)
+#   express   - Express Step Functions execution, same single task at lower latency/cost
+#   lambda    - asynchronous Lambda invoke, no state machine
+#   inprocess - the router imports and runs the handlers itself
+DISPATCH_MODE = "standard"
+DISPATCH_MODES = ("standard", "express", "lambda", "inprocess")
+ROUTER_INPROCESS_TIMEOUT_SECONDS = 300
+
 # lambda function name
 FILE_META_DATA_PROCESSOR_LAMBDA = 'FileMetaDataProcessor'
+METADATA_MAX_WORKERS = 8
+
+# column profiling of CSV/TXT/PSV/GZ from a bounded sample (off by default)
+ENABLE_COLUMN_PROFILING = False
+PROFILE_SAMPLE_ROWS = 1000
+PROFILE_SAMPLE_BYTES = 1024 * 1024
+
+# row counts of CSV/TXT/PSV/GZ (off by default); larger objects get an estimate from this many bytes
+ENABLE_ROW_COUNT = False
+ROW_COUNT_MAX_BYTES = 4 * 1024 * 1024
+
+# zip catalog: members listed (and first lines read) per archive, parallel member reads, and
+# bytes of member column names stored inline per item
+ZIP_MEMBER_LIMIT = 100
+ZIP_MEMBER_WORKERS = 4
+ZIP_MEMBER_HEADER_BYTES = 64 * 1024
+
+# Parquet export of the latest/deleted table streams: micro-batches of changes partitioned by
+# table/bucket/date, compacted into a current snapshot per bucket on a schedule
+EXPORT_BATCH_SIZE = 1000
+EXPORT_BATCHING_WINDOW_SECONDS = 60
+EXPORT_RETRY_ATTEMPTS = 10
+EXPORT_COMPACTION_HOURS = 1
+EXPORT_LATE_DAYS = 1
+
+# per-invocation metrics (CloudWatch Embedded Metric Format) and sampled event logging
+METRICS_NAMESPACE = 'FileMetadataTracker'
+EVENT_LOG_SAMPLE_RATE = 0.01
 # FILE_META_DATA_ROLE = ''
 
 #dynamo db tables
@@ -14,6 +62,35 @@ SKIPPED_TABLE_NAME   = "FileMetadataSkipped"
 FAILED_TABLE_NAME    = "FileMetadataFailed"
 HISTORY_TABLE_NAME   = "FileMetadataHistory"
 DELETED_TABLE_NAME = "FileDeleted"
+COLUMN_INDEX_TABLE_NAME = "FileColumnIndex"
+ROLLUP_TABLE_NAME = "FolderRollup"
+SCHEMA_TABLE_NAME = "FileSchema"
+
+# GSIs on the latest table: name -> ((partition key, type), (sort key, type)).
+# folder can be '' which is not a valid key value, so the folder index is keyed on
+# "bucket/folder"; the bucket index is spread over shards so one busy bucket is not
+# a single hot GSI partition
+FOLDER_INDEX_NAME = "FolderTimestampIndex"
+FILE_TYPE_INDEX_NAME = "FileTypeSizeIndex"
+BUCKET_INDEX_NAME = "BucketTimestampIndex"
+SCHEMA_INDEX_NAME = "SchemaTimestampIndex"
+LATEST_TABLE_INDEXES = {
+    FOLDER_INDEX_NAME: (('bucket_folder', 'S'), ('timestamp', 'S')),
+    FILE_TYPE_INDEX_NAME: (('file_type', 'S'), ('size', 'N')),
+    BUCKET_INDEX_NAME: (('bucket_shard', 'S'), ('timestamp', 'S')),
+    SCHEMA_INDEX_NAME: (('schema_hash', 'S'), ('timestamp', 'S')),
+}
+BUCKET_INDEX_SHARDS = 8
+# Small attributes copied into every GSI, full items are fetched by filepath when needed
+INDEX_PROJECTED_ATTRIBUTES = ['bucket', 'folder', 'filename', 'file_type', 'compression',
+                              'size', 'etag', 'column_count', 'row_count', 'schema_hash']
+
+# wide files only get their first columns in the column index
+MAX_INDEXED_COLUMNS = 1000
+
+# file items reference their column list by schema hash; schemas seen recently are
+# kept per warm container
+SCHEMA_CACHE_SIZE = 256
 
 # env vars
 ENV_LATEST_TABLE = "FILE_METADATA_LATEST"
@@ -21,4 +98,8 @@ ENV_SKIPPED_TABLE   = "FILE_METADATA_SKIPPED"
 ENV_FAILED_TABLE    = "FILE_METADATA_FAILED"
 ENV_HISTORY_TABLE   = "FILE_METADATA_HISTORY"
 ENV_DELETED_TABLE = "FILE_DELETED"
+ENV_COLUMN_INDEX_TABLE = "FILE_COLUMN_INDEX"
+ENV_ROLLUP_TABLE = "FOLDER_ROLLUP"
+ENV_SCHEMA_TABLE = "FILE_SCHEMA"
+ENV_EXPORT_BUCKET = "EXPORT_BUCKET"
 
@@ -10,6 +10,7 @@ from aws_cdk import (
     aws_events as events,
     aws_events_targets as targets,
     aws_lambda_event_sources as lambda_event_sources,
+    aws_lambda_destinations as destinations,
     aws_stepfunctions as sfn,
     aws_stepfunctions_tasks as tasks,
     RemovalPolicy
@@ -28,8 +29,16 @@ class FileMetadataTrackerStack(Stack):
             bucket_name=S3_BUCKET_TO_TRACK,
         )
 
+        # standard | express | lambda | inprocess, overridable with `cdk deploy -c dispatch_mode=...`
+        dispatch_mode = self.node.try_get_context("dispatch_mode") or DISPATCH_MODE
+        if dispatch_mode not in DISPATCH_MODES:
+            raise ValueError(f"dispatch_mode must be one of {', '.join(DISPATCH_MODES)}, got {dispatch_mode!r}")
+        # In-process the router does the extraction work itself and needs its time budget
+        router_timeout = ROUTER_INPROCESS_TIMEOUT_SECONDS if dispatch_mode == "inprocess" else ROUTER_TIMEOUT_SECONDS
+
+        # AWS recommends 6x the consumer timeout when a batching window is used
         s3_event_queue = sqs.Queue(self, "s3EventQueue", 
-                                   visibility_timeout=Duration.seconds(60))
+                                   visibility_timeout=Duration.seconds(6 * router_timeout))
         
         event_rule = events.Rule(
             self, "S3EventBridgeRule",
@@ -49,7 +58,19 @@ class FileMetadataTrackerStack(Stack):
 
 
 
-        # Router Lambda to spin up step functions
+        # Shared helpers (parsing, storage, clients) for every Lambda in the stack
+        helper_layer = _lambda.LayerVersion(
+            self, "HelperLayer",
+            code=_lambda.Code.from_asset("infra/layers/helper_layer"),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_12]
+        )
+
+        pyarrow_layer = _lambda.LayerVersion.from_layer_version_arn(
+            self, "PyarrowLayer",
+            layer_version_arn="arn:aws:lambda:us-east-1:336392948345:layer:AWSSDKPandas-Python312:1"
+        )
+
+        # Router Lambda to spin up step functions (or invoke/run the handlers, see dispatch_mode)
 
         router_lambda_role = iam.Role(
         self, f"{construct_id}_RouterLambdaRole",
@@ -57,27 +78,48 @@ class FileMetadataTrackerStack(Stack):
         managed_policies=[
             iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole")
         ])
-        # Add permission to start Step Functions
-        router_lambda_role.add_to_policy(iam.PolicyStatement(
-            actions=["states:StartExecution"],
-            resources=["*"]  # TODO: replace with specific ARNs in prod
-        ))
+        if dispatch_mode in ("standard", "express"):
+            # Add permission to start Step Functions
+            router_lambda_role.add_to_policy(iam.PolicyStatement(
+                actions=["states:StartExecution"],
+                resources=["*"]  # TODO: replace with specific ARNs in prod
+            ))
+
+        if dispatch_mode == "inprocess":
+            # The router imports metadata_extractor and deletion_tracker from their sibling folders
+            router_code = _lambda.Code.from_asset("code")
+            router_handler = "Router_lambda/event_router.handler"
+            router_layers = [pyarrow_layer, helper_layer]
+        else:
+            router_code = _lambda.Code.from_asset("code/Router_lambda")
+            router_handler = "event_router.handler"
+            router_layers = [helper_layer]
 
         router_lambda = _lambda.Function(
             self, "S3EventRouterLambda",
             runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="event_router.handler",
-            code=_lambda.Code.from_asset("code/Router_lambda"),
-            timeout=Duration.seconds(60),
+            handler=router_handler,
+            code=router_code,
+            layers=router_layers,
+            timeout=Duration.seconds(router_timeout),
             environment={
-                "CREATED_SF_ARN": "<TO_BE_FILLED>",
-                "DELETED_SF_ARN": "<TO_BE_FILLED>"
+                "ROUTER_DISPATCH_MODE": dispatch_mode,
+                "ROUTER_MAX_WORKERS": str(ROUTER_MAX_WORKERS),
+                "ROUTER_DELETE_BATCH_SIZE": str(ROUTER_DELETE_BATCH_SIZE),
+                "ROUTER_CREATE_BATCH_SIZE": str(ROUTER_CREATE_BATCH_SIZE),
+                "EVENT_LOG_SAMPLE_RATE": str(EVENT_LOG_SAMPLE_RATE),
+                "METRICS_NAMESPACE": METRICS_NAMESPACE
             },
             role=router_lambda_role
         )
 
         router_lambda.add_event_source(
-            lambda_event_sources.SqsEventSource(s3_event_queue))
+            lambda_event_sources.SqsEventSource(
+                s3_event_queue,
+                batch_size=ROUTER_BATCH_SIZE,
+                max_batching_window=Duration.seconds(ROUTER_BATCHING_WINDOW_SECONDS),
+                report_batch_item_failures=True
+            ))
 
         # Lambda Execution Role
         MetaData_lambda_role = iam.Role(
@@ -103,9 +145,22 @@ class FileMetadataTrackerStack(Stack):
             self, LATEST_TABLE_NAME,
             partition_key={"name": "filepath", "type": ddb.AttributeType.STRING},
             billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+            # Feeds the Parquet export; removes need the old image to say what went away
+            stream=ddb.StreamViewType.NEW_AND_OLD_IMAGES,
             # table_name=PROCESSED_TABLE_NAME
         )
 
+        # Lookups by folder, type/size, bucket and schema without scanning the table
+        attribute_types = {'S': ddb.AttributeType.STRING, 'N': ddb.AttributeType.NUMBER}
+        for index_name, ((partition_key, partition_type), (sort_key, sort_type)) in LATEST_TABLE_INDEXES.items():
+            latest_table.add_global_secondary_index(
+                index_name=index_name,
+                partition_key={"name": partition_key, "type": attribute_types[partition_type]},
+                sort_key={"name": sort_key, "type": attribute_types[sort_type]},
+                projection_type=ddb.ProjectionType.INCLUDE,
+                non_key_attributes=INDEX_PROJECTED_ATTRIBUTES
+            )
+
         skipped_table = ddb.Table(
             self, SKIPPED_TABLE_NAME,
             partition_key={"name": "filepath", "type": ddb.AttributeType.STRING},
@@ -134,9 +189,32 @@ class FileMetadataTrackerStack(Stack):
             self, DELETED_TABLE_NAME,
             partition_key={"name": "filepath", "type": ddb.AttributeType.STRING},
             billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+            stream=ddb.StreamViewType.NEW_IMAGE,
             # table_name=PROCESSED_TABLE_NAME
         )
 
+        # Inverted index: which files have a given column
+        column_index_table = ddb.Table(
+            self, COLUMN_INDEX_TABLE_NAME,
+            partition_key={"name": "column_name", "type": ddb.AttributeType.STRING},
+            sort_key={"name": "filepath", "type": ddb.AttributeType.STRING},
+            billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+        )
+
+        # Per-folder file counts and bytes, kept current with atomic ADD updates
+        rollup_table = ddb.Table(
+            self, ROLLUP_TABLE_NAME,
+            partition_key={"name": "folder_key", "type": ddb.AttributeType.STRING},
+            billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+        )
+
+        # Interned column lists, one row per distinct schema hash
+        schema_table = ddb.Table(
+            self, SCHEMA_TABLE_NAME,
+            partition_key={"name": "schema_hash", "type": ddb.AttributeType.STRING},
+            billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+        )
+
 
 
         # Grant required permissions
@@ -145,19 +223,33 @@ class FileMetadataTrackerStack(Stack):
         skipped_table.grant_write_data(MetaData_lambda_role)
         failed_table.grant_write_data(MetaData_lambda_role)
         history_table.grant_write_data(MetaData_lambda_role)
-
-        pyarrow_layer = _lambda.LayerVersion.from_layer_version_arn(
-            self, "PyarrowLayer",
-            layer_version_arn="arn:aws:lambda:us-east-1:336392948345:layer:AWSSDKPandas-Python312:1"
-        )
-
-        helper_layer = _lambda.LayerVersion(
-            self, "HelperLayer",
-            code=_lambda.Code.from_asset("infra/layers/helper_layer"),
-            compatible_runtimes=[_lambda.Runtime.PYTHON_3_12]
-        )
-
-
+        column_index_table.grant_write_data(MetaData_lambda_role)
+        rollup_table.grant_write_data(MetaData_lambda_role)
+        schema_table.grant_read_write_data(MetaData_lambda_role)
+
+        metadata_environment = {
+            ENV_LATEST_TABLE: latest_table.table_name,
+            ENV_SKIPPED_TABLE: skipped_table.table_name,
+            ENV_FAILED_TABLE: failed_table.table_name,
+            ENV_HISTORY_TABLE: history_table.table_name,
+            ENV_COLUMN_INDEX_TABLE: column_index_table.table_name,
+            ENV_ROLLUP_TABLE: rollup_table.table_name,
+            ENV_SCHEMA_TABLE: schema_table.table_name,
+            "BUCKET_INDEX_SHARDS": str(BUCKET_INDEX_SHARDS),
+            "MAX_INDEXED_COLUMNS": str(MAX_INDEXED_COLUMNS),
+            "SCHEMA_CACHE_SIZE": str(SCHEMA_CACHE_SIZE),
+            "METADATA_MAX_WORKERS": str(METADATA_MAX_WORKERS),
+            "ENABLE_COLUMN_PROFILING": str(ENABLE_COLUMN_PROFILING).lower(),
+            "PROFILE_SAMPLE_ROWS": str(PROFILE_SAMPLE_ROWS),
+            "PROFILE_SAMPLE_BYTES": str(PROFILE_SAMPLE_BYTES),
+            "ENABLE_ROW_COUNT": str(ENABLE_ROW_COUNT).lower(),
+            "ROW_COUNT_MAX_BYTES": str(ROW_COUNT_MAX_BYTES),
+            "ZIP_MEMBER_LIMIT": str(ZIP_MEMBER_LIMIT),
+            "ZIP_MEMBER_WORKERS": str(ZIP_MEMBER_WORKERS),
+            "ZIP_MEMBER_HEADER_BYTES": str(ZIP_MEMBER_HEADER_BYTES),
+            "EVENT_LOG_SAMPLE_RATE": str(EVENT_LOG_SAMPLE_RATE),
+            "METRICS_NAMESPACE": METRICS_NAMESPACE
+        }
 
         # Lambda Function
         MetaData_lambda_fn = _lambda.Function(
@@ -166,12 +258,7 @@ class FileMetadataTrackerStack(Stack):
             handler="metadata_extractor.metadata_handler",
             code=_lambda.Code.from_asset("code/MetaData_lambda"),
             layers=[pyarrow_layer, helper_layer],
-            environment={
-                ENV_LATEST_TABLE: latest_table.table_name,
-                ENV_SKIPPED_TABLE: skipped_table.table_name,
-                ENV_FAILED_TABLE: failed_table.table_name,
-                ENV_HISTORY_TABLE: history_table.table_name
-            },
+            environment=metadata_environment,
             role=MetaData_lambda_role,
             timeout=Duration.seconds(900) 
         )
@@ -186,56 +273,155 @@ class FileMetadataTrackerStack(Stack):
 
         latest_table.grant_read_write_data(deletion_lambdarole)
         deleted_table.grant_read_write_data(deletion_lambdarole)
+        column_index_table.grant_write_data(deletion_lambdarole)
+        rollup_table.grant_write_data(deletion_lambdarole)
+        # Removed rows only carry a schema hash; their columns are looked up to unindex them
+        schema_table.grant_read_data(deletion_lambdarole)
+
+        deletion_environment = {
+            ENV_LATEST_TABLE: latest_table.table_name,
+            ENV_DELETED_TABLE: deleted_table.table_name,
+            ENV_COLUMN_INDEX_TABLE: column_index_table.table_name,
+            ENV_ROLLUP_TABLE: rollup_table.table_name,
+            ENV_SCHEMA_TABLE: schema_table.table_name,
+            "MAX_INDEXED_COLUMNS": str(MAX_INDEXED_COLUMNS),
+            "SCHEMA_CACHE_SIZE": str(SCHEMA_CACHE_SIZE),
+            "EVENT_LOG_SAMPLE_RATE": str(EVENT_LOG_SAMPLE_RATE),
+            "METRICS_NAMESPACE": METRICS_NAMESPACE
+        }
 
         deletion_lambda_fn = _lambda.Function(
             self, "DeletionTrackerLambda",
             runtime=_lambda.Runtime.PYTHON_3_12,
             handler="deletion_tracker.handler",
             code=_lambda.Code.from_asset("code/Deletion_lambda"),
+            layers=[helper_layer],
+            environment=deletion_environment,
+            role=deletion_lambdarole,
+            # Batched executions carry up to ROUTER_DELETE_BATCH_SIZE keys
+            timeout=Duration.seconds(60)
+        )
+
+
+        # Parquet export: change files under changes/table=<latest|deleted>/bucket=<b>/date=<d>/
+        # from both streams, and snapshot/bucket=<b>/ compacted from them on a schedule, so
+        # bulk analytics read columnar files instead of scanning the tables
+        export_bucket = s3.Bucket(
+            self, "MetadataExportBucket",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            enforce_ssl=True,
+        )
+
+        export_lambda_role = iam.Role(
+            self, f"{construct_id}_ExportLambdaRole",
+            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            managed_policies=[
+                iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole")
+            ]
+        )
+        export_bucket.grant_read_write(export_lambda_role)
+        export_bucket.grant_delete(export_lambda_role)
+
+        export_lambda_fn = _lambda.Function(
+            self, "ChangeExportLambda",
+            runtime=_lambda.Runtime.PYTHON_3_12,
+            handler="change_exporter.handler",
+            code=_lambda.Code.from_asset("code/Export_lambda"),
+            layers=[pyarrow_layer, helper_layer],
             environment={
+                ENV_EXPORT_BUCKET: export_bucket.bucket_name,
                 ENV_LATEST_TABLE: latest_table.table_name,
-                ENV_DELETED_TABLE: deleted_table.table_name
+                ENV_DELETED_TABLE: deleted_table.table_name,
+                "EXPORT_LATE_DAYS": str(EXPORT_LATE_DAYS),
+                "EVENT_LOG_SAMPLE_RATE": str(EVENT_LOG_SAMPLE_RATE),
+                "METRICS_NAMESPACE": METRICS_NAMESPACE
             },
-            role=deletion_lambdarole
+            role=export_lambda_role,
+            memory_size=1024,
+            # Compaction rewrites a whole bucket's snapshot
+            timeout=Duration.seconds(900)
         )
 
-
-        # Step functions
-        # UploadTracker Step Function
-        upload_tracker_definition = tasks.LambdaInvoke(
-            self, "InvokeMetaDataProcessor",
-            lambda_function=MetaData_lambda_fn,
-            output_path="$.Payload"
+        for table in (latest_table, deleted_table):
+            export_lambda_fn.add_event_source(
+                lambda_event_sources.DynamoEventSource(
+                    table,
+                    starting_position=_lambda.StartingPosition.TRIM_HORIZON,
+                    batch_size=EXPORT_BATCH_SIZE,
+                    max_batching_window=Duration.seconds(EXPORT_BATCHING_WINDOW_SECONDS),
+                    bisect_batch_on_error=True,
+                    retry_attempts=EXPORT_RETRY_ATTEMPTS
+                ))
+
+        events.Rule(
+            self, "ExportCompactionSchedule",
+            schedule=events.Schedule.rate(Duration.hours(EXPORT_COMPACTION_HOURS)),
+            targets=[targets.LambdaFunction(
+                export_lambda_fn, event=events.RuleTargetInput.from_object({"action": "compact"}))]
         )
 
-        upload_tracker_sm = sfn.StateMachine(
-            self, "UploadTrackerStateMachine",
-            definition=upload_tracker_definition,
-            timeout=Duration.minutes(5)
-        )
 
-        upload_tracker_sm.grant_start_execution(router_lambda_role)
-        router_lambda.add_environment("CREATED_SF_ARN", upload_tracker_sm.state_machine_arn)
+        if dispatch_mode in ("standard", "express"):
+            # Step functions; Express runs the same single task without Standard's
+            # per-transition cost and start-up latency
+            state_machine_type = (sfn.StateMachineType.EXPRESS if dispatch_mode == "express"
+                                  else sfn.StateMachineType.STANDARD)
 
-    
+            # UploadTracker Step Function
+            upload_tracker_definition = tasks.LambdaInvoke(
+                self, "InvokeMetaDataProcessor",
+                lambda_function=MetaData_lambda_fn,
+                output_path="$.Payload"
+            )
 
-        # DeletionTracker Step Function
-        deletion_tracker_definition = tasks.LambdaInvoke(
-            self, "InvokeDeletionProcessor",
-            lambda_function=deletion_lambda_fn,
-            output_path="$.Payload"
-        )
+            upload_tracker_sm = sfn.StateMachine(
+                self, "UploadTrackerStateMachine",
+                definition=upload_tracker_definition,
+                state_machine_type=state_machine_type,
+                timeout=Duration.minutes(5)
+            )
 
-        deletion_tracker_sm = sfn.StateMachine(
-            self, "DeletionTrackerStateMachine",
-            definition=deletion_tracker_definition,
-            timeout=Duration.minutes(5)
-        )
+            upload_tracker_sm.grant_start_execution(router_lambda_role)
+            router_lambda.add_environment("CREATED_SF_ARN", upload_tracker_sm.state_machine_arn)
 
-        deletion_tracker_sm.grant_start_execution(router_lambda_role)
-        router_lambda.add_environment("DELETED_SF_ARN", deletion_tracker_sm.state_machine_arn)
+            # DeletionTracker Step Function
+            deletion_tracker_definition = tasks.LambdaInvoke(
+                self, "InvokeDeletionProcessor",
+                lambda_function=deletion_lambda_fn,
+                output_path="$.Payload"
+            )
+
+            deletion_tracker_sm = sfn.StateMachine(
+                self, "DeletionTrackerStateMachine",
+                definition=deletion_tracker_definition,
+                state_machine_type=state_machine_type,
+                timeout=Duration.minutes(5)
+            )
 
-                
+            deletion_tracker_sm.grant_start_execution(router_lambda_role)
+            router_lambda.add_environment("DELETED_SF_ARN", deletion_tracker_sm.state_machine_arn)
+
+        elif dispatch_mode == "lambda":
+            # Asynchronous invokes straight from the router; Lambda retries handler errors twice,
+            # after that (or once an event is too old) it lands here instead of being dropped
+            async_failure_queue = sqs.Queue(self, "AsyncInvokeFailureQueue",
+                                            retention_period=Duration.days(14))
+            for function in (MetaData_lambda_fn, deletion_lambda_fn):
+                function.configure_async_invoke(on_failure=destinations.SqsDestination(async_failure_queue))
+            MetaData_lambda_fn.grant_invoke(router_lambda_role)
+            deletion_lambda_fn.grant_invoke(router_lambda_role)
+            router_lambda.add_environment("CREATED_FUNCTION_NAME", MetaData_lambda_fn.function_name)
+            router_lambda.add_environment("DELETED_FUNCTION_NAME", deletion_lambda_fn.function_name)
+
+        else:
+            # The router runs both handlers itself, so it gets what both Lambdas are given
+            bucket.grant_read(router_lambda_role)
+            for table in (latest_table, skipped_table, failed_table, history_table, deleted_table,
+                          column_index_table, rollup_table, schema_table):
+                table.grant_read_write_data(router_lambda_role)
+            for name, value in {**metadata_environment, **deletion_environment}.items():
+                router_lambda.add_environment(name, value)
 
 
 
@@ -0,0 +1,188 @@
+import os
+import struct
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from botocore.exceptions import ClientError
+from helpers.compression_helper import ChunkReader, iter_decompressed
+from helpers.stream_helper import (ByteCounter, MAX_HEADER_BYTES, RangedReader, iter_ranged_chunks,
+                                   read_first_line)
+
+
+__all__ = [
+    "read_tar_header",
+    "read_tar_metadata",
+    "read_zip_catalog",
+    "read_zip_member_line",
+    "read_zip_metadata",
+    "cap_member_headers",
+]
+
+# Members listed per archive (the first lines of the tabular ones are read), and how many
+# of those reads run in parallel
+ZIP_MEMBER_LIMIT = int(os.environ.get('ZIP_MEMBER_LIMIT', '100'))
+ZIP_MEMBER_WORKERS = int(os.environ.get('ZIP_MEMBER_WORKERS', '4'))
+# Member headers are stored inline, only the top-level header is interned as a schema, so
+# they share this many bytes of column names to keep the item under DynamoDB's 400 KB
+ZIP_MEMBER_HEADER_BYTES = int(os.environ.get('ZIP_MEMBER_HEADER_BYTES', str(64 * 1024)))
+
+# zip compression method -> codec name in compression_helper; None is stored
+ZIP_CODECS = {
+    zipfile.ZIP_STORED: None,
+    zipfile.ZIP_DEFLATED: 'deflate',
+    zipfile.ZIP_BZIP2: 'bz2',
+    93: 'zst',
+}
+ZIP_METHOD_NAMES = {0: 'stored', 8: 'deflate', 9: 'deflate64', 12: 'bzip2', 14: 'lzma', 93: 'zstd'}
+
+# Local file header: signature and fixed fields, then name and extra field lengths
+LOCAL_HEADER = struct.Struct('<4s22xHH')
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+def _skipped_member(name):
+    # macOS resource forks ride along in many vendor archives
+    return name.split('/')[-1].startswith('._') or name.startswith('__MACOSX/')
+
+
+def read_tar_header(chunks, codec=None, max_bytes=MAX_HEADER_BYTES):
+    # Walks the archive as a stream ('r|'), so members are never seeked or buffered.
+    # Returns (member name, first line) of the first regular file, or (None, b'')
+    stream = ChunkReader(iter_decompressed(chunks, codec))
+    with tarfile.open(fileobj=stream, mode='r|') as tar:
+        for member in tar:
+            if not member.isfile() or _skipped_member(member.name):
+                continue
+            with tar.extractfile(member) as f:
+                return member.name, f.readline(max_bytes)
+    return None, b''
+
+
+def read_tar_metadata(s3, bucket, key, size=None, etag=None, compression=None, prefix=b'', **kwargs):
+    # compression is the codec around the tar stream, as detected from its magic bytes
+    from helpers.fileparsing_helper import parse_header_line
+
+    fetched = ByteCounter(iter_ranged_chunks(s3, bucket, key, size=size, start=len(prefix), etag=etag))
+    member, line = read_tar_header(chain([prefix], fetched), codec=compression)
+    if member is None:
+        return {'header': ["No file in TAR"], 'bytes_fetched': fetched.bytes_read}
+    return {'header': parse_header_line(line), 'member': member, 'bytes_fetched': fetched.bytes_read}
+
+
+def _member_data(chunks, compressed_size):
+    # Skips the local file header, whose extra field can differ from the central
+    # directory's, and yields the member's compressed bytes
+    buffer = bytearray()
+    chunks = iter(chunks)
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) < LOCAL_HEADER.size:
+            continue
+        signature, name_length, extra_length = LOCAL_HEADER.unpack_from(buffer)
+        if signature != LOCAL_HEADER_SIGNATURE:
+            raise ValueError("Bad zip local file header")
+        start = LOCAL_HEADER.size + name_length + extra_length
+        if len(buffer) >= start:
+            break
+    else:
+        return
+
+    remaining = compressed_size
+    data = bytes(buffer[start:])
+    for chunk in chain([data], chunks):
+        if remaining <= 0:
+            return
+        yield chunk[:remaining]
+        remaining -= len(chunk)
+
+
+def read_zip_member_line(s3, bucket, key, info, size=None, etag=None, max_bytes=MAX_HEADER_BYTES):
+    # First line of one member from its local header on, in growing ranged GETs; a
+    # multi-GB member costs about as much as a small one. Returns (line, bytes fetched)
+    if info.compress_type not in ZIP_CODECS:
+        raise ValueError(f"Unsupported zip compression: {ZIP_METHOD_NAMES.get(info.compress_type, info.compress_type)}")
+    if info.flag_bits & 0x1:
+        raise ValueError("Encrypted zip member")
+    fetched = ByteCounter(iter_ranged_chunks(s3, bucket, key, size=size, start=info.header_offset, etag=etag))
+    chunks = iter_decompressed(_member_data(fetched, info.compress_size), ZIP_CODECS[info.compress_type])
+    return read_first_line(chunks, max_bytes=max_bytes), fetched.bytes_read
+
+
+def read_zip_catalog(s3, bucket, key, size, etag=None, prefix=b'', member_limit=ZIP_MEMBER_LIMIT,
+                     workers=ZIP_MEMBER_WORKERS):
+    # Lists the archive from its central directory (one ranged GET near the end for most
+    # archives), then reads the first line of every tabular member among the first
+    # member_limit files. Returns (members, file count, bytes fetched)
+    from helpers.fileparsing_helper import extension_format, parse_header_line
+
+    reader = RangedReader(s3, bucket, key, size, etag=etag, prefix=prefix)
+    with zipfile.ZipFile(reader) as archive:
+        files = [info for info in archive.infolist() if not info.is_dir() and not _skipped_member(info.filename)]
+
+    members = []
+    tabular = []
+    for info in files[:member_limit]:
+        members.append({
+            'name': info.filename,
+            'size': info.file_size,
+            'compressed_size': info.compress_size,
+            'compression': ZIP_METHOD_NAMES.get(info.compress_type, str(info.compress_type)),
+        })
+        if extension_format(info.filename) == ('text', None):
+            tabular.append((members[-1], info))
+
+    def read_member(entry):
+        member, info = entry
+        try:
+            line, bytes_fetched = read_zip_member_line(s3, bucket, key, info, size=size, etag=etag)
+        except ClientError:
+            raise
+        except Exception as e:
+            print(f"Header parsing error for {key}!{info.filename}: {e}")
+            member['header'] = [f"Header parsing failed: {str(e)}"]
+            return 0
+        member['header'] = parse_header_line(line)
+        return bytes_fetched
+
+    if workers > 1 and len(tabular) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(tabular))) as pool:
+            bytes_fetched = sum(pool.map(read_member, tabular))
+    else:
+        bytes_fetched = sum(map(read_member, tabular))
+    return members, len(files), reader.bytes_read + bytes_fetched
+
+
+def cap_member_headers(members, max_bytes=ZIP_MEMBER_HEADER_BYTES):
+    # Keeps member headers in archive order while their column names fit in max_bytes;
+    # the rest are dropped, leaving the member's column count and header_truncated
+    budget = max_bytes
+    for member in members:
+        if 'header' not in member:
+            continue
+        member['column_count'] = len(member['header'])
+        header_bytes = sum(len(name.encode('utf-8')) + 1 for name in member['header'])
+        if header_bytes > budget:
+            del member['header']
+            member['header_truncated'] = True
+        else:
+            budget -= header_bytes
+    return members
+
+
+def read_zip_metadata(s3, bucket, key, size=None, etag=None, prefix=b'', **kwargs):
+    # 'header' stays the first tabular member's, as before; 'members' catalogs the archive
+    members, file_count, bytes_fetched = read_zip_catalog(s3, bucket, key, size, etag=etag, prefix=prefix,
+                                                          member_limit=ZIP_MEMBER_LIMIT, workers=ZIP_MEMBER_WORKERS)
+    first = next((member for member in members if 'header' in member), None)
+    header = first['header'] if first else ["No CSV or TXT file in ZIP"]
+    cap_member_headers(members, max_bytes=ZIP_MEMBER_HEADER_BYTES)
+    result = {
+        'header': header,
+        'members': members,
+        'member_count': file_count,
+        'bytes_fetched': bytes_fetched,
+    }
+    if first:
+        result['member'] = first['name']
+    return result
@@ -0,0 +1,102 @@
+import json
+from itertools import chain
+from helpers.compression_helper import ChunkReader
+from helpers.stream_helper import ByteCounter, MAX_HEADER_BYTES, iter_ranged_chunks
+
+
+__all__ = ["AVRO_MAGIC", "parse_avro_header", "avro_columns", "read_avro_metadata"]
+
+AVRO_MAGIC = b'Obj\x01'
+SYNC_SIZE = 16
+
+
+def _read_exact(stream, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise ValueError("Avro header ends before its sync marker")
+        data += chunk
+    return bytes(data)
+
+
+def _read_long(stream):
+    # Zig-zag varint, as every Avro int/long is encoded
+    shift = 0
+    value = 0
+    while True:
+        byte = _read_exact(stream, 1)[0]
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return (value >> 1) ^ -(value & 1)
+        shift += 7
+
+
+def _read_bytes(stream, max_bytes):
+    size = _read_long(stream)
+    if size < 0 or size > max_bytes:
+        raise ValueError(f"Avro header value of {size} bytes exceeds {max_bytes}")
+    return _read_exact(stream, size)
+
+
+def parse_avro_header(stream, max_bytes=MAX_HEADER_BYTES):
+    # The container header is magic, a map<string, bytes> of file metadata and the sync
+    # marker; the writer schema is the 'avro.schema' entry. Nothing past it is read
+    if _read_exact(stream, len(AVRO_MAGIC)) != AVRO_MAGIC:
+        raise ValueError("Missing Obj\\x01 magic (not an Avro container file)")
+    metadata = {}
+    while True:
+        count = _read_long(stream)
+        if count == 0:
+            break
+        if count < 0:
+            # A negative block count is followed by the block's size in bytes
+            count = -count
+            _read_long(stream)
+        for _ in range(count):
+            name = _read_bytes(stream, max_bytes).decode('utf-8')
+            metadata[name] = _read_bytes(stream, max_bytes)
+    _read_exact(stream, SYNC_SIZE)
+
+    if 'avro.schema' not in metadata:
+        raise ValueError("Avro header has no avro.schema entry")
+    return json.loads(metadata['avro.schema'].decode('utf-8')), metadata.get('avro.codec', b'null').decode('utf-8')
+
+
+def _type_names(schema):
+    # (physical, logical) names of a field type; nullable unions report their other branch
+    if isinstance(schema, list):
+        branches = [branch for branch in schema if branch != 'null']
+        if len(branches) != 1:
+            return 'union', None
+        schema = branches[0]
+    if isinstance(schema, dict):
+        return schema.get('type'), schema.get('logicalType')
+    return schema, None
+
+
+def avro_columns(schema):
+    # Top-level fields of a record schema, in the same shape as parquet columns
+    if not isinstance(schema, dict) or schema.get('type') != 'record':
+        return []
+    columns = []
+    for field in schema.get('fields', []):
+        physical_type, logical_type = _type_names(field.get('type'))
+        columns.append({'name': field['name'], 'physical_type': physical_type, 'logical_type': logical_type})
+    return columns
+
+
+def read_avro_metadata(s3, bucket, key, size=None, etag=None, prefix=b'', **kwargs):
+    # The header usually fits in the sniffed prefix; a very wide schema pulls growing
+    # ranged GETs until the sync marker, never a data block
+    fetched = ByteCounter(iter_ranged_chunks(s3, bucket, key, size=size, start=len(prefix), etag=etag))
+    schema, codec = parse_avro_header(ChunkReader(chain([prefix], fetched)))
+    columns = avro_columns(schema)
+    if not columns:
+        return {'header': ["Avro schema is not a record"], 'bytes_fetched': fetched.bytes_read}
+    return {
+        'header': [column['name'] for column in columns],
+        'columns': columns,
+        'block_codec': codec,
+        'bytes_fetched': fetched.bytes_read,
+    }
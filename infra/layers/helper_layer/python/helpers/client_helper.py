@@ -0,0 +1,24 @@
+import os
+from botocore.config import Config
+
+
+__all__ = ["client_config"]
+
+# Lambda talks to AWS over short hops: fail fast on a dead connection and let the
+# standard retry mode (with its client-side retry quota) absorb throttling
+CONNECT_TIMEOUT_SECONDS = float(os.environ.get('AWS_CONNECT_TIMEOUT_SECONDS', '2'))
+READ_TIMEOUT_SECONDS = float(os.environ.get('AWS_READ_TIMEOUT_SECONDS', '30'))
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '5'))
+RETRY_MODE = os.environ.get('AWS_RETRY_MODE', 'standard')
+
+
+def client_config(max_pool_connections=10, retry_mode=None):
+    # Shared by every boto3 client/resource the Lambdas create at import time. retry_mode
+    # overrides the mode for one client, e.g. 'adaptive' where bursts get throttled
+    return Config(
+        max_pool_connections=max(10, max_pool_connections),
+        connect_timeout=CONNECT_TIMEOUT_SECONDS,
+        read_timeout=READ_TIMEOUT_SECONDS,
+        retries={'mode': retry_mode or RETRY_MODE, 'max_attempts': MAX_ATTEMPTS},
+        tcp_keepalive=True,
+    )
@@ -0,0 +1,155 @@
+import bz2
+import io
+import lzma
+import os
+import zlib
+
+
+__all__ = [
+    "CODECS",
+    "ChunkReader",
+    "DecompressionLimitExceeded",
+    "iter_decompressed",
+    "iter_gunzipped",
+    "iter_inflated",
+    "register_codec",
+]
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Guards against decompression bombs: header/member lookups never need more than this
+MAX_DECOMPRESSED_BYTES = int(os.environ.get('MAX_DECOMPRESSED_BYTES', str(256 * 1024 * 1024)))
+# Full passes (row counts) allow at most this expansion of the compressed object
+MAX_COMPRESSION_RATIO = int(os.environ.get('MAX_COMPRESSION_RATIO', '200'))
+
+
+class DecompressionLimitExceeded(ValueError):
+    pass
+
+
+class ChunkReader(io.RawIOBase):
+    # Read-only, non-seekable file object over a chunk iterator (for tarfile, zstandard)
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        # memoryview slicing avoids re-copying large chunks on every small read
+        self._buffer = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not len(self._buffer):
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def iter_gunzipped(chunks, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Incrementally inflates gzip data; output per step is capped so memory stays bounded
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        while chunk:
+            data = decompressor.decompress(chunk, chunk_size)
+            if data:
+                yield data
+            if decompressor.eof:
+                # Concatenated gzip members are valid gzip, start over on the leftovers
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                chunk = decompressor.unconsumed_tail
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def iter_inflated(chunks, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Raw deflate without a gzip/zlib wrapper, as stored in zip members
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    for chunk in chunks:
+        while chunk and not decompressor.eof:
+            data = decompressor.decompress(chunk, chunk_size)
+            if data:
+                yield data
+            chunk = decompressor.unconsumed_tail
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def _iter_stdlib(chunks, factory, chunk_size):
+    # bz2/lzma decompressors: bounded output per call, concatenated streams supported
+    decompressor = factory()
+    for data in chunks:
+        while True:
+            if decompressor.eof:
+                data = decompressor.unused_data + data
+                if not data:
+                    break
+                decompressor = factory()
+            if not data and decompressor.needs_input:
+                break
+            output = decompressor.decompress(data, chunk_size)
+            data = b''
+            if output:
+                yield output
+
+
+def _iter_bz2(chunks, chunk_size):
+    return _iter_stdlib(chunks, bz2.BZ2Decompressor, chunk_size)
+
+
+def _iter_xz(chunks, chunk_size):
+    return _iter_stdlib(chunks, lzma.LZMADecompressor, chunk_size)
+
+
+def _iter_zstd(chunks, chunk_size):
+    # Optional dependency, only imported when a zstd object shows up
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd support requires the 'zstandard' package in the layer")
+    reader = zstandard.ZstdDecompressor().stream_reader(ChunkReader(chunks), read_across_frames=True)
+    while True:
+        output = reader.read(chunk_size)
+        if not output:
+            return
+        yield output
+
+
+# codec name -> function(chunks, chunk_size) yielding decompressed chunks
+CODECS = {
+    'gz': iter_gunzipped,
+    'deflate': iter_inflated,
+    'bz2': _iter_bz2,
+    'xz': _iter_xz,
+    'zst': _iter_zstd,
+}
+
+
+def register_codec(name, function):
+    CODECS[name] = function
+
+
+def _capped(chunks, max_output):
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        if total > max_output:
+            raise DecompressionLimitExceeded(f"Decompressed data exceeds {max_output} bytes")
+        yield chunk
+
+
+def iter_decompressed(chunks, codec, chunk_size=DEFAULT_CHUNK_SIZE, max_output=MAX_DECOMPRESSED_BYTES):
+    # Passes data through untouched when codec is None
+    if codec is None:
+        return iter(chunks)
+    if codec not in CODECS:
+        raise ValueError(f"Unsupported compression: {codec}")
+    output = CODECS[codec](chunks, chunk_size)
+    return _capped(output, max_output) if max_output else output
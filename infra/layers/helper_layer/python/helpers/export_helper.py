@@ -0,0 +1,214 @@
+import json
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from boto3.dynamodb.types import TypeDeserializer
+
+
+__all__ = [
+    "EXPORT_SCHEMA",
+    "S3Store",
+    "change_rows",
+    "write_changes",
+    "compact",
+]
+
+# Columns of every change file and snapshot. Column lists stay in the schema table,
+# joined on schema_hash
+EXPORT_SCHEMA = pa.schema([
+    ('change_type', pa.string()),
+    ('change_time', pa.timestamp('ms', tz='UTC')),
+    ('sequence_number', pa.string()),
+    ('filepath', pa.string()),
+    ('bucket', pa.string()),
+    ('folder', pa.string()),
+    ('filename', pa.string()),
+    ('file_type', pa.string()),
+    ('compression', pa.string()),
+    ('content_type', pa.string()),
+    ('size', pa.int64()),
+    ('etag', pa.string()),
+    ('schema_hash', pa.string()),
+    ('column_count', pa.int64()),
+    ('row_count', pa.int64()),
+    ('timestamp', pa.string()),
+    ('deletion_timestamp', pa.string()),
+])
+
+CHANGES_PREFIX = 'changes/'
+SNAPSHOT_PREFIX = 'snapshot/'
+MANIFEST_KEY = 'snapshot/_manifest.json'
+
+# Change files are partitioned by the date of the change; a batch can still land in a day
+# after compaction has seen the next one, so this many earlier days stay open
+EXPORT_LATE_DAYS = int(os.environ.get('EXPORT_LATE_DAYS', '1'))
+
+# Stream sequence numbers are decimal strings of varying length; padded they sort as numbers
+SEQUENCE_WIDTH = 40
+
+_deserializer = TypeDeserializer()
+
+
+class S3Store:
+    # The few object operations the export needs, so tools can swap in a local directory
+    def __init__(self, s3, bucket):
+        self.s3 = s3
+        self.bucket = bucket
+
+    def put(self, key, data):
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def get(self, key):
+        try:
+            return self.s3.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def delete(self, key):
+        self.s3.delete_object(Bucket=self.bucket, Key=key)
+
+    def keys(self, prefix, start_after=None):
+        request = {'Bucket': self.bucket, 'Prefix': prefix}
+        if start_after:
+            request['StartAfter'] = start_after
+        for page in self.s3.get_paginator('list_objects_v2').paginate(**request):
+            for item in page.get('Contents', []):
+                yield item['Key']
+
+    def prefixes(self, prefix):
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+            for item in page.get('CommonPrefixes', []):
+                yield item['Prefix']
+
+
+def _plain(value):
+    # Numbers come back from DynamoDB as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def _change_time(value):
+    # Lambda hands over epoch seconds; recorded GetRecords output may hold an ISO string
+    if isinstance(value, str):
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return datetime.fromtimestamp(float(value), tz=timezone.utc)
+
+
+def _source_table(record, table_names, default_table):
+    # 'latest' or 'deleted' from the stream ARN (arn:...:table/<name>/stream/<label>)
+    arn = record.get('eventSourceARN') or ''
+    if ':table/' not in arn:
+        return default_table
+    table_name = arn.split(':table/', 1)[1].split('/', 1)[0]
+    return table_names.get(table_name, table_name)
+
+
+def change_rows(records, table_names=None, default_table='latest'):
+    # Stream records grouped into {(table, bucket, date): [row]}, each group in stream order.
+    # Removes carry the old image, so the row says what was removed
+    groups = defaultdict(list)
+    for record in records:
+        change = record['dynamodb']
+        image = change.get('OldImage' if record['eventName'] == 'REMOVE' else 'NewImage') or change.get('Keys', {})
+        item = {name: _plain(_deserializer.deserialize(value)) for name, value in image.items()}
+        changed_at = _change_time(change['ApproximateCreationDateTime'])
+
+        row = {name: item.get(name) for name in EXPORT_SCHEMA.names}
+        row.update(change_type=record['eventName'], change_time=changed_at,
+                   sequence_number=str(change['SequenceNumber']))
+        row['bucket'] = row['bucket'] or row['filepath'].split('/', 1)[0]
+        table = _source_table(record, table_names or {}, default_table)
+        groups[(table, row['bucket'], changed_at.date().isoformat())].append(row)
+    for rows in groups.values():
+        rows.sort(key=lambda row: (row['change_time'], row['sequence_number'].zfill(SEQUENCE_WIDTH)))
+    return groups
+
+
+def _to_parquet(table):
+    buffer = BytesIO()
+    pq.write_table(table, buffer)
+    return buffer.getvalue()
+
+
+def _read_parquet(data):
+    return pq.read_table(BytesIO(data)).cast(EXPORT_SCHEMA)
+
+
+def write_changes(store, records, table_names=None, default_table='latest'):
+    # One Parquet file per (table, bucket, date) in the batch. Names come from the batch's
+    # first and last sequence numbers, so a retried batch overwrites its own files.
+    # Returns the keys written
+    written = []
+    for (table, bucket, day), rows in sorted(change_rows(records, table_names, default_table).items()):
+        name = (f"{rows[0]['change_time']:%H%M%S}-{rows[0]['sequence_number']}"
+                f"-{rows[-1]['sequence_number']}.parquet")
+        key = f"{CHANGES_PREFIX}table={table}/bucket={bucket}/date={day}/{name}"
+        store.put(key, _to_parquet(pa.Table.from_pylist(rows, schema=EXPORT_SCHEMA)))
+        written.append(key)
+    return written
+
+
+def _key_date(key):
+    return key.split('/date=', 1)[1].split('/', 1)[0]
+
+
+def _latest_rows(table):
+    # Last change of every filepath, removed files dropped
+    if table.num_rows == 0:
+        return table
+    order = pc.utf8_lpad(table['sequence_number'], SEQUENCE_WIDTH, '0')
+    table = table.append_column('_order', order).sort_by(
+        [('filepath', 'ascending'), ('change_time', 'ascending'), ('_order', 'ascending')])
+    filepaths = table['filepath']
+    is_last = pc.not_equal(filepaths[:-1], filepaths[1:]).combine_chunks()
+    is_last = pa.concat_arrays([is_last, pa.array([True])])
+    table = table.filter(is_last).drop_columns(['_order'])
+    return table.filter(pc.not_equal(table['change_type'], 'REMOVE'))
+
+
+def compact(store):
+    # Folds the latest table's change files into snapshot/bucket=<b>/snapshot.parquet, the
+    # current state of every tracked file. Only buckets with unapplied change files are
+    # rewritten; the manifest remembers the files applied in the still-open days.
+    # Returns a summary per rewritten bucket
+    manifest = json.loads(store.get(MANIFEST_KEY) or b'{"buckets": {}}')
+    summary = {}
+    prefix = f"{CHANGES_PREFIX}table=latest/"
+    for bucket_prefix in store.prefixes(prefix):
+        bucket = bucket_prefix[len(prefix) + len('bucket='):].rstrip('/')
+        state = manifest['buckets'].get(bucket, {'open_from': None, 'applied': []})
+        start_after = f"{bucket_prefix}date={state['open_from']}" if state['open_from'] else None
+        applied = set(state['applied'])
+        pending = [key for key in store.keys(bucket_prefix, start_after=start_after) if key not in applied]
+        if not pending:
+            continue
+
+        snapshot_key = f"{SNAPSHOT_PREFIX}bucket={bucket}/snapshot.parquet"
+        snapshot = store.get(snapshot_key)
+        tables = [_read_parquet(snapshot)] if snapshot else []
+        tables.extend(_read_parquet(store.get(key)) for key in pending)
+        current = _latest_rows(pa.concat_tables(tables))
+        if current.num_rows:
+            store.put(snapshot_key, _to_parquet(current))
+        elif snapshot:
+            store.delete(snapshot_key)
+
+        newest = max(_key_date(key) for key in list(applied) + pending)
+        open_from = (date.fromisoformat(newest) - timedelta(days=EXPORT_LATE_DAYS)).isoformat()
+        state = {'open_from': open_from,
+                 'applied': sorted(key for key in applied.union(pending) if _key_date(key) >= open_from)}
+        manifest['buckets'][bucket] = state
+        summary[bucket] = {'change_files': len(pending), 'rows': current.num_rows}
+
+    if summary:
+        manifest['compacted_at'] = datetime.now(timezone.utc).isoformat()
+        store.put(MANIFEST_KEY, json.dumps(manifest, indent=1).encode('utf-8'))
+    return summary
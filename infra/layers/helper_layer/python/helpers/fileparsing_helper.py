@@ -1,33 +1,228 @@
-
-import pyarrow.parquet as pq
+import importlib
+import json
+import os
+import re
+from itertools import chain
 from io import BytesIO
 import zipfile
 import gzip
+from botocore.exceptions import ClientError
+from helpers.compression_helper import iter_decompressed
+from helpers.sniff_helper import SNIFF_BYTES, describe_type, sniff_format
+from helpers.stream_helper import (ByteCounter, iter_ranged_chunks, read_sample_lines,
+                                   stream_header_line, stream_row_count)
+
+
+__all__ = [
+    "read_file_header",
+    "read_object_metadata",
+    "read_text_metadata",
+    "read_jsonl_metadata",
+    "jsonl_keys",
+    "extension_format",
+    "resolve_format",
+    "split_extension",
+    "register_reader",
+    "detect_delimiter",
+    "sniff_delimiter",
+    "parse_header_line",
+]
+
+# Object readers by format, as "module:function" taking (s3, bucket, key, size=, etag=,
+# compression=, prefix=, encoding=). prefix holds the bytes already fetched for sniffing.
+# Modules are imported the first time their format is seen, so a container that only
+# ever handles CSV never pays for pyarrow
+FORMAT_READERS = {
+    'parquet': 'helpers.parquet_helper:read_parquet_metadata',
+    'text': 'helpers.fileparsing_helper:read_text_metadata',
+    'tar': 'helpers.archive_helper:read_tar_metadata',
+    'zip': 'helpers.archive_helper:read_zip_metadata',
+    'avro': 'helpers.avro_helper:read_avro_metadata',
+    'orc': 'helpers.orc_helper:read_orc_metadata',
+    'jsonl': 'helpers.fileparsing_helper:read_jsonl_metadata',
+    'xlsx': 'helpers.xlsx_helper:read_xlsx_metadata',
+}
+_loaded_readers = {}
+
+# Formats that can sit inside a single-stream codec (gz, bz2, xz, zst)
+COMPRESSIBLE_FORMATS = {'text', 'tar', 'jsonl'}
+
+# Formats whose magic bytes are those of a more generic container
+FORMAT_FAMILY = {'xlsx': 'zip', 'jsonl': 'text'}
+
+# Extension (without compression suffix) -> format implied by the key
+EXTENSION_FORMATS = {
+    'parquet': 'parquet',
+    'pq': 'parquet',
+    'csv': 'text',
+    'txt': 'text',
+    'psv': 'text',
+    'tsv': 'text',
+    'zip': 'zip',
+    'avro': 'avro',
+    'orc': 'orc',
+    'jsonl': 'jsonl',
+    'ndjson': 'jsonl',
+    'xlsx': 'xlsx',
+    'xlsm': 'xlsx',
+}
+
+# Single-stream compression suffixes, and tar suffixes with the codec around the tar stream
+COMPRESSION_SUFFIXES = ('gz', 'bz2', 'xz', 'zst')
+TAR_SUFFIXES = {
+    'tar.gz': 'gz', 'tgz': 'gz',
+    'tar.bz2': 'bz2', 'tbz2': 'bz2',
+    'tar.xz': 'xz', 'txz': 'xz',
+    'tar.zst': 'zst', 'tzst': 'zst',
+    'tar': None,
+}
+
+# Optional column profiling of text formats from a bounded sample
+PROFILE_COLUMNS = os.environ.get('ENABLE_COLUMN_PROFILING', 'false').lower() == 'true'
+PROFILE_SAMPLE_ROWS = int(os.environ.get('PROFILE_SAMPLE_ROWS', '1000'))
+PROFILE_SAMPLE_BYTES = int(os.environ.get('PROFILE_SAMPLE_BYTES', str(1024 * 1024)))
+
+# Optional row counts for text formats. Counting reads past the header, so it is off by
+# default and bounded: objects above the cut-off get an estimate from their first bytes
+COUNT_ROWS = os.environ.get('ENABLE_ROW_COUNT', 'false').lower() == 'true'
+ROW_COUNT_MAX_BYTES = int(os.environ.get('ROW_COUNT_MAX_BYTES', str(4 * 1024 * 1024)))
+
+# JSON Lines records whose keys make up the header; later records can add optional keys
+JSONL_SAMPLE_RECORDS = int(os.environ.get('JSONL_SAMPLE_RECORDS', '10'))
+JSONL_SAMPLE_BYTES = int(os.environ.get('JSONL_SAMPLE_BYTES', str(256 * 1024)))
+
+DELIMITERS = [',', '\t', ';', '|']
+QUOTED = re.compile(r'"[^"]*"')
 
 
-__all__ = ["read_file_header", "detect_delimiter", "parse_header_line"]
+def register_reader(format_name, target, extensions=(), family=None, compressible=False):
+    FORMAT_READERS[format_name] = target
+    _loaded_readers.pop(format_name, None)
+    for extension in extensions:
+        EXTENSION_FORMATS[extension] = format_name
+    if family:
+        FORMAT_FAMILY[format_name] = family
+    if compressible:
+        COMPRESSIBLE_FORMATS.add(format_name)
+
+
+def _load_reader(format_name):
+    if format_name not in FORMAT_READERS:
+        return None
+    if format_name not in _loaded_readers:
+        module_name, function_name = FORMAT_READERS[format_name].split(':')
+        _loaded_readers[format_name] = getattr(importlib.import_module(module_name), function_name)
+    return _loaded_readers[format_name]
+
+
+def sniff_delimiter(lines):
+    # Picks the candidate that splits every line into the same number of fields, preferring
+    # the most frequent one; quoted text is ignored so embedded commas don't count
+    best, best_score = ',', None
+    for delim in DELIMITERS:
+        counts = [QUOTED.sub('', line).count(delim) for line in lines if line]
+        if not counts or counts[0] == 0:
+            continue
+        score = (len(set(counts)) == 1, counts[0])
+        if best_score is None or score > best_score:
+            best, best_score = delim, score
+    return best
+
+def split_extension(filename):
+    # Returns (file_type, compression): 'a.csv.gz' -> ('csv', 'gz'), 'a.tar.gz' -> ('unknown', 'tar.gz')
+    lowered = filename.lower()
+    compression = None
+    for suffix in list(TAR_SUFFIXES) + list(COMPRESSION_SUFFIXES):
+        if lowered.endswith('.' + suffix):
+            compression = suffix
+            filename = filename[:-len(suffix) - 1]
+            break
+    # file_type keys an index, where '' is not a valid value ('data.' has no extension either)
+    file_type = filename.split('.')[-1] if '.' in filename else ''
+    return file_type or 'unknown', compression
+
+def extension_format(key):
+    # (format, compression) implied by the key alone
+    file_type, compression = split_extension(key.split('/')[-1])
+    if compression in TAR_SUFFIXES:
+        return 'tar', TAR_SUFFIXES[compression]
+    format_name = EXTENSION_FORMATS.get(file_type.lower())
+    if compression and format_name is None:
+        # A bare .gz/.bz2/... has always been read as compressed text
+        format_name = 'text'
+    return format_name, compression
+
+def resolve_format(detected, ext_format, ext_compression, has_extension=False):
+    # Magic bytes win over the extension, except where the extension is more specific
+    # about the same thing (e.g. bytes say zip, extension says xlsx). Text has no magic,
+    # so text of unknown encoding needs a text extension, and an extension we don't
+    # read (.json, .md) stays unsupported. has_extension: the key has one, known or not
+    sniffed, compression = detected['format'], detected['compression']
+    if sniffed is None:
+        # Compressed payload we could not peek into: trust the extension if the codec agrees
+        if compression and ext_compression == compression and ext_format:
+            return ext_format, compression
+        return ('text' if compression else None), compression
+    if ext_format and FORMAT_FAMILY.get(ext_format, ext_format) == sniffed and ext_compression == compression:
+        return ext_format, compression
+    if sniffed == 'text' and (detected['encoding'] is None or (has_extension and ext_format is None)):
+        return None, compression
+    return sniffed, compression
 
 def detect_delimiter(line):
-    for delim in [',', '\t', ';', '|']:
-        if delim in line:
-            return delim
-    return ','
+    return sniff_delimiter([line])
 
-def parse_header_line(raw_line):
+def parse_header_line(raw_line, delimiter=None, encoding=None):
     try:
-        line = raw_line.decode('utf-8').strip()
+        if encoding == 'utf-16':
+            # Lines are cut at the 0x0A byte, the odd trailing byte of LE text is dropped
+            line = raw_line.decode('utf-16', errors='ignore').strip()
+        else:
+            line = raw_line.decode('utf-8-sig').strip()
     except UnicodeDecodeError:
         return ["Decode error"]
-    delimiter = detect_delimiter(line)
+    delimiter = delimiter or detect_delimiter(line)
     return [col.strip().strip('"') for col in line.split(delimiter)]
 
+def jsonl_keys(lines):
+    # Keys of the sampled records in first-seen order; blank lines are skipped
+    keys = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError(f"JSON Lines record is a {type(record).__name__}, not an object")
+        keys.update(dict.fromkeys(record))
+    return list(keys)
+
 def read_file_header(file_data, key):
     try:
         # Handle Parquet files
         if key.endswith('.parquet') or key.endswith('.pq'):
+            import pyarrow.parquet as pq
             table = pq.read_table(BytesIO(file_data))
             return table.schema.names
 
+        # Handle Avro, ORC, JSON Lines and Excel files
+        elif key.endswith('.avro'):
+            from helpers.avro_helper import avro_columns, parse_avro_header
+            schema, _ = parse_avro_header(BytesIO(file_data))
+            return [column['name'] for column in avro_columns(schema)]
+
+        elif key.endswith('.orc'):
+            from helpers.orc_helper import parse_orc_tail
+            # The whole file minus its leading magic is a (very long) tail
+            return parse_orc_tail(file_data[3:])['header']
+
+        elif key.endswith('.jsonl') or key.endswith('.ndjson'):
+            return jsonl_keys(file_data.splitlines()[:JSONL_SAMPLE_RECORDS])
+
+        elif key.endswith('.xlsx') or key.endswith('.xlsm'):
+            from helpers.xlsx_helper import read_xlsx_header
+            with zipfile.ZipFile(BytesIO(file_data)) as workbook:
+                return read_xlsx_header(workbook)[0]
+
         # Handle ZIP files
         elif key.endswith('.zip'):
             with zipfile.ZipFile(BytesIO(file_data)) as zipf:
@@ -50,3 +245,110 @@ def read_file_header(file_data, key):
         print(f"Header parsing error for {key}: {e}")
         return [f"Header parsing failed: {str(e)}"]
 
+
+def read_text_metadata(s3, bucket, key, size=None, etag=None, compression=None, prefix=b'', encoding=None):
+    if PROFILE_COLUMNS and encoding != 'utf-16':
+        result = profile_text_object(s3, bucket, key, size=size, etag=etag,
+                                     compression=compression, prefix=prefix)
+    else:
+        # Line-oriented formats only pull the first line
+        line, bytes_fetched = stream_header_line(s3, bucket, key, size=size, compression=compression,
+                                                 etag=etag, prefix=prefix)
+        result = {'header': parse_header_line(line, encoding=encoding), 'bytes_fetched': bytes_fetched}
+
+    if COUNT_ROWS:
+        row_count, exact, bytes_fetched = stream_row_count(
+            s3, bucket, key, size=size, compression=compression, etag=etag,
+            max_bytes=ROW_COUNT_MAX_BYTES, prefix=prefix)
+        result['row_count'] = row_count
+        result['row_count_exact'] = exact
+        result['bytes_fetched'] += bytes_fetched
+    return result
+
+
+def read_jsonl_metadata(s3, bucket, key, size=None, etag=None, compression=None, prefix=b'', **kwargs):
+    # Keys of the first few records; with no header line every line is a row
+    fetched = ByteCounter(iter_ranged_chunks(s3, bucket, key, size=size, etag=etag, start=len(prefix)))
+    chunks = iter_decompressed(chain([prefix], fetched), compression)
+    lines = read_sample_lines(chunks, max_lines=JSONL_SAMPLE_RECORDS, max_bytes=JSONL_SAMPLE_BYTES)
+    result = {'header': jsonl_keys(line.decode('utf-8-sig') for line in lines),
+              'bytes_fetched': fetched.bytes_read}
+
+    if COUNT_ROWS:
+        row_count, exact, bytes_fetched = stream_row_count(
+            s3, bucket, key, size=size, compression=compression, etag=etag,
+            max_bytes=ROW_COUNT_MAX_BYTES, header_lines=0, prefix=prefix)
+        result['row_count'] = row_count
+        result['row_count_exact'] = exact
+        result['bytes_fetched'] += bytes_fetched
+    return result
+
+
+def profile_text_object(s3, bucket, key, size=None, etag=None, compression=None, prefix=b'',
+                        sample_rows=PROFILE_SAMPLE_ROWS, sample_bytes=PROFILE_SAMPLE_BYTES):
+    # Reads at most sample_rows rows / sample_bytes decoded bytes, sniffs the delimiter
+    # across them and profiles every column of the sample
+    from helpers.profile_helper import profile_sample
+
+    fetched = ByteCounter(iter_ranged_chunks(s3, bucket, key, size=size, etag=etag, start=len(prefix),
+                                             first_range=sample_bytes))
+    chunks = iter_decompressed(chain([prefix], fetched), compression)
+    lines = read_sample_lines(chunks, max_lines=sample_rows + 1, max_bytes=sample_bytes)
+    if not lines:
+        return {'header': parse_header_line(b''), 'bytes_fetched': fetched.bytes_read}
+
+    try:
+        delimiter = sniff_delimiter([line.decode('utf-8-sig') for line in lines])
+    except UnicodeDecodeError:
+        return {'header': ["Decode error"], 'bytes_fetched': fetched.bytes_read}
+
+    header = parse_header_line(lines[0], delimiter=delimiter)
+    return {
+        'header': header,
+        'bytes_fetched': fetched.bytes_read,
+        'delimiter': delimiter,
+        'column_profile': profile_sample(lines, header, delimiter),
+        'profile_sample_rows': len(lines) - 1,
+    }
+
+
+def _read_prefix(s3, bucket, key, size, etag=None):
+    end = min(SNIFF_BYTES, size) - 1 if size else SNIFF_BYTES - 1
+    request = {'Bucket': bucket, 'Key': key, 'Range': f"bytes=0-{end}"}
+    if etag:
+        request['IfMatch'] = etag
+    return s3.get_object(**request)['Body'].read()
+
+
+def read_object_metadata(s3, bucket, key, size=None, etag=None):
+    # Returns a dict with at least 'header' and 'bytes_fetched'; some formats add more
+    # (parquet also reports column types, row and row-group counts from its footer).
+    # The first few KB decide the real format, so misnamed, unsupported or binary
+    # objects cost one small ranged GET
+    prefix = _read_prefix(s3, bucket, key, size, etag=etag)
+    detected = sniff_format(prefix)
+    ext_format, ext_compression = extension_format(key)
+    has_extension = split_extension(key.split('/')[-1])[0] != 'unknown'
+    format_name, compression = resolve_format(detected, ext_format, ext_compression, has_extension)
+    types = {
+        'detected_type': describe_type(detected['format'], detected['compression']),
+        'extension_type': describe_type(ext_format, ext_compression),
+    }
+
+    reader = None
+    if not compression or format_name in COMPRESSIBLE_FORMATS:
+        reader = _load_reader(format_name)
+    if reader is None:
+        return {**types, 'header': ["Unsupported file format"], 'bytes_fetched': len(prefix)}
+
+    try:
+        result = reader(s3, bucket, key, size=size, etag=etag, compression=compression,
+                        prefix=prefix, encoding=detected['encoding'])
+    except ClientError:
+        raise
+    except Exception as e:
+        print(f"Header parsing error for {key}: {e}")
+        return {**types, 'header': [f"Header parsing failed: {str(e)}"], 'bytes_fetched': len(prefix)}
+
+    result['bytes_fetched'] += len(prefix)
+    return {**types, **result}
@@ -0,0 +1,134 @@
+import threading
+from collections import Counter, OrderedDict
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+from helpers.storage_helper import normalize_sequencer
+
+
+__all__ = ["SeenCache", "SKIPPED_EVENTS", "event_fingerprint", "normalize_etag", "check_duplicate"]
+
+# Skipped events per reason for the lifetime of the container
+SKIPPED_EVENTS = Counter()
+_counter_lock = threading.Lock()
+
+
+class SeenCache:
+    # Small LRU of filepath -> fingerprint of the last event handled in this container
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, filepath):
+        with self._lock:
+            fingerprint = self._entries.get(filepath)
+            if fingerprint is not None:
+                self._entries.move_to_end(filepath)
+            return fingerprint
+
+    def remember(self, filepath, fingerprint):
+        with self._lock:
+            self._entries[filepath] = fingerprint
+            self._entries.move_to_end(filepath)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def normalize_etag(etag):
+    # head_object quotes the ETag, EventBridge does not
+    return etag.strip('"') if etag else None
+
+
+def event_fingerprint(s3_object):
+    # Built from the event's detail.object, so no S3 call is needed
+    return {
+        'etag': normalize_etag(s3_object.get('etag')),
+        'size': s3_object.get('size'),
+        'sequencer': normalize_sequencer(s3_object.get('sequencer')),
+    }
+
+
+def _compare_sequencers(stored, incoming):
+    if stored.get('sequencer') and incoming.get('sequencer'):
+        if incoming['sequencer'] == stored['sequencer']:
+            return 'duplicate'
+        if incoming['sequencer'] < stored['sequencer']:
+            return 'stale'
+    return None
+
+
+def _compare(stored, incoming):
+    reason = _compare_sequencers(stored, incoming)
+    if reason:
+        return reason
+    # Same bytes rewritten by a producer: nothing new to extract
+    if incoming.get('etag') and stored.get('etag') == incoming['etag'] \
+            and stored.get('size') is not None and int(stored['size']) == incoming.get('size'):
+        return 'duplicate'
+    return None
+
+
+def _count(reason, cache_hit=False):
+    with _counter_lock:
+        SKIPPED_EVENTS[reason] += 1
+        SKIPPED_EVENTS['total'] += 1
+        if cache_hit:
+            SKIPPED_EVENTS['cache_hits'] += 1
+
+
+def _advance_sequencer(main_table, filepath, stored, incoming):
+    # The skipped event is newer than the row's own event, e.g. a late event whose head_object
+    # already saw these bytes. Without moving the sequencer forward, a delete that S3 ordered
+    # before this upload would still count as newer than the row and remove it.
+    # Returns False when the row changed in between, so the event can't be skipped
+    if not incoming.get('sequencer') or (stored.get('sequencer') or '') >= incoming['sequencer']:
+        return True
+    try:
+        main_table.update_item(
+            Key={'filepath': filepath},
+            UpdateExpression='SET sequencer = :sequencer',
+            ConditionExpression=(Attr('sequencer').not_exists() | Attr('sequencer').lt(incoming['sequencer']))
+                                & Attr('etag').eq(incoming['etag']),
+            ExpressionAttributeValues={':sequencer': incoming['sequencer']}
+        )
+        stored['sequencer'] = incoming['sequencer']
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+
+def check_duplicate(main_table, filepath, fingerprint, cache=None):
+    # Returns 'duplicate' / 'stale' when the event can be skipped, otherwise None
+    if cache is not None:
+        cached = cache.get(filepath)
+        # The cache only proves redeliveries and older events: the row may have been
+        # deleted since, so an identical re-upload must still be checked against the table
+        reason = _compare_sequencers(cached, fingerprint) if cached else None
+        if reason:
+            _count(reason, cache_hit=True)
+            return reason
+
+    response = main_table.get_item(
+        Key={'filepath': filepath},
+        ProjectionExpression='etag, #size, sequencer',
+        ExpressionAttributeNames={'#size': 'size'}
+    )
+    stored = response.get('Item')
+    if not stored:
+        return None
+
+    reason = _compare(stored, fingerprint)
+    if reason == 'duplicate' and not _advance_sequencer(main_table, filepath, stored, fingerprint):
+        # Deleted or rewritten since the read: process it and let the conditional store decide
+        return None
+    if reason:
+        _count(reason)
+        if cache is not None:
+            cache.remember(filepath, stored)
+    return reason
@@ -0,0 +1,88 @@
+import os
+import zlib
+
+
+__all__ = [
+    "FOLDER_INDEX",
+    "FILE_TYPE_INDEX",
+    "BUCKET_INDEX",
+    "SCHEMA_INDEX",
+    "folder_key",
+    "index_attributes",
+    "bucket_shards",
+    "indexable_columns",
+    "update_column_index",
+]
+
+# GSI names and the bucket shard count, as declared in infra/file_metadata_tracker/config.py
+FOLDER_INDEX = 'FolderTimestampIndex'
+FILE_TYPE_INDEX = 'FileTypeSizeIndex'
+BUCKET_INDEX = 'BucketTimestampIndex'
+SCHEMA_INDEX = 'SchemaTimestampIndex'
+BUCKET_INDEX_SHARDS = int(os.environ.get('BUCKET_INDEX_SHARDS', '8'))
+
+MAX_INDEXED_COLUMNS = int(os.environ.get('MAX_INDEXED_COLUMNS', '1000'))
+
+# Single-entry headers that are reader errors, not column names
+HEADER_ERRORS = ("Unsupported file format", "Header parsing failed", "Decode error",
+                 "No file in TAR", "No CSV or TXT file in ZIP")
+
+
+def bucket_shards(bucket, shards=BUCKET_INDEX_SHARDS):
+    return [f"{bucket}#{shard}" for shard in range(shards)]
+
+
+def folder_key(bucket, folder):
+    # "bucket/folder" value of the folder GSI. Empty segments are dropped so '/raw/', 'raw'
+    # and the folder of '/raw/a.csv' all land on 'bucket/raw', as in rollup_helper.folder_keys
+    return f"{bucket}/{'/'.join(part for part in (folder or '').split('/') if part)}"
+
+
+def index_attributes(bucket, folder, filepath, shards=BUCKET_INDEX_SHARDS):
+    # GSI key attributes of a latest-table item; crc32 keeps the shard stable across runs
+    return {
+        'bucket_folder': folder_key(bucket, folder),
+        'bucket_shard': f"{bucket}#{zlib.crc32(filepath.encode()) % shards}",
+    }
+
+
+def indexable_columns(header, max_columns=MAX_INDEXED_COLUMNS):
+    if not header:
+        return []
+    if len(header) == 1 and str(header[0]).startswith(HEADER_ERRORS):
+        return []
+    columns = []
+    seen = set()
+    # '' can't be a key value, and duplicate names would just rewrite the same entry
+    for name in header:
+        if name and name not in seen:
+            seen.add(name)
+            columns.append(name)
+        if len(columns) >= max_columns:
+            break
+    return columns
+
+
+def update_column_index(column_table, filepath, old_item=None, new_item=None):
+    # Brings (column_name, filepath) entries from the old header to the new one. Only the
+    # difference is written, so rewriting a file with the same schema costs nothing
+    old_columns = set(indexable_columns((old_item or {}).get('header')))
+    new_columns = indexable_columns((new_item or {}).get('header'))
+    added = [name for name in new_columns if name not in old_columns]
+    removed = old_columns.difference(new_columns)
+    if not added and not removed:
+        return 0
+
+    # batch_writer groups 25 requests per call and resends unprocessed items
+    with column_table.batch_writer() as batch:
+        for name in removed:
+            batch.delete_item(Key={'column_name': name, 'filepath': filepath})
+        for name in added:
+            batch.put_item(Item={
+                'column_name': name,
+                'filepath': filepath,
+                'bucket': new_item.get('bucket'),
+                'file_type': new_item.get('file_type'),
+                'position': new_item['header'].index(name),
+            })
+    return len(added) + len(removed)
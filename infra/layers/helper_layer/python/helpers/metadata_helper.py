@@ -0,0 +1,173 @@
+from collections import namedtuple
+from helpers.fileparsing_helper import read_object_metadata, split_extension
+from helpers.storage_helper import store_latest
+from helpers.idempotency_helper import SKIPPED_EVENTS, check_duplicate, normalize_etag
+from helpers.index_helper import index_attributes, update_column_index
+from helpers.metrics_helper import current_metrics
+from helpers.rollup_helper import apply_rollups, rollup_deltas
+from helpers.schema_helper import intern_schema, schema_hash, with_schema
+
+
+__all__ = ["MetadataTables", "build_metadata", "process_object", "flush_rollups"]
+
+# columns is the (column_name, filepath) inverted index, rollups the per-folder counters
+# and schemas the interned column lists; all three are left out where they aren't deployed
+MetadataTables = namedtuple('MetadataTables',
+                            ['latest', 'skipped', 'failed', 'history', 'columns', 'rollups', 'schemas'],
+                            defaults=(None, None, None))
+
+
+def build_metadata(bucket, key, head_response, timestamp):
+    filepath = f"{bucket}/{key}"
+    filename = key.split('/')[-1]
+    folder = '/'.join(key.split('/')[:-1])
+    file_type, compression = split_extension(filename)
+    size = head_response.get('ContentLength', 0)
+    content_type = head_response.get('ContentType', 'unknown')
+    column_count = None
+    header = None
+
+    return {
+        'filepath': filepath,
+        'bucket': bucket,
+        'folder': folder,
+        'filename': filename,
+        'file_type': file_type,
+        'compression' : compression,
+        'size': size,
+        'content_type': content_type,
+        'timestamp': timestamp,
+        'header' : header,
+        'column_count' : column_count,
+        **index_attributes(bucket, folder, filepath)
+    }
+
+
+def process_object(s3, tables, bucket, key, timestamp, fingerprint, seen_events=None, rollups=None):
+    # Full pipeline for one object: duplicate check, head, header extraction, store.
+    # Returns 'stored', 'skipped', 'duplicate', 'stale' or 'failed'.
+    # Folder rollup deltas go to the rollups buffer when given (the caller flushes it once
+    # per batch), otherwise straight to the rollup table
+    filepath = f"{bucket}/{key}"
+    metrics = current_metrics()
+
+    # Redeliveries, stale events and identical rewrites are dropped before touching S3
+    with metrics.phase('DuplicateCheck'):
+        skip_reason = check_duplicate(tables.latest, filepath, fingerprint, cache=seen_events)
+    if skip_reason:
+        print(f"SKIPPED ({skip_reason}): {filepath} | skipped so far: {dict(SKIPPED_EVENTS)}")
+        return skip_reason
+
+    try:
+        with metrics.phase('HeadObject'):
+            response = s3.head_object(Bucket=bucket, Key=key)
+
+    except Exception as e:
+        print(f"FAILED: {filepath} | Error: {str(e)}")
+        tables.failed.put_item(Item={
+            'filepath': filepath,
+            'bucket': bucket,
+            'timestamp': timestamp,
+            'error': str(e)
+        })
+        return 'failed'
+
+    metadata = build_metadata(bucket, key, response, timestamp)
+    size = metadata['size']
+
+    # Event order and content identity for this key; only set when present so
+    # conditional writes and duplicate checks can compare them
+    if fingerprint.get('sequencer'):
+        metadata['sequencer'] = fingerprint['sequencer']
+    etag = normalize_etag(response.get('ETag'))
+    if etag:
+        metadata['etag'] = etag
+
+    if key.endswith('/') or size == 0:
+        print(f"SKIPPED: {filepath}")
+        tables.skipped.put_item(Item={**metadata, 'reason': 'folder-like or empty object'})
+        return 'skipped'
+
+    try:
+        # Extract headers based on file type, streaming only what the format needs
+        with metrics.phase('ReadMetadata'):
+            metadata.update(read_object_metadata(s3, bucket, key, size=size, etag=response.get('ETag')))
+        metadata['column_count'] = len(metadata['header'])
+
+    except Exception as e:
+        print(f"HEADER PARSE FAILED: {filepath} | Error: {str(e)}")
+
+        tables.failed.put_item(Item={**metadata, 'reason': 'Header parsing Issue'})
+        return 'failed'
+
+    # The stored item references its column list by hash; the header stays on metadata
+    # for the column index
+    stored = dict(metadata)
+    if tables.schemas is not None:
+        try:
+            with metrics.phase('Schema'):
+                intern_schema(tables.schemas, stored)
+        except Exception as e:
+            # Keeping the header inline is always readable, just larger
+            print(f"SCHEMA INTERN FAILED: {filepath} | Error: {str(e)}")
+            metrics.increment('SchemaErrors')
+            stored = dict(metadata)
+
+    # Store new/updated metadata; the replaced version comes back from the same call
+    # and is archived to the history table
+    with metrics.phase('Store'):
+        status, old_item = store_latest(tables.latest, tables.history, stored)
+    if seen_events is not None:
+        seen_events.remember(filepath, fingerprint)
+    if status == 'stale':
+        print(f"STALE: {filepath} | newer metadata already stored")
+        return 'stale'
+
+    _report_drift(filepath, old_item, stored)
+
+    if tables.columns is not None:
+        try:
+            with metrics.phase('ColumnIndex'):
+                update_column_index(tables.columns, filepath, with_schema(old_item, tables.schemas), metadata)
+        except Exception as e:
+            # The metadata itself is stored; a missed index update is repaired by a re-run
+            print(f"COLUMN INDEX FAILED: {filepath} | Error: {str(e)}")
+            metrics.increment('ColumnIndexErrors')
+
+    if tables.rollups is not None:
+        if rollups is not None:
+            rollups.add(old_item, metadata)
+        else:
+            _apply_safely(tables.rollups, rollup_deltas(old_item, metadata), filepath)
+
+    print(f"STORED: {filepath}")
+    return 'stored'
+
+
+def _report_drift(filepath, old_item, new_item):
+    # Rows written before interning have no hash yet, theirs is derived from the header
+    if not old_item or not new_item.get('schema_hash'):
+        return
+    old_hash = old_item.get('schema_hash')
+    if not old_hash and old_item.get('header') is not None:
+        old_hash = schema_hash(old_item['header'], old_item.get('columns'))
+    if old_hash and old_hash != new_item['schema_hash']:
+        print(f"SCHEMA DRIFT: {filepath} | {old_hash} -> {new_item['schema_hash']}")
+        current_metrics().increment('SchemaDrift')
+
+
+def _apply_safely(rollup_table, deltas, filepath):
+    try:
+        with current_metrics().phase('Rollup'):
+            apply_rollups(rollup_table, deltas)
+    except Exception as e:
+        # Drift from a lost update is found and fixed by tools.reconcile_rollups
+        print(f"ROLLUP FAILED: {filepath} | Error: {str(e)}")
+        current_metrics().increment('RollupErrors')
+
+
+def flush_rollups(rollup_table, rollups):
+    # Applies everything a batch buffered, one update per folder
+    deltas = rollups.drain()
+    if deltas:
+        _apply_safely(rollup_table, deltas, f"batch of {len(deltas)} folders")
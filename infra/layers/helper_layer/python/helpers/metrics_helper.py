@@ -0,0 +1,157 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+__all__ = [
+    "InvocationMetrics",
+    "start_invocation",
+    "current_metrics",
+    "instrument_client",
+    "log_event",
+]
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'FileMetadataTracker')
+
+# Fraction of invocations that print their full input event
+EVENT_LOG_SAMPLE_RATE = float(os.environ.get('EVENT_LOG_SAMPLE_RATE', '0.01'))
+
+# Metric name prefixes per boto3 service, e.g. S3GetObjectTime, DynamoDBPutItemCalls
+SERVICE_PREFIXES = {'s3': 'S3', 'dynamodb': 'DynamoDB', 'stepfunctions': 'StepFunctions'}
+
+
+class InvocationMetrics:
+    # Accumulates timings and counters for one Lambda invocation. Worker threads of the
+    # same invocation share it, so every update takes the lock
+    def __init__(self, service, request_id=None):
+        self.service = service
+        self.request_id = request_id
+        self.values = Counter()
+        self.properties = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, value):
+        with self._lock:
+            self.values[name] += value
+
+    def increment(self, name, count=1):
+        self.add(name, count)
+
+    def set_property(self, name, value):
+        # Searchable in Logs Insights, but not a metric
+        self.properties[name] = value
+
+    @contextmanager
+    def phase(self, name):
+        # Adds the wall time of the block to <name>Time, in milliseconds
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(f"{name}Time", (time.perf_counter() - start) * 1000)
+
+    def record(self):
+        # One CloudWatch Embedded Metric Format document for the whole invocation
+        values = dict(self.values)
+        if 'ReadMetadataTime' in values:
+            # Time in the readers that was neither waiting for nor reading from S3
+            io_time = values.get('S3GetObjectTime', 0) + values.get('S3ReadTime', 0)
+            values['ParseTime'] = max(0.0, values['ReadMetadataTime'] - io_time)
+
+        metrics = [{'Name': name, 'Unit': _unit(name)} for name in sorted(values)]
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Service']],
+                    'Metrics': metrics,
+                }],
+            },
+            'Service': self.service,
+            **self.properties,
+            **{name: round(value, 3) for name, value in values.items()},
+        }
+        if self.request_id:
+            document['RequestId'] = self.request_id
+        return document
+
+    def emit(self):
+        print(json.dumps(self.record(), default=str))
+
+
+def _unit(name):
+    if name.endswith('Time'):
+        return 'Milliseconds'
+    if name.endswith('Bytes'):
+        return 'Bytes'
+    return 'Count'
+
+
+# Lambda runs one invocation at a time per container; tools and tests that never start
+# an invocation still get somewhere to record into
+_current = InvocationMetrics('default')
+
+
+def start_invocation(service, context=None):
+    global _current
+    _current = InvocationMetrics(service, request_id=getattr(context, 'aws_request_id', None))
+    return _current
+
+
+def current_metrics():
+    return _current
+
+
+class _TimedBody:
+    # Wraps a StreamingBody so time spent pulling object bytes is counted as S3ReadTime
+    def __init__(self, body):
+        self._body = body
+
+    def read(self, amt=None):
+        start = time.perf_counter()
+        data = self._body.read(amt)
+        metrics = current_metrics()
+        metrics.add('S3ReadTime', (time.perf_counter() - start) * 1000)
+        metrics.add('S3ReadBytes', len(data))
+        return data
+
+    def close(self):
+        self._body.close()
+
+    def __getattr__(self, name):
+        return getattr(self._body, name)
+
+
+def _before_call(model, context, **kwargs):
+    context['metrics_start'] = time.perf_counter()
+
+
+def _after_call(model, context, parsed, **kwargs):
+    start = context.pop('metrics_start', None)
+    service = model.service_model.service_name
+    name = f"{SERVICE_PREFIXES.get(service, service.capitalize())}{model.name}"
+    metrics = current_metrics()
+    metrics.increment(f"{name}Calls")
+    if start is not None:
+        metrics.add(f"{name}Time", (time.perf_counter() - start) * 1000)
+    if model.name == 'GetObject' and 'Body' in parsed:
+        parsed['Body'] = _TimedBody(parsed['Body'])
+
+
+def instrument_client(client):
+    # Times every API call of a boto3 client (pass resource.meta.client for resources)
+    service = client.meta.service_model.service_name
+    client.meta.events.register(f"before-call.{service}", _before_call)
+    client.meta.events.register(f"after-call.{service}", _after_call)
+    return client
+
+
+def log_event(event, label="Received event"):
+    # Full events are large; printing every one costs real time at volume
+    if EVENT_LOG_SAMPLE_RATE >= 1 or random.random() < EVENT_LOG_SAMPLE_RATE:
+        print(f"{label}: {json.dumps(event, default=str)}")
@@ -0,0 +1,99 @@
+from io import BytesIO
+import pyarrow.orc as orc
+
+
+__all__ = ["read_orc_tail", "parse_orc_tail", "read_orc_metadata"]
+
+ORC_MAGIC = b'ORC'
+# Same first read as the ORC readers themselves: postscript and footer almost always fit
+ORC_TAIL_BYTES = 16 * 1024
+
+
+def _get_range(s3, bucket, key, start, end, etag=None):
+    request = {'Bucket': bucket, 'Key': key, 'Range': f"bytes={start}-{end}"}
+    if etag:
+        request['IfMatch'] = etag
+    return s3.get_object(**request)['Body'].read()
+
+
+def _varint(data, position):
+    shift = 0
+    value = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _postscript_fields(postscript):
+    # The postscript is a small uncompressed protobuf; only varint fields are kept
+    fields = {}
+    position = 0
+    while position < len(postscript):
+        tag, position = _varint(postscript, position)
+        wire_type = tag & 0x7
+        if wire_type == 0:
+            fields[tag >> 3], position = _varint(postscript, position)
+        elif wire_type == 2:
+            length, position = _varint(postscript, position)
+            fields[tag >> 3] = postscript[position:position + length]
+            position += length
+        else:
+            raise ValueError(f"Unexpected wire type {wire_type} in ORC postscript")
+    return fields
+
+
+def _tail_length(tail):
+    # Bytes of footer + postscript + the postscript length byte at the end of the file
+    postscript_length = tail[-1]
+    if postscript_length + 1 > len(tail):
+        raise ValueError("ORC postscript does not fit in the object")
+    fields = _postscript_fields(tail[-1 - postscript_length:-1])
+    if fields.get(8000) != ORC_MAGIC:
+        raise ValueError("Missing ORC magic in postscript (not an ORC file)")
+    return fields.get(1, 0) + postscript_length + 1
+
+
+def read_orc_tail(s3, bucket, key, size, etag=None):
+    # One ranged GET of the last 16KB, a second one only for a footer that does not fit.
+    # Returns (footer + postscript + length byte, bytes fetched)
+    if size < len(ORC_MAGIC) + 1:
+        raise ValueError(f"Object too small to be ORC: {size} bytes")
+    start = max(size - ORC_TAIL_BYTES, 0)
+    tail = _get_range(s3, bucket, key, start, size - 1, etag)
+    bytes_fetched = len(tail)
+
+    tail_length = _tail_length(tail)
+    if tail_length > size - len(ORC_MAGIC):
+        raise ValueError(f"ORC footer of {tail_length} bytes does not fit in {size} byte object")
+    if tail_length > len(tail):
+        head = _get_range(s3, bucket, key, size - tail_length, start - 1, etag)
+        bytes_fetched += len(head)
+        tail = head + tail
+    return tail[-tail_length:], bytes_fetched
+
+
+def parse_orc_tail(tail):
+    # pyarrow only needs the footer and postscript for the schema and counts, so frame
+    # them as a file with no stripes instead of handing it the data
+    reader = orc.ORCFile(BytesIO(ORC_MAGIC + tail))
+    schema = reader.schema
+    return {
+        'header': schema.names,
+        'columns': [{'name': field.name, 'physical_type': str(field.type), 'logical_type': None}
+                    for field in schema],
+        'row_count': reader.nrows,
+        'row_count_exact': True,
+        'stripe_count': reader.nstripes,
+        'block_codec': reader.compression,
+    }
+
+
+def read_orc_metadata(s3, bucket, key, size, etag=None, **kwargs):
+    tail, bytes_fetched = read_orc_tail(s3, bucket, key, size, etag=etag)
+    result = parse_orc_tail(tail)
+    result['bytes_fetched'] = bytes_fetched
+    return result
@@ -0,0 +1,87 @@
+import struct
+from io import BytesIO
+import pyarrow.parquet as pq
+
+
+__all__ = ["read_parquet_footer", "parse_parquet_footer", "read_parquet_metadata"]
+
+PARQUET_MAGIC = b'PAR1'
+FOOTER_TAIL_SIZE = 8
+# One ranged read from the end covers the 8-byte tail and most footers; only files with
+# very wide schemas or many row groups need a second read for the rest of the footer
+FOOTER_READ_SIZE = 64 * 1024
+
+
+def _get_range(s3, bucket, key, start, end, etag=None):
+    request = {'Bucket': bucket, 'Key': key, 'Range': f"bytes={start}-{end}"}
+    if etag:
+        request['IfMatch'] = etag
+    return s3.get_object(**request)['Body'].read()
+
+
+def read_parquet_footer(s3, bucket, key, size, etag=None, prefix=b''):
+    # Returns (footer, bytes fetched). prefix is the start of the object, already read for
+    # sniffing: small files are parsed from it alone, otherwise the tail comes in one GET
+    if size < len(PARQUET_MAGIC) + FOOTER_TAIL_SIZE:
+        raise ValueError(f"Object too small to be parquet: {size} bytes")
+
+    # data holds bytes [start, size) of the object
+    start = max(0, size - FOOTER_READ_SIZE)
+    fetched = 0
+    if start >= len(prefix):
+        data = _get_range(s3, bucket, key, start, size - 1, etag)
+        fetched += len(data)
+    elif len(prefix) >= size:
+        data = prefix[start:size]
+    else:
+        tail = _get_range(s3, bucket, key, len(prefix), size - 1, etag)
+        fetched += len(tail)
+        data = prefix[start:] + tail
+
+    tail = data[-FOOTER_TAIL_SIZE:]
+    if len(data) != size - start or tail[4:] != PARQUET_MAGIC:
+        raise ValueError("Missing PAR1 magic at end of file (not parquet, or encrypted footer)")
+
+    footer_length = struct.unpack('<I', tail[:4])[0]
+    if footer_length + len(PARQUET_MAGIC) + FOOTER_TAIL_SIZE > size:
+        raise ValueError(f"Footer length {footer_length} does not fit in {size} byte object")
+
+    footer_start = size - FOOTER_TAIL_SIZE - footer_length
+    if footer_start < start:
+        rest = _get_range(s3, bucket, key, footer_start, start - 1, etag)
+        fetched += len(rest)
+        data = rest + data
+        start = footer_start
+    return data[footer_start - start:len(data) - FOOTER_TAIL_SIZE], fetched
+
+
+def parse_parquet_footer(footer):
+    # pyarrow only decodes the thrift FileMetaData here, so frame the footer as a
+    # minimal file instead of handing it the data pages
+    framed = PARQUET_MAGIC + footer + struct.pack('<I', len(footer)) + PARQUET_MAGIC
+    file_metadata = pq.read_metadata(BytesIO(framed))
+    schema = file_metadata.schema
+
+    columns = []
+    for i in range(len(schema)):
+        column = schema.column(i)
+        columns.append({
+            'name': column.path,
+            'physical_type': column.physical_type,
+            'logical_type': column.logical_type.type,
+        })
+
+    return {
+        'header': schema.to_arrow_schema().names,
+        'columns': columns,
+        'row_count': file_metadata.num_rows,
+        'row_count_exact': True,
+        'row_group_count': file_metadata.num_row_groups,
+    }
+
+
+def read_parquet_metadata(s3, bucket, key, size, etag=None, prefix=b'', **kwargs):
+    footer, bytes_fetched = read_parquet_footer(s3, bucket, key, size, etag=etag, prefix=prefix)
+    result = parse_parquet_footer(footer)
+    result['bytes_fetched'] = bytes_fetched
+    return result
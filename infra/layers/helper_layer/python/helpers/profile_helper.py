@@ -0,0 +1,61 @@
+from decimal import Decimal
+from io import BytesIO
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+
+__all__ = ["profile_sample"]
+
+# Wide files would otherwise push the item towards DynamoDB's 400 KB limit
+MAX_PROFILED_COLUMNS = 200
+MAX_VALUE_LENGTH = 256
+
+
+def _ratio(part, whole):
+    # DynamoDB rejects floats, ratios are stored as Decimal
+    return Decimal(str(round(part / whole, 4))) if whole else Decimal(0)
+
+
+def _text(value):
+    if value is None:
+        return None
+    return str(value)[:MAX_VALUE_LENGTH]
+
+
+def _profile_column(name, column, row_count):
+    profile = {
+        'name': name,
+        'type': str(column.type),
+        'null_ratio': _ratio(column.null_count, row_count),
+        # Exact for the sample, an estimate for the whole file
+        'distinct_count': pc.count_distinct(column, mode='only_valid').as_py(),
+    }
+    if column.null_count < row_count and not pa.types.is_null(column.type):
+        try:
+            bounds = pc.min_max(column)
+            profile['min'] = _text(bounds['min'].as_py())
+            profile['max'] = _text(bounds['max'].as_py())
+        except (pa.ArrowNotImplementedError, pa.ArrowInvalid):
+            # Types without an ordering (e.g. nested) just have no bounds
+            pass
+    return profile
+
+
+def profile_sample(lines, header, delimiter, max_columns=MAX_PROFILED_COLUMNS):
+    # lines[0] is the header line; the remaining lines are parsed and typed by Arrow in one
+    # batch, and every statistic is a vectorised compute kernel over a whole column
+    rows = b'\n'.join(lines[1:])
+    if not rows:
+        return []
+
+    table = pacsv.read_csv(
+        BytesIO(rows),
+        read_options=pacsv.ReadOptions(column_names=[f"c{i}" for i in range(len(header))]),
+        parse_options=pacsv.ParseOptions(delimiter=delimiter, invalid_row_handler=lambda row: 'skip'),
+        convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+    )
+    return [
+        _profile_column(name, column, table.num_rows)
+        for name, column in list(zip(header, table.columns))[:max_columns]
+    ]
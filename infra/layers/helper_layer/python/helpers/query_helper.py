@@ -0,0 +1,169 @@
+import heapq
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Attr, Key
+from helpers.index_helper import (BUCKET_INDEX, FILE_TYPE_INDEX, FOLDER_INDEX, SCHEMA_INDEX, bucket_shards,
+                                  folder_key)
+
+
+__all__ = [
+    "query_page",
+    "query_all",
+    "files_in_folder",
+    "files_by_type",
+    "files_in_bucket",
+    "files_with_columns",
+    "files_with_schema",
+    "parallel_scan",
+    "get_items",
+]
+
+BATCH_GET_SIZE = 100
+MAX_BATCH_RETRIES = 8
+
+
+def query_page(table, key_condition, index_name=None, filter_expression=None, page_size=None,
+               start_key=None, newest_first=False):
+    # One page of a Query. Returns (items, next start key or None), so callers can hand
+    # the key back to a client as a pagination token
+    request = {'KeyConditionExpression': key_condition, 'ScanIndexForward': not newest_first}
+    if index_name:
+        request['IndexName'] = index_name
+    if filter_expression is not None:
+        request['FilterExpression'] = filter_expression
+    if page_size:
+        request['Limit'] = page_size
+    if start_key:
+        request['ExclusiveStartKey'] = start_key
+    response = table.query(**request)
+    return response.get('Items', []), response.get('LastEvaluatedKey')
+
+
+def query_all(table, key_condition, limit=None, **kwargs):
+    # Follows LastEvaluatedKey until the query is exhausted or limit items are yielded
+    start_key = None
+    yielded = 0
+    while True:
+        items, start_key = query_page(table, key_condition, start_key=start_key, **kwargs)
+        for item in items:
+            yield item
+            yielded += 1
+            if limit and yielded >= limit:
+                return
+        if not start_key:
+            return
+
+
+def _time_range(name, since=None, until=None):
+    if since and until:
+        return Key(name).between(since, until)
+    if since:
+        return Key(name).gte(since)
+    if until:
+        return Key(name).lte(until)
+    return None
+
+
+def _with_range(condition, range_condition):
+    return condition & range_condition if range_condition is not None else condition
+
+
+def files_in_folder(table, bucket, folder, since=None, until=None, file_type=None, limit=None,
+                    newest_first=False):
+    # Objects directly in bucket/folder, in upload order; e.g. all parquet files of a drop
+    condition = _with_range(Key('bucket_folder').eq(folder_key(bucket, folder)),
+                            _time_range('timestamp', since, until))
+    filter_expression = Attr('file_type').eq(file_type) if file_type else None
+    return query_all(table, condition, index_name=FOLDER_INDEX, filter_expression=filter_expression,
+                     limit=limit, newest_first=newest_first)
+
+
+def files_by_type(table, file_type, min_size=None, max_size=None, limit=None, largest_first=False):
+    condition = Key('file_type').eq(file_type)
+    if min_size is not None and max_size is not None:
+        condition = condition & Key('size').between(min_size, max_size)
+    elif min_size is not None:
+        condition = condition & Key('size').gte(min_size)
+    elif max_size is not None:
+        condition = condition & Key('size').lte(max_size)
+    return query_all(table, condition, index_name=FILE_TYPE_INDEX, limit=limit, newest_first=largest_first)
+
+
+def files_in_bucket(table, bucket, since=None, until=None, workers=None):
+    # The bucket index is sharded; every shard is queried in parallel and the sorted
+    # shard results are merged back into timestamp order
+    shards = bucket_shards(bucket)
+    range_condition = _time_range('timestamp', since, until)
+
+    def query_shard(shard):
+        return list(query_all(table, _with_range(Key('bucket_shard').eq(shard), range_condition),
+                              index_name=BUCKET_INDEX))
+
+    with ThreadPoolExecutor(max_workers=workers or len(shards)) as pool:
+        results = list(pool.map(query_shard, shards))
+    return list(heapq.merge(*results, key=lambda item: item['timestamp']))
+
+
+def files_with_columns(column_table, column_names, workers=None):
+    # Filepaths that have every one of the columns, one index query per column in parallel
+    def query_column(name):
+        return {item['filepath'] for item in query_all(column_table, Key('column_name').eq(name))}
+
+    names = list(column_names)
+    if not names:
+        return []
+    with ThreadPoolExecutor(max_workers=workers or len(names)) as pool:
+        matches = list(pool.map(query_column, names))
+    return sorted(set.intersection(*matches))
+
+
+def files_with_schema(table, fingerprint, since=None, until=None, limit=None, newest_first=False):
+    # Files whose current version has exactly this schema, in upload order
+    condition = _with_range(Key('schema_hash').eq(fingerprint), _time_range('timestamp', since, until))
+    return query_all(table, condition, index_name=SCHEMA_INDEX, limit=limit, newest_first=newest_first)
+
+
+def parallel_scan(table, segments=8, filter_expression=None, projection=None, attribute_names=None):
+    # Last resort for questions no index answers: DynamoDB splits the table into
+    # segments that are read concurrently
+    def scan_segment(segment):
+        request = {'Segment': segment, 'TotalSegments': segments}
+        if filter_expression is not None:
+            request['FilterExpression'] = filter_expression
+        if projection:
+            request['ProjectionExpression'] = projection
+        if attribute_names:
+            request['ExpressionAttributeNames'] = attribute_names
+        items = []
+        while True:
+            response = table.scan(**request)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        return [item for items in pool.map(scan_segment, range(segments)) for item in items]
+
+
+def get_items(dynamodb, table_name, filepaths, projection=None):
+    # Full items for index results, 100 keys per BatchGetItem. Unprocessed keys (throttling)
+    # are retried with jittered exponential backoff
+    items = []
+    filepaths = list(dict.fromkeys(filepaths))
+    for start in range(0, len(filepaths), BATCH_GET_SIZE):
+        request = {'Keys': [{'filepath': filepath} for filepath in filepaths[start:start + BATCH_GET_SIZE]]}
+        if projection:
+            request['ProjectionExpression'] = projection
+        pending = {table_name: request}
+        for attempt in range(MAX_BATCH_RETRIES):
+            response = dynamodb.batch_get_item(RequestItems=pending)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            pending = response.get('UnprocessedKeys')
+            if not pending:
+                break
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+        else:
+            raise RuntimeError(f"BatchGetItem left {len(pending[table_name]['Keys'])} keys unprocessed")
+    return items
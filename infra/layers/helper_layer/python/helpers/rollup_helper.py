@@ -0,0 +1,75 @@
+import threading
+from collections import Counter, defaultdict
+
+
+__all__ = ["folder_keys", "rollup_deltas", "RollupBuffer", "apply_rollups"]
+
+
+def folder_keys(bucket, folder):
+    # Every level a file counts towards: 'b/', 'b/raw', 'b/raw/2024' for folder 'raw/2024'.
+    # Same "bucket/folder" form as the folder GSI
+    keys = [f"{bucket}/"]
+    parts = [part for part in (folder or '').split('/') if part]
+    for depth in range(1, len(parts) + 1):
+        keys.append(f"{bucket}/{'/'.join(parts[:depth])}")
+    return keys
+
+
+def _counters(item, sign):
+    size = int(item.get('size') or 0)
+    file_type = item.get('file_type') or 'unknown'
+    return {
+        'file_count': sign,
+        'total_bytes': sign * size,
+        f"files_{file_type}": sign,
+        f"bytes_{file_type}": sign * size,
+    }
+
+
+def rollup_deltas(old_item=None, new_item=None):
+    # {folder key: Counter(attribute -> delta)} for replacing old_item by new_item; either
+    # side may be None (create, delete). An overwrite nets out to its size difference
+    deltas = defaultdict(Counter)
+    for item, sign in ((old_item, -1), (new_item, 1)):
+        if not item:
+            continue
+        for key in folder_keys(item['bucket'], item.get('folder')):
+            deltas[key].update(_counters(item, sign))
+    return deltas
+
+
+class RollupBuffer:
+    # Coalesces deltas from a whole batch, so a hot prefix gets one update per flush
+    # instead of one per file. Shared by the worker threads of an invocation
+    def __init__(self):
+        self.deltas = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def add(self, old_item=None, new_item=None):
+        with self._lock:
+            for key, counters in rollup_deltas(old_item, new_item).items():
+                self.deltas[key].update(counters)
+
+    def drain(self):
+        with self._lock:
+            deltas, self.deltas = self.deltas, defaultdict(Counter)
+        return deltas
+
+
+def apply_rollups(rollup_table, deltas):
+    # One atomic ADD per folder; counters that netted out to zero are left alone.
+    # Returns the number of UpdateItem calls made
+    updates = 0
+    for folder_key, counters in sorted(deltas.items()):
+        counters = {name: value for name, value in counters.items() if value}
+        if not counters:
+            continue
+        names = {f"#a{i}": name for i, name in enumerate(sorted(counters))}
+        rollup_table.update_item(
+            Key={'folder_key': folder_key},
+            UpdateExpression='ADD ' + ', '.join(f"{placeholder} :v{placeholder[2:]}" for placeholder in names),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues={f":v{placeholder[2:]}": counters[name] for placeholder, name in names.items()},
+        )
+        updates += 1
+    return updates
@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+import json
+import os
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from helpers.idempotency_helper import SeenCache
+from helpers.metrics_helper import current_metrics
+
+
+__all__ = [
+    "SCHEMA_CACHE",
+    "SCHEMA_ATTRIBUTES",
+    "canonical_schema",
+    "schema_hash",
+    "intern_schema",
+    "load_schema",
+    "with_schema",
+    "schema_changes",
+]
+
+# Attributes that move from the file item to the schema table
+SCHEMA_ATTRIBUTES = ('header', 'columns')
+
+# Schemas larger than this are stored gzipped in one binary attribute, so very wide
+# files stay under DynamoDB's 400KB item limit
+SCHEMA_INLINE_BYTES = int(os.environ.get('SCHEMA_INLINE_BYTES', str(64 * 1024)))
+
+# schema hash -> {'header', 'columns'}; survives across warm invocations, so a container
+# that keeps seeing the same layout never reads or writes the schema table again
+SCHEMA_CACHE = SeenCache(max_entries=int(os.environ.get('SCHEMA_CACHE_SIZE', '256')))
+
+
+def canonical_schema(header, columns=None):
+    # Column order is part of the schema; surrounding whitespace is not. Parquet column
+    # types take part, so the same names with a changed type are a different schema
+    names = [str(name).strip() for name in header or []]
+    if not columns:
+        return names
+    return [[name, column.get('physical_type'), column.get('logical_type')]
+            for name, column in zip(names, columns)]
+
+
+def schema_hash(header, columns=None):
+    canonical = json.dumps(canonical_schema(header, columns), separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+
+def _encode(schema):
+    encoded = json.dumps(schema, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if len(encoded) <= SCHEMA_INLINE_BYTES:
+        return schema
+    return {'schema_gz': gzip.compress(encoded)}
+
+
+def _decode(item):
+    if 'schema_gz' in item:
+        return json.loads(gzip.decompress(bytes(item['schema_gz'])).decode('utf-8'))
+    return {name: item[name] for name in SCHEMA_ATTRIBUTES if name in item}
+
+
+def intern_schema(schema_table, metadata, cache=SCHEMA_CACHE):
+    # Replaces header/columns in metadata by a schema_hash reference and makes sure the
+    # schema table has that hash. The first writer wins; everyone else's put is a no-op.
+    # Returns the hash
+    schema = {name: metadata.pop(name) for name in SCHEMA_ATTRIBUTES if metadata.get(name) is not None}
+    fingerprint = schema_hash(schema.get('header'), schema.get('columns'))
+    metadata['schema_hash'] = fingerprint
+
+    if cache.get(fingerprint) is not None:
+        current_metrics().increment('SchemaCacheHits')
+        return fingerprint
+
+    try:
+        schema_table.put_item(
+            Item={
+                'schema_hash': fingerprint,
+                'column_count': len(schema.get('header') or []),
+                'first_seen': metadata.get('timestamp'),
+                'first_filepath': metadata.get('filepath'),
+                **_encode(schema),
+            },
+            ConditionExpression='attribute_not_exists(schema_hash)'
+        )
+        current_metrics().increment('SchemasInterned')
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+    cache.remember(fingerprint, schema)
+    return fingerprint
+
+
+def load_schema(schema_table, fingerprint, cache=SCHEMA_CACHE):
+    # {'header', 'columns'} for a hash, or None if the table does not have it
+    schema = cache.get(fingerprint)
+    if schema is not None:
+        return schema
+    item = schema_table.get_item(Key={'schema_hash': fingerprint}).get('Item')
+    if not item:
+        return None
+    schema = _decode(item)
+    cache.remember(fingerprint, schema)
+    return schema
+
+
+def with_schema(item, schema_table, cache=SCHEMA_CACHE):
+    # The item with its header/columns filled back in from the schema table. Items
+    # written before interning still carry their header and are returned as they are
+    if not item or 'header' in item or not item.get('schema_hash') or schema_table is None:
+        return item
+    return {**item, **(load_schema(schema_table, item['schema_hash'], cache) or {})}
+
+
+def _version_hash(item):
+    if item.get('schema_hash') or item.get('header') is None:
+        return item.get('schema_hash')
+    return schema_hash(item['header'], item.get('columns'))
+
+
+def schema_changes(history_table, filepath, latest_table=None):
+    # Every schema drift of one file, oldest first: [{'timestamp', 'from', 'to'}] between
+    # consecutive versions in the history table, plus the current row when latest_table is given
+    versions = []
+    # Rows written before interning have no hash, theirs is derived from header and columns
+    request = {'KeyConditionExpression': Key('filepath').eq(filepath),
+               'ProjectionExpression': '#timestamp, schema_hash, #header, #columns',
+               'ExpressionAttributeNames': {'#timestamp': 'timestamp', '#header': 'header', '#columns': 'columns'}}
+    while True:
+        response = history_table.query(**request)
+        versions.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    if latest_table is not None:
+        current = latest_table.get_item(Key={'filepath': filepath}).get('Item')
+        if current:
+            versions.append(current)
+
+    hashes = [_version_hash(version) for version in versions]
+    changes = []
+    for version, old_hash, new_hash in zip(versions[1:], hashes, hashes[1:]):
+        if old_hash != new_hash:
+            changes.append({'timestamp': version['timestamp'], 'from': old_hash, 'to': new_hash})
+    return changes
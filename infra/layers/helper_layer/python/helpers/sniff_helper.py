@@ -0,0 +1,106 @@
+import bz2
+import codecs
+import lzma
+import zlib
+
+
+__all__ = ["SNIFF_BYTES", "sniff_format", "describe_type"]
+
+# One small ranged GET is enough to recognise every format we handle
+SNIFF_BYTES = 4096
+
+# (magic, offset, format) for containers, checked in order
+FORMAT_MAGIC = [
+    (b'PAR1', 0, 'parquet'),
+    (b'PK\x03\x04', 0, 'zip'),
+    (b'PK\x05\x06', 0, 'zip'),
+    (b'ustar', 257, 'tar'),
+    (b'Obj\x01', 0, 'avro'),
+]
+
+# Magic too short to trust over text, only checked once the bytes are known to be binary
+# (a CSV may well start with an "ORC..." column)
+BINARY_MAGIC = [
+    (b'ORC', 0, 'orc'),
+]
+
+# (magic, compression) for single-stream codecs
+COMPRESSION_MAGIC = [
+    (b'\x1f\x8b', 'gz'),
+    (b'\x28\xb5\x2f\xfd', 'zst'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+]
+
+TEXT_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def describe_type(format_name, compression=None):
+    # Same vocabulary for detected and extension-implied types, e.g. 'text.gz', 'tar.zst';
+    # a compressed stream whose payload could not be peeked at is just 'bz2'
+    if not format_name:
+        return compression or 'unknown'
+    return f"{format_name}.{compression}" if compression else format_name
+
+
+def _peek_decompressed(data, compression):
+    # Best effort: bz2 emits nothing until a whole block (up to 900 KB) is in, and zstd
+    # needs an optional package, so those often come back empty
+    try:
+        if compression == 'gz':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data, SNIFF_BYTES)
+        if compression == 'xz':
+            return lzma.LZMADecompressor().decompress(data, SNIFF_BYTES)
+        if compression == 'bz2':
+            return bz2.BZ2Decompressor().decompress(data, SNIFF_BYTES)
+        if compression == 'zst':
+            import zstandard
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)[:SNIFF_BYTES]
+    except Exception:
+        pass
+    return b''
+
+
+def _is_utf8(data):
+    try:
+        # Incremental decode tolerates a multi-byte character cut off at the end
+        codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _sniff_uncompressed(data):
+    # Returns (format, encoding); format is None when the bytes say nothing useful
+    for magic, offset, format_name in FORMAT_MAGIC:
+        if data[offset:offset + len(magic)] == magic:
+            return format_name, None
+    if not data:
+        return None, None
+    for bom, encoding in TEXT_BOMS:
+        if data.startswith(bom):
+            return 'text', encoding
+    if b'\x00' not in data:
+        # Without a BOM the encoding is only known for UTF-8; other NUL-free bytes may
+        # still be Latin-1 or cp1252 text, which the extension has to vouch for
+        return 'text', ('utf-8' if _is_utf8(data) else None)
+    for magic, offset, format_name in BINARY_MAGIC:
+        if data[offset:offset + len(magic)] == magic:
+            return format_name, None
+    return 'binary', None
+
+
+def sniff_format(data):
+    # Returns {'format', 'compression', 'encoding'} from the first bytes of an object.
+    # format is None when the payload of a compressed stream could not be peeked at
+    for magic, compression in COMPRESSION_MAGIC:
+        if data.startswith(magic):
+            format_name, encoding = _sniff_uncompressed(_peek_decompressed(data, compression))
+            return {'format': format_name, 'compression': compression, 'encoding': encoding}
+
+    format_name, encoding = _sniff_uncompressed(data)
+    return {'format': format_name, 'compression': None, 'encoding': encoding}
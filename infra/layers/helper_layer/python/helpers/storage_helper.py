@@ -0,0 +1,203 @@
+import random
+import time
+from botocore.exceptions import ClientError
+from helpers.query_helper import get_items
+
+
+__all__ = ["normalize_sequencer", "store_latest", "delete_latest", "delete_latest_batch", "batch_write"]
+
+BATCH_WRITE_SIZE = 25
+TRANSACT_WRITE_SIZE = 100
+MAX_BATCH_RETRIES = 8
+
+# S3 sequencers vary in length; right-padding makes plain string comparison match event order
+SEQUENCER_WIDTH = 32
+
+
+def normalize_sequencer(sequencer):
+    if not sequencer:
+        return None
+    return sequencer.upper().ljust(SEQUENCER_WIDTH, '0')
+
+
+def store_latest(main_table, history_table, metadata):
+    # Reads the stored row, then writes the new one and archives the old one to History in
+    # one transaction that only goes through if the row is unchanged since the read, so a
+    # replaced version always reaches History. A row rewritten in between is read again.
+    # Returns (status, old_item) with status 'stored' or 'stale'
+    sequencer = metadata.get('sequencer')
+    for attempt in range(MAX_BATCH_RETRIES):
+        old_item = main_table.get_item(Key={'filepath': metadata['filepath']}, ConsistentRead=True).get('Item')
+        if old_item and _is_stale(old_item, sequencer):
+            return 'stale', None
+
+        put = {'TableName': main_table.name, 'Item': metadata}
+        if old_item:
+            condition, values = _unchanged_condition(old_item, sequencer)
+            put.update(ConditionExpression=condition, ExpressionAttributeNames={'#timestamp': 'timestamp'},
+                       ExpressionAttributeValues=values)
+        else:
+            put['ConditionExpression'] = 'attribute_not_exists(filepath)'
+        transact_items = [{'Put': put}]
+        if old_item:
+            transact_items.append({'Put': {'TableName': history_table.name, 'Item': old_item}})
+        try:
+            # The resource's client serializes plain values, like batch_write_item
+            main_table.meta.client.transact_write_items(TransactItems=transact_items)
+            return 'stored', old_item
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+                raise
+            reasons = e.response.get('CancellationReasons') or [{}]
+            if reasons[0].get('Code') != 'ConditionalCheckFailed':
+                # Conflicting writes in flight or throttling, back off like batch_write
+                time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+    raise RuntimeError(f"{metadata['filepath']} kept changing while being stored")
+
+
+def batch_write(dynamodb, writes):
+    # writes: [(table name, PutRequest/DeleteRequest dict)], sent 25 per BatchWriteItem.
+    # Unprocessed items (throttling) are resent with jittered exponential backoff
+    for start in range(0, len(writes), BATCH_WRITE_SIZE):
+        pending = {}
+        for table_name, request in writes[start:start + BATCH_WRITE_SIZE]:
+            pending.setdefault(table_name, []).append(request)
+        for attempt in range(MAX_BATCH_RETRIES):
+            pending = dynamodb.batch_write_item(RequestItems=pending).get('UnprocessedItems')
+            if not pending:
+                break
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+        else:
+            left = sum(len(requests) for requests in pending.values())
+            raise RuntimeError(f"BatchWriteItem left {left} items unprocessed")
+
+
+def _is_stale(stored_item, sequencer):
+    # True when the stored row came from a later event. Rows without a sequencer predate
+    # tracking, and unsequenced writes never replace sequenced ones
+    stored = stored_item.get('sequencer')
+    return bool(stored) and (not sequencer or stored >= sequencer)
+
+
+def _unchanged_condition(item, sequencer):
+    # Row unchanged since it was read (same store timestamp), and still older than the
+    # write, the rule of _is_stale: a duplicate skip can advance the sequencer alone
+    condition = '#timestamp = :timestamp AND (attribute_not_exists(sequencer)'
+    values = {':timestamp': item['timestamp']}
+    if sequencer:
+        condition += ' OR sequencer < :sequencer'
+        values[':sequencer'] = sequencer
+    return condition + ')', values
+
+
+def _delete_unchanged(client, table_name, log_table_name, rows):
+    # rows: {filepath: (item as read, delete sequencer, log item)}. Deletes every row that
+    # passes _unchanged_condition and puts its log item in the same TransactWriteItems, 50
+    # rows (100 writes) per transaction; BatchWriteItem takes no conditions.
+    # Returns the filepaths whose row changed in between, neither deleted nor logged
+    changed = set()
+    items = list(rows.items())
+    per_transaction = TRANSACT_WRITE_SIZE // 2
+    for start in range(0, len(items), per_transaction):
+        pending = dict(items[start:start + per_transaction])
+        attempt = 0
+        while pending:
+            transact_items = []
+            for filepath, (item, sequencer, log_item) in pending.items():
+                condition, values = _unchanged_condition(item, sequencer)
+                transact_items.append({'Delete': {
+                    'TableName': table_name,
+                    'Key': {'filepath': filepath},
+                    'ConditionExpression': condition,
+                    'ExpressionAttributeNames': {'#timestamp': 'timestamp'},
+                    'ExpressionAttributeValues': values,
+                }})
+                transact_items.append({'Put': {'TableName': log_table_name, 'Item': log_item}})
+            try:
+                # The resource's client serializes plain values, like batch_write_item
+                client.transact_write_items(TransactItems=transact_items)
+                break
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+                    raise
+                # One failed condition cancels the whole transaction; drop those rows and resend.
+                # Reasons come per write, the delete of each row first
+                reasons = (e.response.get('CancellationReasons') or [])[::2]
+                failed = {filepath for filepath, reason in zip(pending, reasons)
+                          if reason.get('Code') == 'ConditionalCheckFailed'}
+                if not failed:
+                    # Conflicting writes in flight or throttling, back off like batch_write
+                    attempt += 1
+                    if attempt >= MAX_BATCH_RETRIES:
+                        raise
+                    time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+                changed.update(failed)
+                pending = {filepath: row for filepath, row in pending.items() if filepath not in failed}
+    return changed
+
+
+def delete_latest(latest_table, deleted_table, filepath, deletion_timestamp, sequencer=None):
+    # Reads the row, then deletes it and logs it to FileDeleted in one transaction that only
+    # goes through if the row is unchanged, so a delete never loses its log record. A row
+    # rewritten in between is read again. Returns (status, old_item) with status 'deleted',
+    # 'not_found' or 'stale'
+    for _ in range(MAX_BATCH_RETRIES):
+        old_item = latest_table.get_item(Key={'filepath': filepath}, ConsistentRead=True).get('Item')
+        if not old_item:
+            return 'not_found', None
+        if _is_stale(old_item, sequencer):
+            return 'stale', None
+        rows = {filepath: (old_item, sequencer, {**old_item, 'deletion_timestamp': deletion_timestamp})}
+        if not _delete_unchanged(latest_table.meta.client, latest_table.name, deleted_table.name, rows):
+            return 'deleted', old_item
+    raise RuntimeError(f"{filepath} kept changing while being deleted")
+
+
+def delete_latest_batch(dynamodb, latest_table, deleted_table, deletions):
+    # Batched delete_latest for prefix-wide delete bursts. deletions: [(filepath,
+    # deletion_timestamp, sequencer)]. Returns {filepath: (status, old_item)}.
+    # The sequencer is checked against the rows read by BatchGetItem, and each delete (with
+    # its log record) only goes through if its row is unchanged since; rows an upload
+    # rewrote in between take the per-key delete_latest path instead. A transaction that
+    # fails leaves its rows untouched, they come back as 'error' while the rest keep
+    # their outcome, so a retry only redoes those
+    latest = {}
+    for filepath, deletion_timestamp, sequencer in deletions:
+        # The same key deleted twice in one batch: the later event wins
+        if filepath not in latest or (sequencer or '') > (latest[filepath][1] or ''):
+            latest[filepath] = (deletion_timestamp, sequencer)
+
+    stored = {item['filepath']: item for item in get_items(dynamodb, latest_table.name, list(latest))}
+
+    results = {}
+    deletable = {}
+    for filepath, (deletion_timestamp, sequencer) in latest.items():
+        old_item = stored.get(filepath)
+        if not old_item:
+            results[filepath] = ('not_found', None)
+        elif _is_stale(old_item, sequencer):
+            results[filepath] = ('stale', None)
+        else:
+            deletable[filepath] = (old_item, sequencer, {**old_item, 'deletion_timestamp': deletion_timestamp})
+
+    items = list(deletable.items())
+    per_transaction = TRANSACT_WRITE_SIZE // 2
+    for start in range(0, len(items), per_transaction):
+        chunk = dict(items[start:start + per_transaction])
+        try:
+            changed = _delete_unchanged(dynamodb.meta.client, latest_table.name, deleted_table.name, chunk)
+        except Exception as e:
+            print(f"BATCH DELETE FAILED: {len(chunk)} key(s) | Error: {str(e)}")
+            results.update((filepath, ('error', None)) for filepath in chunk)
+            continue
+        for filepath, (old_item, sequencer, _) in chunk.items():
+            if filepath not in changed:
+                results[filepath] = ('deleted', old_item)
+                continue
+            try:
+                results[filepath] = delete_latest(latest_table, deleted_table, filepath,
+                                                  latest[filepath][0], sequencer)
+            except Exception as e:
+                print(f"DELETE FAILED: {filepath} | Error: {str(e)}")
+                results[filepath] = ('error', None)
+    return results
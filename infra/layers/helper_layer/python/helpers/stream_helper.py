@@ -0,0 +1,256 @@
+import io
+from itertools import chain
+from botocore.exceptions import ClientError
+from helpers.compression_helper import (DEFAULT_CHUNK_SIZE, MAX_COMPRESSION_RATIO,
+                                        MAX_DECOMPRESSED_BYTES, iter_decompressed)
+
+
+__all__ = [
+    "ByteCounter",
+    "RangedReader",
+    "iter_body_chunks",
+    "iter_ranged_chunks",
+    "read_first_line",
+    "read_sample_lines",
+    "read_header_line",
+    "stream_header_line",
+    "count_lines",
+    "stream_row_count",
+]
+
+MAX_RANGE_SIZE = 8 * 1024 * 1024
+MAX_HEADER_BYTES = 4 * 1024 * 1024
+COUNT_CHUNK_SIZE = 1024 * 1024
+
+
+class ByteCounter:
+    # Wraps a chunk iterator and keeps track of how many bytes went through it
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.bytes_read = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+class RangedReader(io.RawIOBase):
+    # Seekable read-only file over an S3 object for formats that need random access (zip
+    # central directories). Each miss is one ranged GET of at least min_read bytes, doubling
+    # while reads stay sequential; the last window is kept, so small header reads share it
+    def __init__(self, s3, bucket, key, size, etag=None, prefix=b'', min_read=DEFAULT_CHUNK_SIZE,
+                 max_range=MAX_RANGE_SIZE):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.min_read = min_read
+        self.max_range = max_range
+        self.bytes_read = 0
+        self._position = 0
+        # prefix is the start of the object if already fetched, it costs nothing here
+        self._window_start = 0
+        self._window = bytes(prefix)
+        self._next_read = min_read
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._position = offset
+        return offset
+
+    def _fetch(self, start, length):
+        end = min(start + length, self.size) - 1
+        request = {'Bucket': self.bucket, 'Key': self.key, 'Range': f"bytes={start}-{end}"}
+        if self.etag:
+            request['IfMatch'] = self.etag
+        data = self.s3.get_object(**request)['Body'].read()
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, target):
+        start, wanted = self._position, min(len(target), max(self.size - self._position, 0))
+        if wanted == 0:
+            return 0
+        offset = start - self._window_start
+        if offset < 0 or offset + wanted > len(self._window):
+            sequential = start == self._window_start + len(self._window)
+            self._next_read = min(self._next_read * 2, self.max_range) if sequential else self.min_read
+            length = max(wanted, self._next_read)
+            # Near the end the window reaches back instead, so the zip end record and the
+            # central directory just before it come in one request
+            self._window_start = max(min(start, self.size - length), 0)
+            self._window = self._fetch(self._window_start, length)
+            offset = start - self._window_start
+        data = self._window[offset:offset + wanted]
+        target[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def iter_body_chunks(body, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Reads a botocore StreamingBody (or any file-like object) in fixed-size chunks
+    try:
+        while True:
+            chunk = body.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        # Closing early drops the connection instead of draining the rest of the object
+        if hasattr(body, 'close'):
+            body.close()
+
+
+def iter_ranged_chunks(s3, bucket, key, size=None, start=0, first_range=DEFAULT_CHUNK_SIZE,
+                       max_range=MAX_RANGE_SIZE, etag=None):
+    # Issues ranged GETs that double in size, so a short header costs a single small request
+    offset = start
+    length = first_range
+    while size is None or offset < size:
+        end = offset + length - 1
+        if size is not None:
+            end = min(end, size - 1)
+
+        request = {'Bucket': bucket, 'Key': key, 'Range': f"bytes={offset}-{end}"}
+        if etag:
+            # Fail instead of stitching together ranges of two different object versions
+            request['IfMatch'] = etag
+        try:
+            obj = s3.get_object(**request)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+                return
+            raise
+
+        chunk = obj['Body'].read()
+        if not chunk:
+            return
+        yield chunk
+
+        requested = end - offset + 1
+        offset += len(chunk)
+        if len(chunk) < requested:
+            # Short read means we reached the end of the object
+            return
+        length = min(length * 2, max_range)
+
+
+def read_first_line(chunks, max_bytes=MAX_HEADER_BYTES):
+    # Collects bytes up to and including the first newline, then stops pulling chunks
+    line = bytearray()
+    for chunk in chunks:
+        idx = chunk.find(b'\n')
+        if idx != -1:
+            line += chunk[:idx + 1]
+            return bytes(line)
+        line += chunk
+        if len(line) > max_bytes:
+            raise ValueError(f"Header line exceeds {max_bytes} bytes")
+    return bytes(line)
+
+
+def read_sample_lines(chunks, max_lines, max_bytes):
+    # Collects up to max_lines complete lines without buffering much more than max_bytes.
+    # The first line is always kept so a header survives even a tiny byte budget
+    buffer = bytearray()
+    newlines = 0
+    exhausted = True
+    for chunk in chunks:
+        buffer += chunk
+        newlines += chunk.count(b'\n')
+        if newlines >= max_lines or len(buffer) >= max_bytes:
+            exhausted = False
+            break
+
+    lines = bytes(buffer).split(b'\n')
+    tail = lines.pop()
+    if exhausted and tail:
+        # End of object without a trailing newline, the last line is complete
+        lines.append(tail)
+
+    kept = []
+    total = 0
+    for line in lines[:max_lines]:
+        total += len(line) + 1
+        if kept and total > max_bytes:
+            break
+        kept.append(line.rstrip(b'\r'))
+    return kept
+
+
+def read_header_line(chunks, compression=None, max_bytes=MAX_HEADER_BYTES):
+    # Returns (first line, raw bytes consumed) from any chunk source, e.g. iter_body_chunks(obj['Body'])
+    fetched = ByteCounter(chunks)
+    decoded = iter_decompressed(fetched, compression)
+    line = read_first_line(decoded, max_bytes=max_bytes)
+    return line, fetched.bytes_read
+
+
+def stream_header_line(s3, bucket, key, size=None, compression=None, etag=None,
+                       max_bytes=MAX_HEADER_BYTES, prefix=b''):
+    # Same as read_header_line, fed by growing ranged GETs instead of one full GET.
+    # prefix is the start of the object if already fetched; it is replayed first and
+    # not counted again, so most headers need no further request
+    fetched = ByteCounter(iter_ranged_chunks(s3, bucket, key, size=size, start=len(prefix), etag=etag))
+    decoded = iter_decompressed(chain([prefix], fetched), compression)
+    line = read_first_line(decoded, max_bytes=max_bytes)
+    return line, fetched.bytes_read
+
+
+def count_lines(chunks):
+    # bytes.count runs in C over each fixed-size buffer, no per-line Python work.
+    # Returns (newline count, whether the data ended mid-line)
+    newlines = 0
+    last = b''
+    for chunk in chunks:
+        if chunk:
+            newlines += chunk.count(b'\n')
+            last = chunk[-1:]
+    return newlines, bool(last) and last != b'\n'
+
+
+def stream_row_count(s3, bucket, key, size=None, compression=None, etag=None, max_bytes=None,
+                     chunk_size=COUNT_CHUNK_SIZE, header_lines=1, prefix=b''):
+    # Data rows (header_lines excluded) from one streamed GET. With max_bytes set and a larger
+    # object, only that prefix is fetched and the count is extrapolated from it. prefix is
+    # the start of the object if already fetched; the GET picks up after it.
+    # Returns (row count, exact?, bytes fetched beyond prefix)
+    truncated = bool(max_bytes and size and size > max_bytes)
+    end = max_bytes - 1 if truncated else (size - 1 if size is not None else None)
+    fetched = ByteCounter(())
+    if end is None or end >= len(prefix):
+        request = {'Bucket': bucket, 'Key': key, 'Range': f"bytes={len(prefix)}-{'' if end is None else end}"}
+        if etag:
+            request['IfMatch'] = etag
+        fetched = ByteCounter(iter_body_chunks(s3.get_object(**request)['Body'], chunk_size))
+
+    # Nothing is buffered here, the cap only stops a decompression bomb from eating the timeout
+    max_output = max(MAX_DECOMPRESSED_BYTES, (size or 0) * MAX_COMPRESSION_RATIO)
+    chunks = iter_decompressed(chain([prefix], fetched), compression, chunk_size=chunk_size,
+                               max_output=max_output)
+    newlines, partial_last_line = count_lines(chunks)
+
+    if truncated:
+        # Assumes rows are evenly spread through the (compressed) object
+        read = len(prefix) + fetched.bytes_read
+        estimate = int(newlines * size / read) if read else 0
+        return max(estimate - header_lines, 0), False, fetched.bytes_read
+
+    lines = newlines + (1 if partial_last_line else 0)
+    return max(lines - header_lines, 0), True, fetched.bytes_read
@@ -0,0 +1,125 @@
+import posixpath
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+from helpers.stream_helper import RangedReader
+
+
+__all__ = ["read_xlsx_header", "read_xlsx_metadata"]
+
+RELATIONSHIP_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+DEFAULT_SHEET = 'xl/worksheets/sheet1.xml'
+SHARED_STRINGS = 'xl/sharedStrings.xml'
+CELL_REFERENCE = re.compile(r'([A-Z]+)(\d+)')
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _text(element):
+    # Concatenated <t> runs of a shared or inline string; phonetic hints are left out
+    return ''.join(node.text or '' for node in element.iter()
+                   if _local(node.tag) == 't' and node.text is not None)
+
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def _first_sheet(workbook):
+    # (name, path) of the first sheet in tab order, falling back to the usual part name
+    names = set(workbook.namelist())
+    try:
+        with workbook.open('xl/workbook.xml') as f:
+            sheet = next(element for _, element in iterparse(f) if _local(element.tag) == 'sheet')
+        with workbook.open('xl/_rels/workbook.xml.rels') as f:
+            targets = {element.get('Id'): element.get('Target') for _, element in iterparse(f)
+                       if _local(element.tag) == 'Relationship'}
+        target = targets[sheet.get(RELATIONSHIP_ID)]
+        path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+        if path in names:
+            return sheet.get('name'), path
+    except (KeyError, StopIteration):
+        pass
+    return None, DEFAULT_SHEET
+
+
+def _first_row(sheet):
+    # Streams the sheet XML up to the end of the first row that has cells. Returns
+    # ([(column, type, value)], declared dimension or None)
+    dimension = None
+    for _, element in iterparse(sheet):
+        name = _local(element.tag)
+        if name == 'dimension':
+            dimension = element.get('ref')
+        elif name == 'row' and len(element):
+            cells = []
+            for position, cell in enumerate(c for c in element if _local(c.tag) == 'c'):
+                match = CELL_REFERENCE.match(cell.get('r') or '')
+                column = _column_index(match.group(1)) if match else position
+                if cell.get('t') == 'inlineStr':
+                    cells.append((column, 'str', _text(cell)))
+                    continue
+                value = next((child.text for child in cell if _local(child.tag) == 'v'), None)
+                cells.append((column, cell.get('t'), value))
+            return cells, dimension
+    return [], dimension
+
+
+def _shared_strings(workbook, indexes):
+    # Streams the shared string table only as far as the highest index the header uses
+    if not indexes or SHARED_STRINGS not in workbook.namelist():
+        return {}
+    wanted = max(indexes)
+    strings = {}
+    position = 0
+    with workbook.open(SHARED_STRINGS) as f:
+        for _, element in iterparse(f):
+            if _local(element.tag) != 'si':
+                continue
+            if position in indexes:
+                strings[position] = _text(element)
+            element.clear()
+            position += 1
+            if position > wanted:
+                break
+    return strings
+
+
+def _declared_rows(dimension):
+    # Data rows from the <dimension ref="A1:F120"> the writer declared, header excluded
+    references = CELL_REFERENCE.findall(dimension or '')
+    if len(references) != 2:
+        return None
+    return max(int(references[1][1]) - int(references[0][1]), 0)
+
+
+def read_xlsx_header(workbook):
+    # Header cells of the first sheet from a zipfile.ZipFile, without loading the workbook.
+    # Returns (header, sheet name, declared data rows or None)
+    sheet_name, path = _first_sheet(workbook)
+    with workbook.open(path) as sheet:
+        cells, dimension = _first_row(sheet)
+    strings = _shared_strings(workbook, {int(value) for _, kind, value in cells if kind == 's' and value})
+
+    header = [''] * (max((column for column, _, _ in cells), default=-1) + 1)
+    for column, kind, value in cells:
+        header[column] = strings.get(int(value), '') if kind == 's' and value else (value or '')
+    return [name.strip() for name in header], sheet_name, _declared_rows(dimension)
+
+
+def read_xlsx_metadata(s3, bucket, key, size=None, etag=None, prefix=b'', **kwargs):
+    # zipfile seeks to the central directory at the end, then to the three or four parts
+    # it needs; every seek is a ranged GET, so the sheet data itself is barely touched
+    reader = RangedReader(s3, bucket, key, size, etag=etag, prefix=prefix)
+    with zipfile.ZipFile(reader) as workbook:
+        header, sheet_name, rows = read_xlsx_header(workbook)
+    result = {'header': header, 'sheet': sheet_name, 'bytes_fetched': reader.bytes_read}
+    if rows is not None:
+        result['row_count'] = rows
+        result['row_count_exact'] = False
+    return result
@@ -0,0 +1,56 @@
+import importlib.util
+import io
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# The stack lives under infra/ and the Lambda helpers ship as a layer, mirror both on the path
+for path in (os.path.join(ROOT, 'infra'), os.path.join(ROOT, 'infra', 'layers', 'helper_layer', 'python')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class FakeS3:
+    def __init__(self, data):
+        self.data = data
+        self.calls = []
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        self.calls.append(Range)
+        if Range is None:
+            return {'Body': io.BytesIO(self.data)}
+        start, end = Range[len('bytes='):].split('-')
+        return {'Body': io.BytesIO(self.data[int(start):int(end) + 1])}
+
+
+@pytest.fixture(autouse=True)
+def fresh_schema_cache():
+    # The warm-container schema cache would otherwise outlive each test's mocked tables
+    from helpers.schema_helper import SCHEMA_CACHE
+    SCHEMA_CACHE.clear()
+    yield
+    SCHEMA_CACHE.clear()
+
+
+@pytest.fixture
+def fake_s3():
+    return FakeS3
+
+
+@pytest.fixture
+def load_lambda(monkeypatch):
+    # Imports a Lambda module from code/ with the environment its stack would give it
+    def load(relative_path, env):
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        path = os.path.join(ROOT, 'code', relative_path)
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    return load
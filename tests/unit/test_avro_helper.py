@@ -0,0 +1,36 @@
+import json
+import os
+
+from helpers.fileparsing_helper import read_object_metadata
+
+
+def _long(value):
+    value = (value << 1) ^ (value >> 63)
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _avro(schema, body):
+    entries = {b'avro.schema': json.dumps(schema).encode(), b'avro.codec': b'deflate'}
+    metadata = b''.join(_long(len(k)) + k + _long(len(v)) + v for k, v in entries.items())
+    return b'Obj\x01' + _long(len(entries)) + metadata + _long(0) + os.urandom(16) + body
+
+
+def test_wide_avro_schema_is_read_from_the_header_only(fake_s3):
+    fields = [{'name': f"c{i}", 'type': ['null', 'string']} for i in range(300)]
+    fields.append({'name': 'ts', 'type': {'type': 'long', 'logicalType': 'timestamp-millis'}})
+    data = _avro({'type': 'record', 'name': 'row', 'fields': fields}, os.urandom(4 * 1024 * 1024))
+    s3 = fake_s3(data)
+
+    result = read_object_metadata(s3, 'b', 'events/part-0.avro', size=len(data))
+
+    assert result['detected_type'] == 'avro'
+    assert result['header'][:2] == ['c0', 'c1'] and len(result['header']) == 301
+    assert result['columns'][0] == {'name': 'c0', 'physical_type': 'string', 'logical_type': None}
+    assert result['columns'][-1]['logical_type'] == 'timestamp-millis'
+    assert result['block_codec'] == 'deflate'
+    assert result['bytes_fetched'] < 256 * 1024
@@ -0,0 +1,45 @@
+import gzip
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from tools import local_aws
+from tools.backfill import run_backfill
+from helpers.schema_helper import load_schema
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        s3 = boto3.client('s3')
+        dynamodb = boto3.resource('dynamodb')
+        s3.create_bucket(Bucket='tracked')
+        local_aws.create_tables(dynamodb)
+        yield s3, dynamodb
+
+
+def test_backfill_indexes_existing_objects_and_resumes(aws, tmp_path):
+    s3, dynamodb = aws
+    for i in range(5):
+        s3.put_object(Bucket='tracked', Key=f"raw/file{i}.csv", Body=b"id,name\n1,a\n")
+    s3.put_object(Bucket='tracked', Key='raw/archive.psv.gz', Body=gzip.compress(b"a|b|c\n"))
+    s3.put_object(Bucket='tracked', Key='curated/empty.csv', Body=b"")
+    checkpoint = str(tmp_path / 'checkpoint.json')
+
+    counts = run_backfill(s3, dynamodb, 'tracked', prefixes=['raw/', 'curated/'],
+                          workers=4, rate=1000, checkpoint_path=checkpoint)
+
+    assert counts == {'stored': 6, 'skipped': 1}
+    latest = dynamodb.Table(local_aws.LATEST_TABLE_NAME)
+    item = latest.get_item(Key={'filepath': 'tracked/raw/archive.psv.gz'})['Item']
+    assert 'header' not in item and 'sequencer' not in item
+    schemas = dynamodb.Table(local_aws.SCHEMA_TABLE_NAME)
+    assert load_schema(schemas, item['schema_hash'])['header'] == ['a', 'b', 'c']
+    # The five identical CSVs share one schema row
+    assert len(schemas.scan()['Items']) == 2
+
+    # A completed checkpoint makes a rerun a no-op
+    assert run_backfill(s3, dynamodb, 'tracked', prefixes=['raw/', 'curated/'],
+                        checkpoint_path=checkpoint) == counts
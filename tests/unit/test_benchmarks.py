@@ -0,0 +1,32 @@
+import json
+import os
+
+from benchmarks import compare, run
+from file_metadata_tracker import config
+from benchmarks.corpus import corpus_file, parse_size
+
+
+def test_corpus_files_hit_their_size_tier(tmp_path):
+    path = corpus_file(str(tmp_path), 'csv', '8KB')
+    assert parse_size('8KB') <= len(open(path, 'rb').read()) < 2 * parse_size('8KB')
+    assert corpus_file(str(tmp_path), 'csv', '8KB') == path
+
+
+def test_benchmark_run_writes_comparable_results(tmp_path, monkeypatch):
+    monkeypatch.delenv(config.ENV_SCHEMA_TABLE, raising=False)
+    output = tmp_path / 'results.json'
+    run.main(['--kinds', 'csv', 'gz', '--sizes', '4KB', '--repeat', '1',
+              '--corpus-dir', str(tmp_path / 'corpus'), '--output', str(output)])
+
+    report = json.loads(output.read_text())
+    handler = next(r for r in report['results'] if r['kind'] == 'csv' and r['target'] == 'metadata_handler')
+    assert handler['status'] == 'stored'
+    assert handler['s3_calls']['HeadObject'] == 1
+    assert handler['dynamodb_calls']['TransactWriteItems'] == 1
+    assert handler['s3_bytes'] > 0 and handler['latency_ms']['median'] > 0
+
+    # The Lambda's table environment is only set while it loads
+    assert config.ENV_SCHEMA_TABLE not in os.environ
+
+    # Identical runs compare clean
+    assert not any(row[-1] for row in compare.compare(report, report))
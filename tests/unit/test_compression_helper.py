@@ -0,0 +1,119 @@
+import bz2
+import io
+import lzma
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from helpers.compression_helper import DecompressionLimitExceeded, iter_decompressed
+from helpers.fileparsing_helper import read_object_metadata, split_extension
+
+
+def tar_bytes(members, mode):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('key, mode', [
+    ('vendor/drop.tar', 'w'),
+    ('vendor/drop.tar.gz', 'w:gz'),
+    ('vendor/drop.tbz2', 'w:bz2'),
+    ('vendor/drop.tar.xz', 'w:xz'),
+])
+def test_tar_header_comes_from_first_regular_member(fake_s3, key, mode):
+    data = tar_bytes([('data/._orders.csv', b'\x00\x05junk'), ('data/orders.csv', b'id|sku|qty\n1|a|2\n'),
+                      ('data/other.csv', b'x,y\n')], mode)
+    result = read_object_metadata(fake_s3(data), 'b', key, size=len(data))
+    assert result['header'] == ['id', 'sku', 'qty']
+    assert result['member'] == 'data/orders.csv'
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_zip_catalog_reads_central_directory_and_member_first_lines(fake_s3, monkeypatch, workers):
+    from helpers import archive_helper
+    monkeypatch.setattr(archive_helper, 'ZIP_MEMBER_WORKERS', workers)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('scans/page.png', os.urandom(3 * 1024 * 1024))
+        archive.writestr('__MACOSX/data/._orders.csv', b'\x00\x05junk')
+        archive.writestr('data/orders.csv', b"id,sku\n" + b"1,a\n" * 500000, zipfile.ZIP_DEFLATED)
+        archive.writestr('data/stock.psv', b"sku|qty\n" + b"a|1\n" * 1000, zipfile.ZIP_BZIP2)
+        archive.writestr('data/notes.txt', b"note\tdate\n", zipfile.ZIP_STORED)
+    data = buffer.getvalue()
+    s3 = fake_s3(data)
+
+    result = read_object_metadata(s3, 'b', 'vendor/drop.zip', size=len(data))
+
+    assert result['header'] == ['id', 'sku'] and result['member'] == 'data/orders.csv'
+    assert result['member_count'] == 4
+    assert [member['name'] for member in result['members']] == [
+        'scans/page.png', 'data/orders.csv', 'data/stock.psv', 'data/notes.txt']
+    assert 'header' not in result['members'][0]
+    assert result['members'][1]['compression'] == 'deflate'
+    assert result['members'][1]['size'] > result['members'][1]['compressed_size']
+    assert result['members'][2]['header'] == ['sku', 'qty']
+    assert result['members'][3]['header'] == ['note', 'date']
+    assert None not in s3.calls
+    assert result['bytes_fetched'] < len(data) // 4
+
+
+def test_zip_member_headers_share_a_byte_budget(fake_s3, monkeypatch):
+    from helpers import archive_helper
+    monkeypatch.setattr(archive_helper, 'ZIP_MEMBER_HEADER_BYTES', 30000)
+    wide = ",".join(f"column_{i:05d}" for i in range(2000)).encode()
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for i in range(3):
+            archive.writestr(f"part{i}.csv", wide + b"\n1\n")
+    data = buffer.getvalue()
+
+    result = read_object_metadata(fake_s3(data), 'b', 'wide.zip', size=len(data))
+
+    assert len(result['header']) == 2000
+    assert [len(member.get('header', [])) for member in result['members']] == [2000, 0, 0]
+    assert [member['column_count'] for member in result['members']] == [2000] * 3
+    assert result['members'][1]['header_truncated']
+
+
+@pytest.mark.parametrize('key, compress', [('a.csv.bz2', bz2.compress), ('a.csv.xz', lzma.compress)])
+def test_single_stream_codecs_read_header_and_rows(fake_s3, monkeypatch, key, compress):
+    from helpers import fileparsing_helper
+    monkeypatch.setattr(fileparsing_helper, 'COUNT_ROWS', True)
+    data = compress(b"c1,c2\n" + b"1,2\n" * 5000)
+    result = read_object_metadata(fake_s3(data), 'b', key, size=len(data))
+    assert result['header'] == ['c1', 'c2']
+    assert result['row_count'] == 5000 and result['row_count_exact']
+
+
+def test_concatenated_bz2_streams_are_read_through():
+    data = bz2.compress(b"a,") + bz2.compress(b"b\n")
+    assert b"".join(iter_decompressed([data[:7], data[7:]], 'bz2', chunk_size=1)) == b"a,b\n"
+
+
+def test_decompression_bomb_is_capped():
+    data = bz2.compress(b"\0" * (8 * 1024 * 1024))
+    with pytest.raises(DecompressionLimitExceeded):
+        for _ in iter_decompressed([data], 'bz2', max_output=1024 * 1024):
+            pass
+
+
+def test_zstd_is_streamed_when_available(fake_s3):
+    zstandard = pytest.importorskip('zstandard')
+    data = zstandard.ZstdCompressor().compress(b"k;v\n1;2\n")
+    assert read_object_metadata(fake_s3(data), 'b', 'x.psv.zst', size=len(data))['header'] == ['k', 'v']
+
+
+def test_split_extension():
+    assert split_extension('orders.csv.gz') == ('csv', 'gz')
+    assert split_extension('drop.tar.gz') == ('unknown', 'tar.gz')
+    assert split_extension('drop.csv.tzst') == ('csv', 'tzst')
+    assert split_extension('README') == ('unknown', None)
+    assert split_extension('export.') == ('unknown', None)
+    assert split_extension('export..gz') == ('unknown', 'gz')
@@ -0,0 +1,99 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from tools import local_aws
+from file_metadata_tracker import config
+
+
+def deleted_event(key, sequencer=None):
+    detail_object = {'key': key}
+    if sequencer:
+        detail_object['sequencer'] = sequencer
+    return {'detail-type': 'Object Deleted', 'detail': {'bucket': {'name': 'b'}, 'object': detail_object}}
+
+
+@pytest.fixture
+def tracker(load_lambda):
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        local_aws.create_tables(dynamodb)
+        module = load_lambda('Deletion_lambda/deletion_tracker.py', {
+            config.ENV_LATEST_TABLE: config.LATEST_TABLE_NAME,
+            config.ENV_DELETED_TABLE: config.DELETED_TABLE_NAME,
+            config.ENV_ROLLUP_TABLE: config.ROLLUP_TABLE_NAME,
+        })
+        for key, sequencer in (('raw/a.csv', None), ('raw/b.csv', None), ('raw/new.csv', '00FF')):
+            module.latest_table.put_item(Item={
+                'filepath': f"b/{key}", 'bucket': 'b', 'folder': 'raw', 'file_type': 'csv', 'size': 10,
+                'timestamp': 't0', **({'sequencer': sequencer.ljust(32, '0')} if sequencer else {})})
+        module.rollup_table.put_item(Item={'folder_key': 'b/raw', 'file_count': 3, 'total_bytes': 30})
+        yield module, dynamodb
+
+
+def test_batched_deletes_match_the_per_key_path(tracker):
+    module, dynamodb = tracker
+    events = [
+        deleted_event('raw/a.csv', '0001'),
+        deleted_event('raw/b.csv'),
+        deleted_event('raw/a.csv', '0002'),
+        deleted_event('raw/new.csv', '0001'),
+        deleted_event('raw/gone.csv'),
+        {'detail': {}},
+    ]
+
+    results = module.handler({'events': events}, None)['results']
+
+    assert [r['status'] for r in results] == ['deleted', 'deleted', 'deleted', 'stale', 'not_found', 'error']
+    assert results[4]['message'] == "No record found for b/raw/gone.csv"
+    assert results[3]['message'] == module.track_deletion(deleted_event('raw/new.csv', '0001'),
+                                                          module.start_invocation('Deletion'))['message']
+
+    deleted = {i['filepath']: i for i in dynamodb.Table(config.DELETED_TABLE_NAME).scan()['Items']}
+    assert set(deleted) == {'b/raw/a.csv', 'b/raw/b.csv', 'b/raw/gone.csv'}
+    assert deleted['b/raw/gone.csv']['Comment'] == 'Deleted file was not tracked'
+    assert deleted['b/raw/a.csv']['deletion_timestamp'] and deleted['b/raw/a.csv']['size'] == 10
+    assert [i['filepath'] for i in module.latest_table.scan()['Items']] == ['b/raw/new.csv']
+    # The repeated key is counted once
+    assert module.rollup_table.get_item(Key={'folder_key': 'b/raw'})['Item']['file_count'] == 1
+
+
+def test_failed_rollup_does_not_fail_the_delete(tracker, monkeypatch):
+    module, dynamodb = tracker
+
+    def broken_rollups(table, deltas):
+        raise RuntimeError("throttled")
+
+    monkeypatch.setattr(module, 'apply_rollups', broken_rollups)
+
+    assert module.handler(deleted_event('raw/a.csv'), None) is None
+    results = module.handler({'events': [deleted_event('raw/b.csv')]}, None)['results']
+    assert [r['status'] for r in results] == ['deleted']
+
+    deleted = dynamodb.Table(config.DELETED_TABLE_NAME)
+    for filepath in ('b/raw/a.csv', 'b/raw/b.csv'):
+        assert 'Comment' not in deleted.get_item(Key={'filepath': filepath})['Item']
+
+
+def test_redelivered_batch_keeps_the_real_deletion_records(tracker, monkeypatch):
+    module, dynamodb = tracker
+    log_untracked = module.log_untracked
+
+    def failing_log(record):
+        raise RuntimeError("throttled")
+
+    monkeypatch.setattr(module, 'log_untracked', failing_log)
+    events = [deleted_event('raw/a.csv'), deleted_event('raw/gone.csv')]
+    results = module.handler({'events': events}, None)['results']
+    assert [r['status'] for r in results] == ['deleted', 'error']
+
+    # The redelivery finds a.csv gone, but its FileDeleted record is the real one
+    monkeypatch.setattr(module, 'log_untracked', log_untracked)
+    results = module.handler({'events': events}, None)['results']
+    assert [r['status'] for r in results] == ['not_found', 'not_found']
+    assert module.track_deletion(deleted_event('raw/a.csv'), module.start_invocation('Deletion'))['status'] == 'not_found'
+
+    deleted = dynamodb.Table(config.DELETED_TABLE_NAME)
+    record = deleted.get_item(Key={'filepath': 'b/raw/a.csv'})['Item']
+    assert record['size'] == 10 and 'Comment' not in record
+    assert deleted.get_item(Key={'filepath': 'b/raw/gone.csv'})['Item']['Comment'] == 'Deleted file was not tracked'
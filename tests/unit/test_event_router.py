@@ -0,0 +1,135 @@
+import json
+import sys
+
+import boto3
+from moto import mock_aws
+
+from tools import local_aws
+from file_metadata_tracker import config
+
+
+class FakeStepFunctions:
+    def __init__(self, failing_keys=()):
+        self.failing_keys = failing_keys
+        self.started = []
+
+    def start_execution(self, stateMachineArn, input):
+        key = json.loads(input)['detail']['object']['key']
+        if key in self.failing_keys:
+            raise RuntimeError("throttled")
+        self.started.append((stateMachineArn, key))
+
+
+def sqs_record(message_id, detail_type, key, bucket='b'):
+    body = {'detail-type': detail_type, 'detail': {'bucket': {'name': bucket}, 'object': {'key': key}}}
+    return {'messageId': message_id, 'body': json.dumps(body)}
+
+
+def test_router_reports_only_failed_messages(load_lambda):
+    router = load_lambda('Router_lambda/event_router.py', {'CREATED_SF_ARN': 'created', 'DELETED_SF_ARN': 'deleted'})
+    router.sf_client = FakeStepFunctions(failing_keys={'bad.csv'})
+
+    event = {'Records': [
+        sqs_record('1', 'Object Created', 'a.csv'),
+        sqs_record('2', 'Object Deleted', 'b.csv'),
+        sqs_record('3', 'Object Created', 'bad.csv'),
+        sqs_record('4', 'Object Restore Completed', 'c.csv'),
+        {'messageId': '5', 'body': 'not json'},
+    ]}
+
+    result = router.handler(event, None)
+
+    assert result == {'batchItemFailures': [{'itemIdentifier': '3'}]}
+    assert sorted(router.sf_client.started) == [('created', 'a.csv'), ('deleted', 'b.csv')]
+
+
+def test_router_batches_deletes_into_few_executions(load_lambda):
+    router = load_lambda('Router_lambda/event_router.py', {
+        'CREATED_SF_ARN': 'created', 'DELETED_SF_ARN': 'deleted', 'ROUTER_DELETE_BATCH_SIZE': '2'})
+    started = []
+
+    class BatchingStepFunctions:
+        def start_execution(self, stateMachineArn, input):
+            events = json.loads(input)['events']
+            if any(e['detail']['object']['key'] == 'bad.csv' for e in events):
+                raise RuntimeError("throttled")
+            started.append([e['detail']['object']['key'] for e in events])
+
+    router.sf_client = BatchingStepFunctions()
+    keys = ['a.csv', 'b.csv', 'c.csv', 'bad.csv', 'd.csv']
+    event = {'Records': [sqs_record(str(i), 'Object Deleted', key) for i, key in enumerate(keys)]}
+
+    result = router.handler(event, None)
+
+    # The whole batch holding the failure goes back to the queue
+    assert result == {'batchItemFailures': [{'itemIdentifier': '2'}, {'itemIdentifier': '3'}]}
+    assert sorted(started) == [['a.csv', 'b.csv'], ['d.csv']]
+
+
+def test_router_batches_creates_outside_inprocess_mode(load_lambda):
+    router = load_lambda('Router_lambda/event_router.py', {
+        'ROUTER_DISPATCH_MODE': 'express', 'CREATED_SF_ARN': 'created', 'DELETED_SF_ARN': 'deleted',
+        'ROUTER_CREATE_BATCH_SIZE': '2'})
+    started = []
+
+    class BatchingStepFunctions:
+        def start_execution(self, stateMachineArn, input):
+            payload = json.loads(input)
+            events = payload.get('events', [payload])
+            started.append((stateMachineArn, [e['detail']['object']['key'] for e in events]))
+
+    router.sf_client = BatchingStepFunctions()
+    event = {'Records': [sqs_record('1', 'Object Created', 'a.csv'), sqs_record('2', 'Object Created', 'b.csv'),
+                         sqs_record('3', 'Object Created', 'c.csv'), sqs_record('4', 'Object Deleted', 'd.csv')]}
+
+    assert router.handler(event, None) == {'batchItemFailures': []}
+    assert sorted(started) == [('created', ['a.csv', 'b.csv']), ('created', ['c.csv']), ('deleted', ['d.csv'])]
+
+
+def test_lambda_mode_invokes_handlers_asynchronously(load_lambda):
+    router = load_lambda('Router_lambda/event_router.py', {
+        'ROUTER_DISPATCH_MODE': 'lambda', 'CREATED_FUNCTION_NAME': 'extract', 'DELETED_FUNCTION_NAME': 'delete'})
+    invoked = []
+
+    class FakeLambda:
+        def invoke(self, FunctionName, InvocationType, Payload):
+            assert InvocationType == 'Event'
+            invoked.append((FunctionName, json.loads(Payload)['detail']['object']['key']))
+
+    router.lambda_client = FakeLambda()
+    event = {'Records': [sqs_record('1', 'Object Created', 'a.csv'), sqs_record('2', 'Object Deleted', 'b.csv')]}
+
+    assert router.handler(event, None) == {'batchItemFailures': []}
+    assert sorted(invoked) == [('delete', 'b.csv'), ('extract', 'a.csv')]
+
+
+def test_inprocess_mode_runs_the_handlers_in_the_router(load_lambda, monkeypatch):
+    for name in ('metadata_extractor', 'deletion_tracker'):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    tables = {
+        config.ENV_LATEST_TABLE: config.LATEST_TABLE_NAME, config.ENV_SKIPPED_TABLE: config.SKIPPED_TABLE_NAME,
+        config.ENV_FAILED_TABLE: config.FAILED_TABLE_NAME, config.ENV_HISTORY_TABLE: config.HISTORY_TABLE_NAME,
+        config.ENV_DELETED_TABLE: config.DELETED_TABLE_NAME, config.ENV_ROLLUP_TABLE: config.ROLLUP_TABLE_NAME,
+        config.ENV_SCHEMA_TABLE: config.SCHEMA_TABLE_NAME,
+    }
+    with mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        s3.create_bucket(Bucket='tracked')
+        s3.put_object(Bucket='tracked', Key='a.csv', Body=b"id,name\n1,x\n")
+        local_aws.create_tables(dynamodb)
+        latest = dynamodb.Table(config.LATEST_TABLE_NAME)
+        latest.put_item(Item={'filepath': 'tracked/old.csv', 'bucket': 'tracked', 'folder': '', 'size': 1,
+                              'timestamp': 't0'})
+        router = load_lambda('Router_lambda/event_router.py', {
+            'ROUTER_DISPATCH_MODE': 'inprocess', **tables})
+
+        event = {'Records': [sqs_record('1', 'Object Created', 'a.csv', 'tracked'),
+                             sqs_record('2', 'Object Deleted', 'old.csv', 'tracked'),
+                             sqs_record('3', 'Object Created', 'missing.csv', 'tracked')]}
+
+        # A missing object is a recorded failure, not a retry, as with a Step Functions execution
+        assert router.handler(event, None) == {'batchItemFailures': []}
+        assert [item['filepath'] for item in latest.scan()['Items']] == ['tracked/a.csv']
+        assert dynamodb.Table(config.DELETED_TABLE_NAME).get_item(Key={'filepath': 'tracked/old.csv'})['Item']
+        assert dynamodb.Table(config.FAILED_TABLE_NAME).get_item(Key={'filepath': 'tracked/missing.csv'})['Item']
@@ -0,0 +1,86 @@
+import io
+import json
+
+import boto3
+import pyarrow.parquet as pq
+from boto3.dynamodb.types import TypeSerializer
+from moto import mock_aws
+
+from helpers.export_helper import S3Store, compact, write_changes
+from tools import export_changes
+
+LATEST_ARN = 'arn:aws:dynamodb:us-east-1:1:table/Latest-ABC/stream/2026-10-18T00:00:00.000'
+DELETED_ARN = 'arn:aws:dynamodb:us-east-1:1:table/Deleted-XYZ/stream/2026-10-18T00:00:00.000'
+TABLE_NAMES = {'Latest-ABC': 'latest', 'Deleted-XYZ': 'deleted'}
+DAY = 1792281600  # 2026-10-18T00:00:00Z
+
+
+def record(name, filepath, sequence, seconds, size=1, arn=LATEST_ARN):
+    serializer = TypeSerializer()
+    item = {'filepath': filepath, 'bucket': filepath.split('/')[0], 'size': size,
+            'timestamp': f"2026-10-18T00:00:{seconds % 60:02d}"}
+    image = {key: serializer.serialize(value) for key, value in item.items()}
+    change = {'ApproximateCreationDateTime': DAY + seconds, 'SequenceNumber': str(sequence),
+              'Keys': {'filepath': serializer.serialize(filepath)}}
+    change['OldImage' if name == 'REMOVE' else 'NewImage'] = image
+    return {'eventName': name, 'eventSourceARN': arn, 'dynamodb': change}
+
+
+def read(store, key):
+    return pq.read_table(io.BytesIO(store.get(key))).to_pylist()
+
+
+def test_changes_are_partitioned_and_compacted_into_a_snapshot(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket='export')
+        store = S3Store(s3, 'export')
+
+        written = write_changes(store, [
+            record('INSERT', 'raw/a.csv', 100, 1),
+            record('INSERT', 'raw/b.csv', 101, 2),
+            record('INSERT', 'other/c.csv', 102, 3),
+            record('MODIFY', 'raw/a.csv', 900, 86400 + 5, size=7),        # next day
+            record('INSERT', 'raw/b.csv', 103, 4, arn=DELETED_ARN),
+        ], TABLE_NAMES)
+        assert sorted(key.rsplit('/', 1)[0] for key in written) == [
+            'changes/table=deleted/bucket=raw/date=2026-10-18',
+            'changes/table=latest/bucket=other/date=2026-10-18',
+            'changes/table=latest/bucket=raw/date=2026-10-18',
+            'changes/table=latest/bucket=raw/date=2026-10-19',
+        ]
+
+        assert compact(store) == {'other': {'change_files': 1, 'rows': 1}, 'raw': {'change_files': 2, 'rows': 2}}
+        snapshot = read(store, 'snapshot/bucket=raw/snapshot.parquet')
+        assert [(row['filepath'], row['size']) for row in snapshot] == [('raw/a.csv', 7), ('raw/b.csv', 1)]
+
+        # Nothing new: no bucket is rewritten
+        assert compact(store) == {}
+
+        # Sequence numbers order changes within a second numerically, not as strings
+        write_changes(store, [record('MODIFY', 'raw/b.csv', 99999, 86400 + 9),
+                              record('REMOVE', 'raw/b.csv', 100000, 86400 + 9)], TABLE_NAMES)
+        assert compact(store) == {'raw': {'change_files': 1, 'rows': 1}}
+        assert [row['filepath'] for row in read(store, 'snapshot/bucket=raw/snapshot.parquet')] == ['raw/a.csv']
+
+        write_changes(store, [record('REMOVE', 'other/c.csv', 1000, 86400 + 10)], TABLE_NAMES)
+        compact(store)
+        assert store.get('snapshot/bucket=other/snapshot.parquet') is None
+
+
+def test_recorded_stream_records_export_to_a_local_directory(tmp_path):
+    records = [record('INSERT', f"raw/{i}.csv", 100 + i, i) for i in range(5)]
+    records.append(record('REMOVE', 'raw/0.csv', 200, 30))
+    for change in records:
+        del change['eventSourceARN']               # GetRecords output carries no ARN
+    path = tmp_path / 'records.jsonl'
+    path.write_text(json.dumps({'Records': records[:3]}) + '\n' +
+                    '\n'.join(json.dumps(change) for change in records[3:]))
+
+    assert export_changes.main([str(path), '--output', str(tmp_path / 'out'), '--batch-size', '2']) == 0
+
+    store = export_changes.LocalStore(str(tmp_path / 'out'))
+    assert len(store.keys('changes/table=latest/bucket=raw/date=2026-10-18/')) == 3
+    assert [row['filepath'] for row in read(store, 'snapshot/bucket=raw/snapshot.parquet')] == [
+        'raw/1.csv', 'raw/2.csv', 'raw/3.csv', 'raw/4.csv']
@@ -13,3 +13,79 @@ def test_sqs_queue_created():
 #     template.has_resource_properties("AWS::SQS::Queue", {
 #         "VisibilityTimeout": 300
 #     })
+
+
+def test_router_reports_batch_item_failures():
+    app = core.App()
+    stack = FileMetadataTrackerStack(app, "file-metadata-tracker")
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "BatchSize": 100,
+        "MaximumBatchingWindowInSeconds": 5,
+        "FunctionResponseTypes": ["ReportBatchItemFailures"]
+    })
+
+
+def test_dispatch_modes_only_deploy_what_they_use():
+    def synth(mode):
+        app = core.App(context={"dispatch_mode": mode})
+        return assertions.Template.from_stack(FileMetadataTrackerStack(app, "file-metadata-tracker"))
+
+    standard = synth("standard")
+    standard.resource_count_is("AWS::StepFunctions::StateMachine", 2)
+    standard.has_resource_properties("AWS::StepFunctions::StateMachine", {"StateMachineType": "STANDARD"})
+
+    synth("express").has_resource_properties("AWS::StepFunctions::StateMachine", {"StateMachineType": "EXPRESS"})
+
+    direct = synth("lambda")
+    direct.resource_count_is("AWS::StepFunctions::StateMachine", 0)
+    direct.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "event_router.handler",
+        "Environment": {"Variables": assertions.Match.object_like({
+            "ROUTER_DISPATCH_MODE": "lambda",
+            "CREATED_FUNCTION_NAME": assertions.Match.any_value(),
+        })},
+    })
+    # Events that exhaust the async retries are kept, not dropped
+    direct.resource_count_is("AWS::Lambda::EventInvokeConfig", 2)
+    direct.has_resource_properties("AWS::Lambda::EventInvokeConfig", {
+        "DestinationConfig": {"OnFailure": {"Destination": assertions.Match.any_value()}},
+    })
+
+    inprocess = synth("inprocess")
+    inprocess.resource_count_is("AWS::StepFunctions::StateMachine", 0)
+    inprocess.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "Router_lambda/event_router.handler",
+        "Timeout": 300,
+        "Environment": {"Variables": assertions.Match.object_like({
+            "ROUTER_DISPATCH_MODE": "inprocess",
+            "FILE_METADATA_LATEST": assertions.Match.any_value(),
+            "FILE_DELETED": assertions.Match.any_value(),
+            "AWS_RETRY_MODE": assertions.Match.absent(),
+        })},
+    })
+
+
+def test_table_streams_feed_the_parquet_export():
+    app = core.App()
+    template = assertions.Template.from_stack(FileMetadataTrackerStack(app, "file-metadata-tracker"))
+
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "StreamSpecification": {"StreamViewType": "NEW_AND_OLD_IMAGES"}})
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "StreamSpecification": {"StreamViewType": "NEW_IMAGE"}})
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "BatchSize": 1000,
+        "MaximumBatchingWindowInSeconds": 60,
+        "BisectBatchOnFunctionError": True,
+        "StartingPosition": "TRIM_HORIZON",
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "change_exporter.handler",
+        "Environment": {"Variables": assertions.Match.object_like({"EXPORT_BUCKET": assertions.Match.any_value()})},
+    })
+    template.has_resource_properties("AWS::Events::Rule", {
+        "ScheduleExpression": "rate(1 hour)",
+        "Targets": [assertions.Match.object_like({"Input": '{"action":"compact"}'})],
+    })
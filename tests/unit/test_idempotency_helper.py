@@ -0,0 +1,51 @@
+from helpers.idempotency_helper import SKIPPED_EVENTS, SeenCache, check_duplicate, event_fingerprint
+
+
+class FakeTable:
+    def __init__(self, item=None):
+        self.item = item
+        self.reads = 0
+
+    def get_item(self, **kwargs):
+        self.reads += 1
+        return {'Item': dict(self.item)} if self.item else {}
+
+    def update_item(self, ExpressionAttributeValues, **kwargs):
+        self.item['sequencer'] = ExpressionAttributeValues[':sequencer']
+
+
+def fingerprint(sequencer, etag='abc', size=10):
+    return event_fingerprint({'etag': etag, 'size': size, 'sequencer': sequencer})
+
+
+def test_identical_rewrite_and_older_events_are_skipped():
+    stored = {**fingerprint('0A'), 'size': 10}
+    table = FakeTable(stored)
+
+    assert check_duplicate(table, 'b/k', fingerprint('0B')) == 'duplicate'
+    # The row now carries the newer event, so deletes ordered before it are stale
+    assert table.item['sequencer'] == fingerprint('0B')['sequencer']
+    assert check_duplicate(table, 'b/k', fingerprint('09', etag='old')) == 'stale'
+    assert check_duplicate(table, 'b/k', fingerprint('0C', etag='new')) is None
+    assert check_duplicate(FakeTable(), 'b/k', fingerprint('0B')) is None
+
+
+def test_cache_short_circuits_redeliveries_only():
+    cache = SeenCache(max_entries=2)
+    cache.remember('b/k', fingerprint('0A'))
+    table = FakeTable()
+    hits = SKIPPED_EVENTS['cache_hits']
+
+    assert check_duplicate(table, 'b/k', fingerprint('0A'), cache=cache) == 'duplicate'
+    assert table.reads == 0 and SKIPPED_EVENTS['cache_hits'] == hits + 1
+
+    # Same bytes with a newer sequencer may follow a delete, so the table decides
+    assert check_duplicate(table, 'b/k', fingerprint('0B'), cache=cache) is None
+    assert table.reads == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = SeenCache(max_entries=2)
+    for name in ('a', 'b', 'c'):
+        cache.remember(name, fingerprint('01'))
+    assert cache.get('a') is None and cache.get('c') is not None
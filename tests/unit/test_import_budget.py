@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Cold-start budget per Lambda module, measured in a fresh interpreter
+IMPORT_BUDGET_MS = float(os.environ.get('LAMBDA_IMPORT_BUDGET_MS', '1500'))
+
+# Modules that only specific formats need and must never load at import time
+HEAVY_MODULES = ('pyarrow', 'numpy', 'pandas')
+
+LAMBDA_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'FILE_METADATA_LATEST': 'latest',
+    'FILE_METADATA_SKIPPED': 'skipped',
+    'FILE_METADATA_FAILED': 'failed',
+    'FILE_METADATA_HISTORY': 'history',
+    'FILE_DELETED': 'deleted',
+    'CREATED_SF_ARN': 'created',
+    'DELETED_SF_ARN': 'deleted',
+}
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{'ms': elapsed_ms, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+@pytest.mark.parametrize('directory, module', [
+    ('MetaData_lambda', 'metadata_extractor'),
+    ('Router_lambda', 'event_router'),
+    ('Deletion_lambda', 'deletion_tracker'),
+])
+def test_lambda_module_imports_within_budget(directory, module):
+    env = {**os.environ, **LAMBDA_ENV}
+    env['PYTHONPATH'] = os.pathsep.join([
+        os.path.join(ROOT, 'code', directory),
+        os.path.join(ROOT, 'infra', 'layers', 'helper_layer', 'python'),
+    ])
+    completed = subprocess.run(
+        [sys.executable, '-c', MEASURE.format(module=module, heavy=HEAVY_MODULES)],
+        env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    assert result['heavy'] == [], f"{module} imports {result['heavy']} eagerly"
+    assert result['ms'] < IMPORT_BUDGET_MS, f"{module} took {result['ms']:.0f} ms to import"
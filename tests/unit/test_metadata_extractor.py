@@ -0,0 +1,66 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from tools import local_aws
+from file_metadata_tracker import config
+
+
+def created_event(key, bucket='tracked'):
+    return {'detail-type': 'Object Created', 'detail': {'bucket': {'name': bucket}, 'object': {'key': key}}}
+
+
+@pytest.fixture
+def extractor(load_lambda):
+    with mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        s3.create_bucket(Bucket='tracked')
+        s3.put_object(Bucket='tracked', Key='raw/a.csv', Body=b"id,name\n1,x\n")
+        s3.put_object(Bucket='tracked', Key='raw/b.csv', Body=b"sku|qty\na|1\n")
+        s3.put_object(Bucket='tracked', Key='raw/empty.csv', Body=b"")
+        local_aws.create_tables(dynamodb)
+        module = load_lambda('MetaData_lambda/metadata_extractor.py', {
+            config.ENV_LATEST_TABLE: config.LATEST_TABLE_NAME, config.ENV_SKIPPED_TABLE: config.SKIPPED_TABLE_NAME,
+            config.ENV_FAILED_TABLE: config.FAILED_TABLE_NAME, config.ENV_HISTORY_TABLE: config.HISTORY_TABLE_NAME,
+            config.ENV_ROLLUP_TABLE: config.ROLLUP_TABLE_NAME,
+        })
+        yield module, dynamodb
+
+
+def test_batch_reports_each_event_and_flushes_rollups_once(extractor, monkeypatch):
+    module, dynamodb = extractor
+    flushed = []
+    flush_rollups = module.flush_rollups
+
+    def counting_flush(table, rollups):
+        flushed.append(table)
+        flush_rollups(table, rollups)
+
+    monkeypatch.setattr(module, 'flush_rollups', counting_flush)
+    events = [created_event('raw/a.csv'), created_event('raw/empty.csv'), created_event('raw/missing.csv'),
+              {'detail': {'bucket': {'name': 'tracked'}}}, created_event('raw/b.csv')]
+
+    results = module.metadata_handler({'events': events}, None)['results']
+
+    assert [r['status'] for r in results] == ['stored', 'skipped', 'failed', 'failed', 'stored']
+    assert [r['filepath'] for r in results] == [
+        'tracked/raw/a.csv', 'tracked/raw/empty.csv', 'tracked/raw/missing.csv', None, 'tracked/raw/b.csv']
+    # The malformed event fails on its own, the rest of the batch goes on
+    assert 'error' in results[3] and 'error' not in results[2]
+    assert len(flushed) == 1
+    rollup = dynamodb.Table(config.ROLLUP_TABLE_NAME).get_item(Key={'folder_key': 'tracked/raw'})['Item']
+    assert rollup['file_count'] == 2
+    assert dynamodb.Table(config.FAILED_TABLE_NAME).get_item(Key={'filepath': 'tracked/raw/missing.csv'})['Item']
+    assert dynamodb.Table(config.SKIPPED_TABLE_NAME).get_item(Key={'filepath': 'tracked/raw/empty.csv'})['Item']
+
+
+def test_list_input_is_a_batch(extractor):
+    module, dynamodb = extractor
+
+    results = module.metadata_handler([created_event('raw/a.csv'), created_event('raw/b.csv')], None)['results']
+
+    assert results == [{'filepath': 'tracked/raw/a.csv', 'status': 'stored'},
+                       {'filepath': 'tracked/raw/b.csv', 'status': 'stored'}]
+    latest = dynamodb.Table(config.LATEST_TABLE_NAME).get_item(Key={'filepath': 'tracked/raw/a.csv'})['Item']
+    assert latest['column_count'] == 2
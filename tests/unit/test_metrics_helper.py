@@ -0,0 +1,52 @@
+import json
+
+import boto3
+from moto import mock_aws
+
+from helpers import metrics_helper
+from helpers.metrics_helper import instrument_client, log_event, start_invocation
+
+
+def test_record_is_embedded_metric_format():
+    metrics = start_invocation('MetaData')
+    with metrics.phase('ReadMetadata'):
+        pass
+    metrics.add('S3GetObjectTime', 0)
+    metrics.increment('FilesStored')
+    metrics.set_property('filepath', 'b/k.csv')
+
+    record = metrics.record()
+
+    definition = record['_aws']['CloudWatchMetrics'][0]
+    units = {m['Name']: m['Unit'] for m in definition['Metrics']}
+    assert definition['Dimensions'] == [['Service']] and record['Service'] == 'MetaData'
+    assert units['ReadMetadataTime'] == 'Milliseconds' and units['FilesStored'] == 'Count'
+    # Every declared metric has a value at the top level
+    assert all(name in record for name in units)
+    assert 'ParseTime' in record and record['filepath'] == 'b/k.csv'
+
+
+def test_instrumented_clients_time_calls_and_count_bytes(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        s3 = instrument_client(boto3.client('s3'))
+        s3.create_bucket(Bucket='bkt')
+        s3.put_object(Bucket='bkt', Key='k.csv', Body=b"a,b\n" * 100)
+
+        metrics = start_invocation('MetaData')
+        s3.head_object(Bucket='bkt', Key='k.csv')
+        s3.get_object(Bucket='bkt', Key='k.csv', Range='bytes=0-99')['Body'].read()
+
+    assert metrics.values['S3HeadObjectCalls'] == 1 and metrics.values['S3GetObjectCalls'] == 1
+    assert metrics.values['S3ReadBytes'] == 100
+    assert metrics.values['S3GetObjectTime'] > 0
+
+
+def test_event_logging_is_sampled(monkeypatch, capsys):
+    monkeypatch.setattr(metrics_helper, 'EVENT_LOG_SAMPLE_RATE', 0)
+    log_event({'detail': {}})
+    assert capsys.readouterr().out == ''
+
+    monkeypatch.setattr(metrics_helper, 'EVENT_LOG_SAMPLE_RATE', 1)
+    log_event({'detail': {}})
+    assert json.loads(capsys.readouterr().out.split(': ', 1)[1]) == {'detail': {}}
@@ -0,0 +1,42 @@
+import io
+
+import pyarrow as pa
+import pyarrow.orc as orc
+
+from helpers.fileparsing_helper import read_object_metadata
+
+
+def _orc(rows, **kwargs):
+    table = pa.table({
+        'id': pa.array(range(rows), type=pa.int64()),
+        'name': pa.array([f"n{i}" for i in range(rows)]),
+    })
+    buffer = io.BytesIO()
+    orc.write_table(table, buffer, **kwargs)
+    return buffer.getvalue()
+
+
+def test_orc_schema_comes_from_sniff_and_one_tail_read(fake_s3):
+    data = _orc(100000, compression='zlib', stripe_size=64 * 1024)
+    s3 = fake_s3(data)
+
+    result = read_object_metadata(s3, 'b', 'warehouse/part-0.orc', size=len(data))
+
+    assert result['detected_type'] == 'orc'
+    assert result['header'] == ['id', 'name']
+    assert result['columns'][0] == {'name': 'id', 'physical_type': 'int64', 'logical_type': None}
+    assert (result['row_count'], result['row_count_exact']) == (100000, True)
+    assert result['stripe_count'] > 1 and result['block_codec'] == 'ZLIB'
+    assert len(s3.calls) == 2 and None not in s3.calls
+
+
+def test_orc_footer_larger_than_the_tail_read_takes_one_more_get(fake_s3, monkeypatch):
+    from helpers import orc_helper
+    monkeypatch.setattr(orc_helper, 'ORC_TAIL_BYTES', 64)
+    data = _orc(1000)
+    s3 = fake_s3(data)
+
+    result = read_object_metadata(s3, 'b', 'part-0.orc', size=len(data))
+
+    assert result['header'] == ['id', 'name'] and result['row_count'] == 1000
+    assert len(s3.calls) == 3
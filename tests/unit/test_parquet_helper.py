@@ -0,0 +1,56 @@
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from helpers.fileparsing_helper import read_object_metadata
+
+
+def test_parquet_schema_comes_from_sniff_and_one_tail_read(fake_s3):
+    table = pa.table({
+        'id': pa.array(range(10000), type=pa.int64()),
+        'name': pa.array([f"n{i}" for i in range(10000)]),
+    })
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, row_group_size=2500)
+    data = buffer.getvalue()
+    s3 = fake_s3(data)
+
+    result = read_object_metadata(s3, 'b', 'drop/part-0.parquet', size=len(data))
+
+    assert result['header'] == ['id', 'name']
+    assert result['row_count'] == 10000
+    assert result['row_group_count'] == 4
+    assert result['columns'][1] == {'name': 'name', 'physical_type': 'BYTE_ARRAY', 'logical_type': 'STRING'}
+    assert len(s3.calls) == 2 and None not in s3.calls
+    assert result['bytes_fetched'] < len(data)
+
+
+def test_small_parquet_is_parsed_from_the_sniffed_bytes(fake_s3):
+    buffer = io.BytesIO()
+    pq.write_table(pa.table({'id': [1, 2, 3]}), buffer)
+    data = buffer.getvalue()
+    s3 = fake_s3(data)
+
+    result = read_object_metadata(s3, 'b', 'small.parquet', size=len(data))
+
+    assert (result['header'], result['row_count']) == (['id'], 3)
+    assert len(s3.calls) == 1 and result['bytes_fetched'] == len(data)
+
+
+def test_footer_larger_than_the_tail_read_takes_one_more_read(fake_s3):
+    table = pa.table({f"column_{i}": pa.array([i], type=pa.int32()) for i in range(1500)})
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    data = buffer.getvalue()
+    s3 = fake_s3(data)
+
+    result = read_object_metadata(s3, 'b', 'wide.parquet', size=len(data))
+
+    assert len(result['header']) == 1500
+    assert len(s3.calls) == 3
+def test_misnamed_parquet_is_read_as_what_it_is(fake_s3):
+    data = b"id,name\n1,a\n"
+    result = read_object_metadata(fake_s3(data), 'b', 'misnamed.parquet', size=len(data))
+    assert result['header'] == ['id', 'name']
+    assert (result['detected_type'], result['extension_type']) == ('text', 'parquet')
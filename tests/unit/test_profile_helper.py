@@ -0,0 +1,30 @@
+import gzip
+from decimal import Decimal
+
+from helpers.fileparsing_helper import detect_delimiter, profile_text_object, sniff_delimiter
+
+
+def test_delimiter_is_sniffed_by_consistent_frequency():
+    lines = ['id|name|note', '1|a|"x, y, z"', '2|b|"p, q"']
+    assert sniff_delimiter(lines) == '|'
+    assert detect_delimiter('a;b;c,d') == ';'
+    assert detect_delimiter('single') == ','
+
+
+def test_profile_reads_a_bounded_sample(fake_s3):
+    rows = [b"id;amount;city"] + [f"{i};{i * 1.5};{'' if i % 4 == 0 else 'c' + str(i % 3)}".encode()
+                                  for i in range(1, 100001)]
+    data = gzip.compress(b"\n".join(rows) + b"\n")
+    s3 = fake_s3(data)
+
+    result = profile_text_object(s3, 'b', 'k.csv.gz', size=len(data), compression='gz',
+                                 sample_rows=100, sample_bytes=64 * 1024)
+
+    assert result['header'] == ['id', 'amount', 'city']
+    assert result['delimiter'] == ';'
+    assert result['profile_sample_rows'] == 100
+    assert result['bytes_fetched'] <= 64 * 1024
+    id_profile, amount_profile, city_profile = result['column_profile']
+    assert id_profile['type'] == 'int64' and id_profile['min'] == '1' and id_profile['max'] == '100'
+    assert amount_profile['type'] == 'double'
+    assert city_profile['null_ratio'] == Decimal('0.25') and city_profile['distinct_count'] == 3
@@ -0,0 +1,76 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from tools import local_aws
+from helpers.index_helper import indexable_columns, update_column_index
+from helpers.metadata_helper import process_object
+from helpers.query_helper import (files_by_type, files_in_bucket, files_in_folder, files_with_columns,
+                                  files_with_schema, get_items, parallel_scan)
+from helpers.schema_helper import with_schema
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        s3 = boto3.client('s3')
+        dynamodb = boto3.resource('dynamodb')
+        s3.create_bucket(Bucket='tracked')
+        local_aws.create_tables(dynamodb)
+        yield s3, dynamodb, local_aws.metadata_tables(dynamodb)
+
+
+def store(s3, tables, key, body, timestamp):
+    s3.put_object(Bucket='tracked', Key=key, Body=body)
+    return process_object(s3, tables, 'tracked', key, timestamp, {'etag': None, 'size': None, 'sequencer': None})
+
+
+def test_indexes_answer_folder_type_bucket_and_column_queries(aws):
+    s3, dynamodb, tables = aws
+    store(s3, tables, 'drop/a.csv', b"id,name\n1,a\n", '2024-01-01T00:00:01')
+    store(s3, tables, 'drop/b.psv', b"id|amount\n1|2\n" * 50, '2024-01-01T00:00:02')
+    store(s3, tables, 'drop/nested/c.csv', b"id,name\n", '2024-01-01T00:00:03')
+    store(s3, tables, 'root.csv', b"name\n", '2024-01-01T00:00:04')
+
+    assert [i['filename'] for i in files_in_folder(tables.latest, 'tracked', 'drop/')] == ['a.csv', 'b.psv']
+    assert [i['filename'] for i in files_in_folder(tables.latest, 'tracked', '', file_type='csv')] == ['root.csv']
+    assert [i['filename'] for i in files_by_type(tables.latest, 'csv', min_size=6)] == ['c.csv', 'a.csv']
+    assert [i['filename'] for i in files_in_bucket(tables.latest, 'tracked', since='2024-01-01T00:00:02')] \
+        == ['b.psv', 'c.csv', 'root.csv']
+
+    assert files_with_columns(tables.columns, ['id', 'name']) == ['tracked/drop/a.csv', 'tracked/drop/nested/c.csv']
+    full = get_items(dynamodb, local_aws.LATEST_TABLE_NAME, ['tracked/drop/b.psv'])
+    assert with_schema(full[0], tables.schemas)['header'] == ['id', 'amount']
+    fingerprint = tables.latest.get_item(Key={'filepath': 'tracked/drop/a.csv'})['Item']['schema_hash']
+    assert [i['filename'] for i in files_with_schema(tables.latest, fingerprint)] == ['a.csv', 'c.csv']
+    assert len(parallel_scan(tables.latest, segments=3)) == 4
+
+
+def test_keys_with_empty_segments_are_found_by_their_folder(aws):
+    s3, dynamodb, tables = aws
+    store(s3, tables, '/drop/a.csv', b"id\n1\n", '2024-01-01T00:00:01')
+    store(s3, tables, 'drop//b.csv', b"id\n2\n", '2024-01-01T00:00:02')
+
+    assert tables.latest.get_item(Key={'filepath': 'tracked//drop/a.csv'})['Item']['bucket_folder'] == 'tracked/drop'
+    for folder in ('drop', '/drop', 'drop/'):
+        assert [i['filename'] for i in files_in_folder(tables.latest, 'tracked', folder)] == ['a.csv', 'b.csv']
+
+
+def test_column_index_follows_overwrites_and_deletes(aws):
+    s3, dynamodb, tables = aws
+    store(s3, tables, 'a.csv', b"id,name\n", '2024-01-01T00:00:01')
+    store(s3, tables, 'a.csv', b"id,email\n", '2024-01-01T00:00:02')
+
+    assert files_with_columns(tables.columns, ['name']) == []
+    assert files_with_columns(tables.columns, ['email']) == ['tracked/a.csv']
+
+    removed = with_schema(tables.latest.get_item(Key={'filepath': 'tracked/a.csv'})['Item'], tables.schemas)
+    assert update_column_index(tables.columns, 'tracked/a.csv', old_item=removed) == 2
+    assert tables.columns.scan()['Items'] == []
+
+
+def test_reader_errors_and_blank_names_are_not_indexed():
+    assert indexable_columns(["Unsupported file format"]) == []
+    assert indexable_columns(['a', '', 'a', 'b'], max_columns=5) == ['a', 'b']
+    assert indexable_columns([f"c{i}" for i in range(10)], max_columns=3) == ['c0', 'c1', 'c2']
@@ -0,0 +1,69 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from tools import local_aws
+from tools.reconcile_rollups import reconcile
+from helpers.metadata_helper import flush_rollups, process_object
+from helpers.rollup_helper import RollupBuffer, apply_rollups, folder_keys, rollup_deltas
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        s3 = boto3.client('s3')
+        dynamodb = boto3.resource('dynamodb')
+        s3.create_bucket(Bucket='tracked')
+        local_aws.create_tables(dynamodb)
+        yield s3, local_aws.metadata_tables(dynamodb)
+
+
+def store(s3, tables, key, body, rollups=None):
+    s3.put_object(Bucket='tracked', Key=key, Body=body)
+    return process_object(s3, tables, 'tracked', key, '2024-01-01T00:00:00',
+                          {'etag': None, 'size': None, 'sequencer': None}, rollups=rollups)
+
+
+def rollup(tables, folder_key):
+    return tables.rollups.get_item(Key={'folder_key': folder_key}).get('Item', {})
+
+
+def test_folder_keys_cover_every_parent():
+    assert folder_keys('b', 'raw/2024/01') == ['b/', 'b/raw', 'b/raw/2024', 'b/raw/2024/01']
+    assert folder_keys('b', '') == ['b/']
+
+
+def test_batch_is_coalesced_and_overwrites_apply_a_size_delta(aws):
+    s3, tables = aws
+    buffer = RollupBuffer()
+    store(s3, tables, 'raw/a.csv', b"id\n1\n", rollups=buffer)
+    store(s3, tables, 'raw/b.csv', b"id\n", rollups=buffer)
+    store(s3, tables, 'raw/x/c.psv', b"k|v\n", rollups=buffer)
+    # Three files, three folder levels: one update per level
+    assert len(buffer.deltas) == 3
+    flush_rollups(tables.rollups, buffer)
+
+    assert rollup(tables, 'tracked/raw')['file_count'] == 3
+    assert rollup(tables, 'tracked/raw')['total_bytes'] == 5 + 3 + 4
+    assert rollup(tables, 'tracked/raw/x')['files_psv'] == 1
+
+    # No buffer: applied right away; same type, so only the bytes change
+    store(s3, tables, 'raw/a.csv', b"id\n1\n2\n")
+    assert rollup(tables, 'tracked/')['file_count'] == 3
+    assert rollup(tables, 'tracked/')['bytes_csv'] == 7 + 3
+
+    removed = tables.latest.delete_item(Key={'filepath': 'tracked/raw/x/c.psv'}, ReturnValues='ALL_OLD')['Attributes']
+    apply_rollups(tables.rollups, rollup_deltas(old_item=removed))
+    assert rollup(tables, 'tracked/raw/x')['file_count'] == 0
+    assert reconcile(tables.latest, tables.rollups) == {}
+
+
+def test_reconcile_reports_and_repairs_drift(aws):
+    s3, tables = aws
+    store(s3, tables, 'raw/a.csv', b"id\n1\n")
+    tables.rollups.put_item(Item={'folder_key': 'tracked/raw', 'file_count': 5, 'total_bytes': 5,
+                                  'files_csv': 1, 'bytes_csv': 5})
+
+    assert reconcile(tables.latest, tables.rollups, apply=True) == {'tracked/raw': {'file_count': (5, 1)}}
+    assert reconcile(tables.latest, tables.rollups) == {}
@@ -0,0 +1,69 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from tools import local_aws
+from helpers.metadata_helper import process_object
+from helpers.schema_helper import SCHEMA_CACHE, intern_schema, load_schema, schema_changes, schema_hash
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        s3 = boto3.client('s3')
+        dynamodb = boto3.resource('dynamodb')
+        s3.create_bucket(Bucket='tracked')
+        local_aws.create_tables(dynamodb)
+        yield s3, local_aws.metadata_tables(dynamodb)
+
+
+def test_fingerprint_ignores_padding_but_not_order_or_types():
+    assert schema_hash(['id', ' name ']) == schema_hash(['id', 'name'])
+    assert schema_hash(['id', 'name']) != schema_hash(['name', 'id'])
+    int_id = [{'physical_type': 'INT64', 'logical_type': 'None'}]
+    text_id = [{'physical_type': 'BYTE_ARRAY', 'logical_type': 'String'}]
+    assert schema_hash(['id'], int_id) != schema_hash(['id'], text_id)
+
+
+def test_wide_schemas_are_stored_compressed_and_cached(aws):
+    _, tables = aws
+    header = [f"column_{i}" for i in range(10000)]
+    columns = [{'name': name, 'physical_type': 'INT64', 'logical_type': 'None'} for name in header]
+    item = {'filepath': 'tracked/wide.parquet', 'timestamp': '2024-01-01T00:00:01',
+            'header': header, 'columns': columns}
+
+    fingerprint = intern_schema(tables.schemas, item)
+    assert 'header' not in item and 'columns' not in item and item['schema_hash'] == fingerprint
+    assert 'schema_gz' in tables.schemas.get_item(Key={'schema_hash': fingerprint})['Item']
+
+    SCHEMA_CACHE.clear()
+    schema = load_schema(tables.schemas, fingerprint)
+    assert schema['header'] == header and schema['columns'][9999]['name'] == 'column_9999'
+
+
+def test_drift_between_versions_is_read_from_history(aws):
+    s3, tables = aws
+    for timestamp, body in (('2024-01-01T00:00:01', b"id,name\n"), ('2024-01-01T00:00:02', b"id,name\n1,a\n"),
+                            ('2024-01-01T00:00:03', b"id,email\n")):
+        s3.put_object(Bucket='tracked', Key='a.csv', Body=body)
+        process_object(s3, tables, 'tracked', 'a.csv', timestamp, {'etag': None, 'size': None, 'sequencer': None})
+
+    changes = schema_changes(tables.history, 'tracked/a.csv', latest_table=tables.latest)
+    assert changes == [{'timestamp': '2024-01-01T00:00:03',
+                        'from': schema_hash(['id', 'name']), 'to': schema_hash(['id', 'email'])}]
+    assert len(tables.schemas.scan()['Items']) == 2
+
+
+def test_rows_from_before_interning_are_compared_by_their_header(aws):
+    s3, tables = aws
+    # Written before interning: the header sits on the history row, no hash
+    tables.history.put_item(Item={'filepath': 'tracked/a.csv', 'timestamp': '2024-01-01T00:00:01',
+                                  'header': ['id', 'name']})
+    tables.history.put_item(Item={'filepath': 'tracked/a.csv', 'timestamp': '2024-01-01T00:00:02',
+                                  'schema_hash': schema_hash(['id', 'name'])})
+    tables.latest.put_item(Item={'filepath': 'tracked/a.csv', 'timestamp': '2024-01-01T00:00:03',
+                                 'schema_hash': schema_hash(['id', 'email'])})
+
+    assert schema_changes(tables.history, 'tracked/a.csv', latest_table=tables.latest) == [
+        {'timestamp': '2024-01-01T00:00:03', 'from': schema_hash(['id', 'name']), 'to': schema_hash(['id', 'email'])}]
@@ -0,0 +1,93 @@
+import bz2
+import gzip
+import io
+import json
+import os
+import tarfile
+
+from helpers.fileparsing_helper import read_object_metadata
+from helpers.sniff_helper import sniff_format
+
+
+def _tar(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def test_sniff_format_reads_magic_bytes():
+    assert sniff_format(b"PAR1\x15\x04")['format'] == 'parquet'
+    assert sniff_format(b"PK\x03\x04rest")['format'] == 'zip'
+    assert sniff_format(_tar([('a.csv', b"x\n")]))['format'] == 'tar'
+    assert sniff_format(gzip.compress(b"a,b\n")) == {'format': 'text', 'compression': 'gz', 'encoding': 'utf-8'}
+    assert sniff_format(b"\xef\xbb\xbfa,b\n")['encoding'] == 'utf-8-sig'
+    assert sniff_format(b"\x00\x01\x02\x03")['format'] == 'binary'
+
+
+def test_binary_object_costs_only_the_sniff_read(fake_s3):
+    data = b"\x7fELF\x00\x00" + bytes(1024 * 1024)
+    s3 = fake_s3(data)
+    result = read_object_metadata(s3, 'b', 'data.csv', size=len(data))
+    assert result['header'] == ["Unsupported file format"]
+    assert result['detected_type'] == 'binary'
+    assert len(s3.calls) == 1 and result['bytes_fetched'] == 4096
+
+
+def test_content_wins_over_misleading_extension(fake_s3):
+    tarred = gzip.compress(_tar([('inner/rows.csv', b"k|v\n1|2\n")]))
+    result = read_object_metadata(fake_s3(tarred), 'b', 'drop/rows.zip', size=len(tarred))
+    assert result['header'] == ['k', 'v'] and result['member'] == 'inner/rows.csv'
+    assert (result['detected_type'], result['extension_type']) == ('tar.gz', 'zip')
+
+
+def test_header_is_reused_from_the_sniffed_prefix(fake_s3):
+    data = b"\xef\xbb\xbfid,name\n" + b"1,a\n" * 100000
+    s3 = fake_s3(data)
+    result = read_object_metadata(s3, 'b', 'no_extension', size=len(data))
+    assert result['header'] == ['id', 'name']
+    assert len(s3.calls) == 1
+
+
+def test_unpeekable_codec_falls_back_to_extension(fake_s3):
+    # bz2 emits nothing before a whole block is in, far more than the sniffed prefix
+    data = bz2.compress(b"a,b\n" + os.urandom(512 * 1024).hex().encode())
+    result = read_object_metadata(fake_s3(data), 'b', 'x.csv.bz2', size=len(data))
+    assert result['header'] == ['a', 'b']
+    assert result['detected_type'] == 'bz2'
+
+
+def test_json_lines_header_is_the_keys_of_the_first_records(fake_s3, monkeypatch):
+    from helpers import fileparsing_helper
+    monkeypatch.setattr(fileparsing_helper, 'COUNT_ROWS', True)
+    lines = b''.join(json.dumps({'id': i, 'name': 'a', **({'note': 'x'} if i == 3 else {})}).encode() + b"\n"
+                     for i in range(5000))
+    data = gzip.compress(lines)
+    result = read_object_metadata(fake_s3(data), 'b', 'feed/events.ndjson.gz', size=len(data))
+    assert result['header'] == ['id', 'name', 'note']
+    assert (result['detected_type'], result['extension_type']) == ('text.gz', 'jsonl.gz')
+    assert (result['row_count'], result['row_count_exact']) == (5000, True)
+
+
+def test_csv_starting_with_orc_stays_text():
+    assert sniff_format(b"ORCID,name\n1,a\n")['format'] == 'text'
+
+
+def test_latin1_text_is_read_on_a_text_extension(fake_s3):
+    data = b"id,name,city\n1,Ren\xe9e,M\xfcnchen\n"
+    for key, body in (('people.csv', data), ('people.csv.gz', gzip.compress(data))):
+        result = read_object_metadata(fake_s3(body), 'b', key, size=len(body))
+        assert result['header'] == ['id', 'name', 'city']
+    result = read_object_metadata(fake_s3(data), 'b', 'people.bin', size=len(data))
+    assert result['header'] == ["Unsupported file format"]
+
+
+def test_text_with_an_extension_we_do_not_read_is_unsupported(fake_s3):
+    data = b'{"a": 1, "b": 2}\n'
+    s3 = fake_s3(data)
+    result = read_object_metadata(s3, 'b', 'data.json', size=len(data))
+    assert result['header'] == ["Unsupported file format"]
+    assert result['detected_type'] == 'text' and len(s3.calls) == 1
@@ -0,0 +1,110 @@
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from helpers import storage_helper
+from helpers.storage_helper import delete_latest, delete_latest_batch, normalize_sequencer, store_latest
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb')
+        created = {}
+        for name, sort_key in (('latest', None), ('history', 'timestamp'), ('deleted', None)):
+            schema = [{'AttributeName': 'filepath', 'KeyType': 'HASH'}]
+            attributes = [{'AttributeName': 'filepath', 'AttributeType': 'S'}]
+            if sort_key:
+                schema.append({'AttributeName': sort_key, 'KeyType': 'RANGE'})
+                attributes.append({'AttributeName': sort_key, 'AttributeType': 'S'})
+            created[name] = dynamodb.create_table(TableName=name, KeySchema=schema,
+                                                  AttributeDefinitions=attributes,
+                                                  BillingMode='PAY_PER_REQUEST')
+        yield created
+
+
+def item(timestamp, sequencer):
+    return {'filepath': 'b/k.csv', 'timestamp': timestamp, 'sequencer': normalize_sequencer(sequencer)}
+
+
+def test_overwrite_archives_previous_version(tables):
+    assert store_latest(tables['latest'], tables['history'], item('t1', '0055AED6DCD90281E5'))[0] == 'stored'
+    status, old = store_latest(tables['latest'], tables['history'], item('t2', '0055AED6DCD90281E6'))
+
+    assert status == 'stored' and old['timestamp'] == 't1'
+    assert tables['history'].get_item(Key={'filepath': 'b/k.csv', 'timestamp': 't1'})['Item']
+    assert tables['latest'].get_item(Key={'filepath': 'b/k.csv'})['Item']['timestamp'] == 't2'
+
+
+def test_overwrite_is_undone_when_history_cannot_be_written(tables):
+    store_latest(tables['latest'], tables['history'], item('t1', '0055AED6DCD90281E5'))
+    missing_history = boto3.resource('dynamodb').Table('missing')
+
+    with pytest.raises(ClientError):
+        store_latest(tables['latest'], missing_history, item('t2', '0055AED6DCD90281E6'))
+    assert tables['latest'].get_item(Key={'filepath': 'b/k.csv'})['Item']['timestamp'] == 't1'
+    assert store_latest(tables['latest'], tables['history'], item('t2', '0055AED6DCD90281E6'))[0] == 'stored'
+    assert tables['history'].get_item(Key={'filepath': 'b/k.csv', 'timestamp': 't1'})['Item']
+
+
+def test_out_of_order_events_do_not_replace_newer_rows(tables):
+    store_latest(tables['latest'], tables['history'], item('t2', '0055AED6DCD90281E6'))
+
+    assert store_latest(tables['latest'], tables['history'], item('t1', '0055AED6DCD90281E5'))[0] == 'stale'
+    assert delete_latest(tables['latest'], tables['deleted'], 'b/k.csv', 'd1', normalize_sequencer('0055AED6DCD90281E5'))[0] == 'stale'
+    assert tables['latest'].get_item(Key={'filepath': 'b/k.csv'})['Item']['timestamp'] == 't2'
+    assert tables['history'].scan()['Count'] == 0
+
+
+def test_delete_logs_removed_item(tables):
+    store_latest(tables['latest'], tables['history'], item('t1', '0055AED6DCD90281E5'))
+
+    status, old = delete_latest(tables['latest'], tables['deleted'], 'b/k.csv', 'd1', normalize_sequencer('0055AED6DCD90281F0'))
+
+    assert status == 'deleted' and old['timestamp'] == 't1'
+    assert tables['deleted'].get_item(Key={'filepath': 'b/k.csv'})['Item']['deletion_timestamp'] == 'd1'
+    assert delete_latest(tables['latest'], tables['deleted'], 'b/k.csv', 'd2')[0] == 'not_found'
+
+
+def test_delete_is_undone_when_its_log_cannot_be_written(tables):
+    store_latest(tables['latest'], tables['history'], item('t1', '0055AED6DCD90281E5'))
+    missing_log = boto3.resource('dynamodb').Table('missing')
+
+    with pytest.raises(ClientError):
+        delete_latest(tables['latest'], missing_log, 'b/k.csv', 'd1', normalize_sequencer('0055AED6DCD90281F0'))
+    assert tables['latest'].get_item(Key={'filepath': 'b/k.csv'})['Item']['timestamp'] == 't1'
+
+
+def test_batched_delete_spares_rows_rewritten_after_the_read(tables, monkeypatch):
+    store_latest(tables['latest'], tables['history'], item('t1', '0055AED6DCD90281E5'))
+    read = storage_helper.get_items
+
+    def read_then_upload(*args, **kwargs):
+        # A newer upload lands between the BatchGetItem and the delete
+        items = read(*args, **kwargs)
+        store_latest(tables['latest'], tables['history'], item('t2', '0055AED6DCD90281F5'))
+        return items
+
+    monkeypatch.setattr(storage_helper, 'get_items', read_then_upload)
+    dynamodb = boto3.resource('dynamodb')
+    results = delete_latest_batch(dynamodb, tables['latest'], tables['deleted'],
+                                  [('b/k.csv', 'd1', normalize_sequencer('0055AED6DCD90281F0'))])
+
+    assert results['b/k.csv'] == ('stale', None)
+    assert tables['latest'].get_item(Key={'filepath': 'b/k.csv'})['Item']['timestamp'] == 't2'
+    assert tables['deleted'].scan()['Count'] == 0
+
+
+
+def test_failed_batch_transaction_reports_only_its_keys(tables):
+    store_latest(tables['latest'], tables['history'], item('t1', '0055AED6DCD90281E5'))
+    missing_log = boto3.resource('dynamodb').Table('missing')
+
+    results = delete_latest_batch(boto3.resource('dynamodb'), tables['latest'], missing_log,
+                                  [('b/k.csv', 'd1', normalize_sequencer('0055AED6DCD90281F0')),
+                                   ('b/other.csv', 'd1', None)])
+
+    assert results == {'b/k.csv': ('error', None), 'b/other.csv': ('not_found', None)}
+    assert tables['latest'].get_item(Key={'filepath': 'b/k.csv'})['Item']['timestamp'] == 't1'
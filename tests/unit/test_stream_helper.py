@@ -0,0 +1,65 @@
+import gzip
+import io
+import os
+
+from helpers.stream_helper import iter_body_chunks, read_header_line, stream_header_line, stream_row_count
+from helpers.fileparsing_helper import read_object_metadata
+
+
+def test_plain_header_uses_single_ranged_get(fake_s3):
+    data = b"id,name,amount\n" + b"1,a,2\n" * 200000
+    s3 = fake_s3(data)
+    line, fetched = stream_header_line(s3, 'b', 'k.csv', size=len(data))
+    assert line == b"id,name,amount\n"
+    assert len(s3.calls) == 1
+    assert fetched < len(data)
+
+
+def test_gzip_header_stops_at_first_newline(fake_s3):
+    data = gzip.compress(b"a|b|c\n" + os.urandom(2 * 1024 * 1024).hex().encode())
+    s3 = fake_s3(data)
+    result = read_object_metadata(s3, 'b', 'x/file.psv.gz', size=len(data))
+    assert result['header'] == ['a', 'b', 'c']
+    assert result['bytes_fetched'] <= 64 * 1024
+
+
+def test_header_longer_than_first_range_grows_requests(fake_s3):
+    columns = [f"col_{i}" for i in range(20000)]
+    data = (",".join(columns) + "\n1\n").encode()
+    s3 = fake_s3(data)
+    assert read_object_metadata(s3, 'b', 'wide.csv', size=len(data))['header'] == columns
+    assert len(s3.calls) > 1
+
+
+def test_streaming_body_with_concatenated_gzip_members():
+    data = gzip.compress(b"x,") + gzip.compress(b"y\nrest\n")
+    line, fetched = read_header_line(iter_body_chunks(io.BytesIO(data), 4), compression='gz')
+    assert line == b"x,y\n"
+    assert 0 < fetched <= len(data)
+
+
+def test_row_count_is_exact_within_cutoff(fake_s3):
+    data = gzip.compress(b"id\n" + b"".join(b"%d\n" % i for i in range(250000)) + b"last")
+    s3 = fake_s3(data)
+    assert stream_row_count(s3, 'b', 'k.csv.gz', size=len(data), compression='gz',
+                            chunk_size=4096) == (250001, True, len(data))
+
+
+def test_row_count_estimates_past_cutoff(fake_s3):
+    data = b"id,value\n" + b"".join(b"row,%06d\n" % i for i in range(100000))
+    s3 = fake_s3(data)
+    rows, exact, fetched = stream_row_count(s3, 'b', 'k.csv', size=len(data), max_bytes=len(data) // 10)
+    assert not exact and fetched == len(data) // 10
+    assert abs(rows - 100000) < 100
+
+
+def test_row_count_continues_after_the_sniffed_prefix(fake_s3, monkeypatch):
+    from helpers import fileparsing_helper
+    monkeypatch.setattr(fileparsing_helper, 'COUNT_ROWS', True)
+    monkeypatch.setattr(fileparsing_helper, 'ROW_COUNT_MAX_BYTES', 64 * 1024)
+    data = b"id,value\n" + b"".join(b"row,%06d\n" % i for i in range(100000))
+    s3 = fake_s3(data)
+    result = read_object_metadata(s3, 'b', 'k.csv', size=len(data))
+    assert s3.calls == ['bytes=0-4095', f"bytes=4096-{64 * 1024 - 1}"]
+    assert result['bytes_fetched'] == 64 * 1024 and not result['row_count_exact']
+    assert abs(result['row_count'] - 100000) < 100
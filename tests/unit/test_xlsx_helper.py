@@ -0,0 +1,42 @@
+import io
+import os
+import zipfile
+
+from helpers.fileparsing_helper import read_object_metadata
+
+MAIN = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+
+
+def _workbook(data_rows):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        workbook.writestr('xl/workbook.xml', (
+            f'<workbook {MAIN} xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="Orders" sheetId="1" r:id="rId3"/></sheets></workbook>'))
+        workbook.writestr('xl/_rels/workbook.xml.rels', (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId3" Target="worksheets/orders.xml" Type="worksheet"/></Relationships>'))
+        workbook.writestr('xl/sharedStrings.xml', f'<sst {MAIN}>' + ''.join(
+            f'<si><t>s{i}</t></si>' for i in range(20000)) + '</sst>')
+        rows = ''.join(f'<row r="{i}"><c r="A{i}"><v>{i}</v></c></row>' for i in range(2, data_rows + 2))
+        workbook.writestr('xl/worksheets/orders.xml', (
+            f'<worksheet {MAIN}><dimension ref="A1:D{data_rows + 1}"/><sheetData><row r="1">'
+            '<c r="A1" t="s"><v>1</v></c><c r="B1" t="inlineStr"><is><t>amount</t></is></c>'
+            f'<c r="D1" t="s"><v>2</v></c></row>{rows}</sheetData></worksheet>'))
+        # Embedded images make up most of many real workbooks
+        workbook.writestr('xl/media/image1.png', os.urandom(4 * 1024 * 1024))
+    return buffer.getvalue()
+
+
+def test_xlsx_header_reads_only_the_parts_it_needs(fake_s3):
+    data = _workbook(50000)
+    s3 = fake_s3(data)
+
+    result = read_object_metadata(s3, 'b', 'finance/orders.xlsx', size=len(data))
+
+    assert (result['detected_type'], result['extension_type']) == ('zip', 'xlsx')
+    assert result['header'] == ['s1', 'amount', '', 's2']
+    assert result['sheet'] == 'Orders'
+    assert (result['row_count'], result['row_count_exact']) == (50000, False)
+    assert None not in s3.calls
+    assert result['bytes_fetched'] < len(data) // 10
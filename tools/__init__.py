@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Operational tools run outside Lambda, so make the helper layer importable the same way
+HELPER_LAYER = os.path.join(ROOT, 'infra', 'layers', 'helper_layer', 'python')
+if HELPER_LAYER not in sys.path:
+    sys.path.insert(0, HELPER_LAYER)
@@ -0,0 +1,193 @@
+# Backfill metadata for objects that were already in the tracked bucket before the
+# event pipeline existed. Uses the same extraction/storage code as metadata_handler.
+#
+#   python -m tools.backfill --prefix raw/ --prefix curated/ --workers 64 --rate 500 \
+#       --checkpoint backfill.json
+#
+# Table names default to the same env vars the MetaData Lambda reads.
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import boto3
+from botocore.config import Config
+
+from tools import local_aws
+from infra.file_metadata_tracker.config import *
+from helpers.idempotency_helper import normalize_etag
+from helpers.metadata_helper import flush_rollups, process_object
+from helpers.rollup_helper import RollupBuffer
+
+
+class RateLimiter:
+    # Token bucket shared by every worker thread, one token per AWS API call
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, **kwargs):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+
+def attach_rate_limit(client, limiter):
+    # Every API call made through this client (including retries) waits for a token
+    service = client.meta.service_model.service_name
+    client.meta.events.register(f"before-call.{service}", limiter.acquire)
+
+
+class Checkpoint:
+    # {"prefixes": {prefix: {"token": ..., "done": bool}}, "counts": {...}}, rewritten atomically
+    def __init__(self, path=None):
+        self.path = path
+        self.state = {'prefixes': {}, 'counts': {}}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def prefix(self, prefix):
+        return self.state['prefixes'].get(prefix, {'token': None, 'done': False})
+
+    def advance(self, prefix, token, counts):
+        with self._lock:
+            self.state['prefixes'][prefix] = {'token': token, 'done': token is None}
+            total = Counter(self.state['counts'])
+            total.update(counts)
+            self.state['counts'] = dict(total)
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def iter_pages(s3, bucket, prefix, token=None, page_size=1000):
+    # Yields (objects, next continuation token) so progress can be saved per page
+    while True:
+        request = {'Bucket': bucket, 'Prefix': prefix, 'MaxKeys': page_size}
+        if token:
+            request['ContinuationToken'] = token
+        page = s3.list_objects_v2(**request)
+        token = page.get('NextContinuationToken')
+        yield page.get('Contents', []), token
+        if not token:
+            return
+
+
+def backfill_prefix(s3, tables, bucket, prefix, pool, checkpoint):
+    progress = checkpoint.prefix(prefix)
+    if progress['done']:
+        print(f"Prefix already complete, skipping: {prefix}")
+        return
+
+    for objects, next_token in iter_pages(s3, bucket, prefix, token=progress['token']):
+        timestamp = datetime.utcnow().isoformat()
+        rollups = RollupBuffer()
+        futures = []
+        for obj in objects:
+            # Listing has no sequencer, so backfilled rows never replace rows from live events
+            fingerprint = {'etag': normalize_etag(obj.get('ETag')), 'size': obj.get('Size'), 'sequencer': None}
+            futures.append(pool.submit(process_object, s3, tables, bucket, obj['Key'], timestamp, fingerprint,
+                                       rollups=rollups))
+        wait(futures)
+        # A page of new files in one folder becomes a single counter update per folder level
+        if tables.rollups is not None:
+            flush_rollups(tables.rollups, rollups)
+
+        counts = Counter()
+        for future in futures:
+            try:
+                counts[future.result()] += 1
+            except Exception as e:
+                print(f"Error in backfill worker: {e}")
+                counts['error'] += 1
+        # Only checkpoint once the whole page is done, a resumed run redoes at most one page
+        checkpoint.advance(prefix, next_token, counts)
+        print(f"{prefix}: {dict(counts)}")
+
+
+def run_backfill(s3, dynamodb, bucket, prefixes=('',), workers=32, rate=None,
+                 checkpoint_path=None, table_names=None):
+    if rate:
+        limiter = RateLimiter(rate)
+        attach_rate_limit(s3, limiter)
+        attach_rate_limit(dynamodb.meta.client, limiter)
+
+    tables = local_aws.metadata_tables(dynamodb, table_names)
+    checkpoint = Checkpoint(checkpoint_path)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            ThreadPoolExecutor(max_workers=min(len(prefixes), 8)) as listers:
+        futures = [listers.submit(backfill_prefix, s3, tables, bucket, prefix, pool, checkpoint)
+                   for prefix in prefixes]
+        for future in futures:
+            future.result()
+
+    return checkpoint.state['counts']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index objects that already exist in the tracked bucket")
+    parser.add_argument('--bucket', default=S3_BUCKET_TO_TRACK)
+    parser.add_argument('--prefix', action='append', dest='prefixes',
+                        help="Prefix to backfill, repeatable (default: whole bucket)")
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--rate', type=float, help="Max AWS API calls per second across S3 and DynamoDB")
+    parser.add_argument('--checkpoint', help="JSON file used to resume an interrupted run")
+    parser.add_argument('--endpoint-url', help="Local S3/DynamoDB stand-in, e.g. http://localhost:5000")
+    parser.add_argument('--latest-table', default=os.environ.get(ENV_LATEST_TABLE, LATEST_TABLE_NAME))
+    parser.add_argument('--skipped-table', default=os.environ.get(ENV_SKIPPED_TABLE, SKIPPED_TABLE_NAME))
+    parser.add_argument('--failed-table', default=os.environ.get(ENV_FAILED_TABLE, FAILED_TABLE_NAME))
+    parser.add_argument('--history-table', default=os.environ.get(ENV_HISTORY_TABLE, HISTORY_TABLE_NAME))
+    parser.add_argument('--column-index-table',
+                        default=os.environ.get(ENV_COLUMN_INDEX_TABLE, COLUMN_INDEX_TABLE_NAME))
+    parser.add_argument('--rollup-table', default=os.environ.get(ENV_ROLLUP_TABLE, ROLLUP_TABLE_NAME))
+    parser.add_argument('--schema-table', default=os.environ.get(ENV_SCHEMA_TABLE, SCHEMA_TABLE_NAME))
+    args = parser.parse_args(argv)
+
+    config = Config(max_pool_connections=args.workers, retries={'mode': 'adaptive', 'max_attempts': 10})
+    s3 = boto3.client('s3', endpoint_url=args.endpoint_url, config=config)
+    dynamodb = boto3.resource('dynamodb', endpoint_url=args.endpoint_url, config=config)
+
+    counts = run_backfill(
+        s3, dynamodb, args.bucket,
+        prefixes=args.prefixes or [''],
+        workers=args.workers,
+        rate=args.rate,
+        checkpoint_path=args.checkpoint,
+        table_names={
+            'latest': args.latest_table,
+            'skipped': args.skipped_table,
+            'failed': args.failed_table,
+            'history': args.history_table,
+            'columns': args.column_index_table,
+            'rollups': args.rollup_table,
+            'schemas': args.schema_table,
+        }
+    )
+    print(f"Backfill finished: {counts}")
+
+
+if __name__ == '__main__':
+    main()
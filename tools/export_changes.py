@@ -0,0 +1,115 @@
+# Runs the Parquet export against recorded DynamoDB stream records instead of the live
+# streams: the records are cut into micro-batches as the event source mapping would, each
+# batch goes through write_changes, and the change files are compacted at the end.
+#
+#   python -m tools.export_changes records.jsonl --output exports/
+#   python -m tools.export_changes records.jsonl --bucket my-export --endpoint-url http://localhost:4566
+#
+# Each input line is a Lambda stream event ({"Records": [...]}), GetRecords output (same
+# shape) or a single stream record. Records without an eventSourceARN (GetRecords output)
+# are taken to come from --table.
+import argparse
+import json
+import os
+
+import boto3
+
+from infra.file_metadata_tracker.config import *
+from helpers.export_helper import S3Store, compact, write_changes
+
+
+class LocalStore:
+    # S3Store's interface over a directory, keys map to relative paths
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def get(self, key):
+        if not os.path.exists(self._path(key)):
+            return None
+        with open(self._path(key), 'rb') as f:
+            return f.read()
+
+    def delete(self, key):
+        if os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def keys(self, prefix, start_after=None):
+        keys = []
+        for directory, _, files in os.walk(self.root):
+            relative = os.path.relpath(directory, self.root).replace(os.sep, '/')
+            for name in files:
+                key = name if relative == '.' else f"{relative}/{name}"
+                if key.startswith(prefix) and (not start_after or key > start_after):
+                    keys.append(key)
+        return sorted(keys)
+
+    def prefixes(self, prefix):
+        directory = self._path(prefix)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(f"{prefix}{name}/" for name in os.listdir(directory)
+                      if os.path.isdir(os.path.join(directory, name)))
+
+
+def read_records(path):
+    records = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            records.extend(data['Records'] if 'Records' in data else [data])
+    return records
+
+
+def export(store, records, batch_size=EXPORT_BATCH_SIZE, table_names=None, default_table='latest',
+           compact_after=True):
+    # Returns {'batches', 'files', 'snapshot'}
+    table_names = table_names or {LATEST_TABLE_NAME: 'latest', DELETED_TABLE_NAME: 'deleted'}
+    files = []
+    for start in range(0, len(records), batch_size):
+        files.extend(write_changes(store, records[start:start + batch_size], table_names, default_table))
+    return {
+        'batches': -(-len(records) // batch_size),
+        'files': files,
+        'snapshot': compact(store) if compact_after else {},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export recorded DynamoDB stream records to partitioned Parquet")
+    parser.add_argument('records', help="JSON lines of stream events, GetRecords output or stream records")
+    parser.add_argument('--output', help="Local directory to write to")
+    parser.add_argument('--bucket', default=os.environ.get(ENV_EXPORT_BUCKET), help="Export bucket instead of --output")
+    parser.add_argument('--endpoint-url', help="Local S3 stand-in, e.g. http://localhost:4566")
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE, help="Records per micro-batch")
+    parser.add_argument('--table', choices=('latest', 'deleted'), default='latest',
+                        help="Source of records that carry no stream ARN")
+    parser.add_argument('--no-compact', action='store_true', help="Only write change files")
+    args = parser.parse_args(argv)
+
+    if args.output:
+        store = LocalStore(args.output)
+    elif args.bucket:
+        store = S3Store(boto3.client('s3', endpoint_url=args.endpoint_url), args.bucket)
+    else:
+        parser.error("one of --output or --bucket is required")
+
+    result = export(store, read_records(args.records), batch_size=args.batch_size,
+                    default_table=args.table, compact_after=not args.no_compact)
+    print(json.dumps({'batches': result['batches'], 'files': len(result['files']),
+                      'snapshot': result['snapshot']}, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,109 @@
+# Table layouts mirrored from FileMetadataTrackerStack, for running tools and tests
+# against a local S3/DynamoDB stand-in (moto, LocalStack, DynamoDB Local)
+import importlib.util
+import os
+from contextlib import contextmanager
+
+from tools import ROOT
+from infra.file_metadata_tracker.config import *
+from helpers.metadata_helper import MetadataTables
+
+
+TABLE_KEYS = {
+    LATEST_TABLE_NAME: ('filepath', None),
+    SKIPPED_TABLE_NAME: ('filepath', None),
+    FAILED_TABLE_NAME: ('filepath', None),
+    HISTORY_TABLE_NAME: ('filepath', 'timestamp'),
+    DELETED_TABLE_NAME: ('filepath', None),
+    COLUMN_INDEX_TABLE_NAME: ('column_name', 'filepath'),
+    ROLLUP_TABLE_NAME: ('folder_key', None),
+    SCHEMA_TABLE_NAME: ('schema_hash', None),
+}
+TABLE_INDEXES = {
+    LATEST_TABLE_NAME: LATEST_TABLE_INDEXES,
+}
+
+
+def create_tables(dynamodb):
+    tables = {}
+    for name, (partition_key, sort_key) in TABLE_KEYS.items():
+        key_schema = [{'AttributeName': partition_key, 'KeyType': 'HASH'}]
+        attributes = [{'AttributeName': partition_key, 'AttributeType': 'S'}]
+        if sort_key:
+            key_schema.append({'AttributeName': sort_key, 'KeyType': 'RANGE'})
+            attributes.append({'AttributeName': sort_key, 'AttributeType': 'S'})
+
+        indexes = []
+        for index_name, ((index_partition, partition_type), (index_sort, sort_type)) in TABLE_INDEXES.get(name, {}).items():
+            indexes.append({
+                'IndexName': index_name,
+                'KeySchema': [{'AttributeName': index_partition, 'KeyType': 'HASH'},
+                              {'AttributeName': index_sort, 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': INDEX_PROJECTED_ATTRIBUTES},
+            })
+            for attribute, attribute_type in ((index_partition, partition_type), (index_sort, sort_type)):
+                if attribute not in [a['AttributeName'] for a in attributes]:
+                    attributes.append({'AttributeName': attribute, 'AttributeType': attribute_type})
+
+        request = {
+            'TableName': name,
+            'KeySchema': key_schema,
+            'AttributeDefinitions': attributes,
+            'BillingMode': 'PAY_PER_REQUEST'
+        }
+        if indexes:
+            request['GlobalSecondaryIndexes'] = indexes
+        tables[name] = dynamodb.create_table(**request)
+    return tables
+
+
+def metadata_tables(dynamodb, names=None):
+    names = names or {}
+    return MetadataTables(
+        latest=dynamodb.Table(names.get('latest', LATEST_TABLE_NAME)),
+        skipped=dynamodb.Table(names.get('skipped', SKIPPED_TABLE_NAME)),
+        failed=dynamodb.Table(names.get('failed', FAILED_TABLE_NAME)),
+        history=dynamodb.Table(names.get('history', HISTORY_TABLE_NAME)),
+        columns=dynamodb.Table(names.get('columns', COLUMN_INDEX_TABLE_NAME)),
+        rollups=dynamodb.Table(names.get('rollups', ROLLUP_TABLE_NAME)),
+        schemas=dynamodb.Table(names.get('schemas', SCHEMA_TABLE_NAME)),
+    )
+
+
+# Table environment the stack gives the Lambdas, pointing at the tables above
+LAMBDA_ENVIRONMENT = {
+    ENV_LATEST_TABLE: LATEST_TABLE_NAME,
+    ENV_SKIPPED_TABLE: SKIPPED_TABLE_NAME,
+    ENV_FAILED_TABLE: FAILED_TABLE_NAME,
+    ENV_HISTORY_TABLE: HISTORY_TABLE_NAME,
+    ENV_DELETED_TABLE: DELETED_TABLE_NAME,
+    ENV_COLUMN_INDEX_TABLE: COLUMN_INDEX_TABLE_NAME,
+    ENV_ROLLUP_TABLE: ROLLUP_TABLE_NAME,
+    ENV_SCHEMA_TABLE: SCHEMA_TABLE_NAME,
+}
+
+
+@contextmanager
+def environment(env):
+    previous = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def load_lambda(relative_path, env=None):
+    # Imports a Lambda module from code/ as a fresh module. Lambda modules read their
+    # environment at import, so the table environment (plus env) is only set while it loads
+    path = os.path.join(ROOT, 'code', relative_path)
+    module_name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    with environment({**LAMBDA_ENVIRONMENT, **(env or {})}):
+        spec.loader.exec_module(module)
+    return module
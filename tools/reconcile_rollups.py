@@ -0,0 +1,83 @@
+# Rebuilds the folder rollups from a parallel scan of the latest table and reports every
+# counter that drifted from what the Lambdas maintained incrementally.
+#
+#   python -m tools.reconcile_rollups                 # report only
+#   python -m tools.reconcile_rollups --apply         # also overwrite drifted rows
+#
+# --apply writes absolute values, so run it when uploads are quiet: an ADD landing between
+# the scan and the write would be overwritten.
+import argparse
+import json
+import os
+from collections import Counter, defaultdict
+
+import boto3
+
+from infra.file_metadata_tracker.config import *
+from helpers.query_helper import parallel_scan
+from helpers.rollup_helper import rollup_deltas
+
+
+def expected_rollups(latest_table, segments=8):
+    expected = defaultdict(Counter)
+    items = parallel_scan(latest_table, segments=segments,
+                          projection='#bucket, #folder, #file_type, #size',
+                          attribute_names={'#bucket': 'bucket', '#folder': 'folder',
+                                           '#file_type': 'file_type', '#size': 'size'})
+    for item in items:
+        for key, counters in rollup_deltas(new_item=item).items():
+            expected[key].update(counters)
+    return expected
+
+
+def find_drift(expected, actual):
+    # {folder key: {attribute: (stored, expected)}} for every counter that differs;
+    # a missing row or attribute counts as zero
+    drift = {}
+    for folder_key in sorted(set(expected) | set(actual)):
+        stored = actual.get(folder_key, {})
+        wanted = expected.get(folder_key, {})
+        differences = {}
+        for name in set(stored) | set(wanted):
+            if name == 'folder_key':
+                continue
+            old, new = int(stored.get(name, 0)), int(wanted.get(name, 0))
+            if old != new:
+                differences[name] = (old, new)
+        if differences:
+            drift[folder_key] = differences
+    return drift
+
+
+def reconcile(latest_table, rollup_table, apply=False, segments=8):
+    expected = expected_rollups(latest_table, segments=segments)
+    actual = {item['folder_key']: item for item in parallel_scan(rollup_table, segments=segments)}
+    drift = find_drift(expected, actual)
+
+    if apply:
+        for folder_key in drift:
+            counters = {name: value for name, value in expected.get(folder_key, {}).items() if value}
+            rollup_table.put_item(Item={'folder_key': folder_key, **counters})
+    return drift
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild folder rollups from the latest table and report drift")
+    parser.add_argument('--apply', action='store_true', help="Overwrite rows that drifted")
+    parser.add_argument('--segments', type=int, default=8, help="Parallel scan segments")
+    parser.add_argument('--endpoint-url', help="Local DynamoDB stand-in, e.g. http://localhost:8000")
+    parser.add_argument('--latest-table', default=os.environ.get(ENV_LATEST_TABLE, LATEST_TABLE_NAME))
+    parser.add_argument('--rollup-table', default=os.environ.get(ENV_ROLLUP_TABLE, ROLLUP_TABLE_NAME))
+    args = parser.parse_args(argv)
+
+    dynamodb = boto3.resource('dynamodb', endpoint_url=args.endpoint_url)
+    drift = reconcile(dynamodb.Table(args.latest_table), dynamodb.Table(args.rollup_table),
+                      apply=args.apply, segments=args.segments)
+
+    print(json.dumps(drift, indent=2, sort_keys=True))
+    print(f"{len(drift)} folder(s) drifted{', repaired' if args.apply and drift else ''}")
+    return 1 if drift and not args.apply else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
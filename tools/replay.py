@@ -0,0 +1,313 @@
+# Replays captured S3 events end to end: SQS batches go through event_router.handler, and
+# the Step Functions executions it starts run metadata_handler / deletion_tracker.handler
+# on a local worker pool, all against moto's in-memory S3 and DynamoDB.
+#
+#   python -m tools.replay events.jsonl --batch-size 100 --workers 16 --output replay.json
+#   python -m tools.replay --synthetic 5000 --duplicates 0.1 --reorder 0.1
+#
+# Each input line is an EventBridge event, an SQS record ({"messageId", "body"}) or a whole
+# SQS batch ({"Records": [...]}). A line may also be {"event": {...}, "content": "..."} (or
+# "content_base64") to give the body of a created object; other objects get a small CSV.
+# S3 is staged with the final state of every key (last event by sequencer, else file order),
+# as it is by the time late events arrive, and the events are delivered in file order.
+#
+# Reports events/sec, latency from SQS receive to the end of the execution, and the final
+# tables. The latest table is checked against the keys whose last event was a create.
+import argparse
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import boto3
+
+from tools import local_aws
+from infra.file_metadata_tracker.config import *
+from helpers.storage_helper import normalize_sequencer
+
+CREATED_ARN = 'arn:aws:states:local:000000000000:stateMachine:UploadTracker'
+DELETED_ARN = 'arn:aws:states:local:000000000000:stateMachine:DeletionTracker'
+DEFAULT_CONTENT = b"id,name\n1,replay\n"
+# SQS moves a message to the dead-letter queue after this many receives
+MAX_RECEIVES = 3
+
+
+def _entry(event, content=None):
+    return {'event': event, 'content': content}
+
+
+def read_events(path):
+    # [{'event', 'content'}] in file order
+    entries = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if 'Records' in data:
+                entries.extend(_entry(json.loads(record['body'])) for record in data['Records'])
+            elif 'body' in data:
+                entries.append(_entry(json.loads(data['body'])))
+            elif 'event' in data:
+                content = data.get('content')
+                if 'content_base64' in data:
+                    content = base64.b64decode(data['content_base64'])
+                elif content is not None:
+                    content = content.encode('utf-8')
+                entries.append(_entry(data['event'], content))
+            else:
+                entries.append(_entry(data))
+    return entries
+
+
+def s3_event(detail_type, bucket, key, sequencer, content=None):
+    detail_object = {'key': key, 'sequencer': sequencer}
+    if content is not None:
+        detail_object['size'] = len(content)
+        detail_object['etag'] = hashlib.md5(content).hexdigest()
+    return {'version': '0', 'detail-type': detail_type, 'source': 'aws.s3',
+            'detail': {'bucket': {'name': bucket}, 'object': detail_object}}
+
+
+def synthetic_events(count, keys=100, bucket='replay-bucket', delete_rate=0.2, duplicates=0.1, reorder=0.1,
+                     seed=0):
+    # A burst over a small key space: overwrites, deletes, redelivered duplicates and
+    # neighbours swapped out of order
+    rng = random.Random(seed)
+    entries = []
+    for sequence in range(count):
+        key = f"replay/part{rng.randrange(keys)}/file{rng.randrange(keys)}.csv"
+        sequencer = format(sequence + 1, '016X')
+        if rng.random() < delete_rate:
+            entries.append(_entry(s3_event('Object Deleted', bucket, key, sequencer)))
+        else:
+            content = f"id,name\n{sequence},v{sequence}\n".encode()
+            entries.append(_entry(s3_event('Object Created', bucket, key, sequencer, content), content))
+        if rng.random() < duplicates:
+            entries.append(entries[-1])
+    for i in range(len(entries) - 1):
+        if rng.random() < reorder:
+            entries[i], entries[i + 1] = entries[i + 1], entries[i]
+    return entries
+
+
+def _location(event):
+    detail = event.get('detail', {})
+    return detail.get('bucket', {}).get('name'), detail.get('object', {}).get('key')
+
+
+def final_state(entries):
+    # {(bucket, key): entry} of the event S3 ended up reflecting for every key
+    final = {}
+    for position, entry in enumerate(entries):
+        bucket, key = _location(entry['event'])
+        if not bucket or key is None:
+            continue
+        order = (normalize_sequencer(entry['event']['detail']['object'].get('sequencer')) or '', position)
+        if (bucket, key) not in final or order >= final[(bucket, key)][0]:
+            final[(bucket, key)] = (order, entry)
+    return {location: entry for location, (_, entry) in final.items()}
+
+
+def _is_create(entry):
+    return entry['event'].get('detail-type', '').startswith('Object Created')
+
+
+def stage_objects(s3, final):
+    buckets = {bucket for bucket, _ in final}
+    for bucket in sorted(buckets):
+        s3.create_bucket(Bucket=bucket)
+    for (bucket, key), entry in final.items():
+        if _is_create(entry):
+            content = entry['content'] if entry['content'] is not None else DEFAULT_CONTENT
+            s3.put_object(Bucket=bucket, Key=key, Body=content)
+
+
+def expected_latest(final):
+    # Creates of empty or folder-like objects end up in the skipped table, not latest
+    return {f"{bucket}/{key}" for (bucket, key), entry in final.items()
+            if _is_create(entry) and not key.endswith('/') and entry['content'] != b''}
+
+
+def percentiles(values, points=(50, 90, 99)):
+    # Nearest-rank percentiles in ms
+    if not values:
+        return None
+    ordered = sorted(values)
+    result = {f"p{point}": round(ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))], 3)
+              for point in points}
+    result['max'] = round(ordered[-1], 3)
+    return result
+
+
+class LocalStepFunctions:
+    # Stands in for the router's Step Functions client: every execution runs its single
+    # LambdaInvoke task on a pool sized like the Lambda concurrency. Latency runs from the
+    # moment the router received the SQS batch to the end of the execution
+    def __init__(self, handlers, workers):
+        self.handlers = handlers
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+        self.latencies = []
+        self.outcomes = Counter()
+        self.received_at = None
+        self._lock = threading.Lock()
+
+    def start_execution(self, stateMachineArn, input):
+        self.futures.append(self.pool.submit(self._execute, self.handlers[stateMachineArn],
+                                             json.loads(input), self.received_at))
+        return {'executionArn': f"{stateMachineArn}:local-{len(self.futures)}"}
+
+    def _execute(self, handler, payload, received_at):
+        events = payload['events'] if isinstance(payload, dict) and 'events' in payload else [payload]
+        try:
+            result = handler(payload, None)
+            statuses = [r.get('status', 'deleted') for r in result['results']] if result and 'results' in result \
+                else [(result or {}).get('status', 'deleted')]
+        except Exception as e:
+            # A failed execution is not retried, the SQS message was already deleted
+            print(f"Execution failed: {e}")
+            statuses = ['execution_failed'] * len(events)
+        elapsed = (time.perf_counter() - received_at) * 1000
+        with self._lock:
+            self.outcomes.update(statuses)
+            self.latencies.extend([elapsed] * len(events))
+
+    def drain(self):
+        wait(self.futures)
+        self.pool.shutdown()
+
+
+def _scan_all(table):
+    response = table.scan()
+    items = response['Items']
+    while 'LastEvaluatedKey' in response:
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        items.extend(response['Items'])
+    return items
+
+
+def table_states(dynamodb, include_items=True):
+    states = {}
+    for name in local_aws.TABLE_KEYS:
+        items = _scan_all(dynamodb.Table(name))
+        states[name] = {'count': len(items)}
+        if include_items:
+            states[name]['items'] = items
+    return states
+
+
+def replay(s3, dynamodb, entries, batch_size=ROUTER_BATCH_SIZE, workers=16,
+           delete_batch_size=ROUTER_DELETE_BATCH_SIZE, create_batch_size=ROUTER_CREATE_BATCH_SIZE,
+           include_items=True):
+    final = final_state(entries)
+    stage_objects(s3, final)
+    local_aws.create_tables(dynamodb)
+
+    metadata = local_aws.load_lambda('MetaData_lambda/metadata_extractor.py')
+    deletion = local_aws.load_lambda('Deletion_lambda/deletion_tracker.py')
+    router = local_aws.load_lambda('Router_lambda/event_router.py', {
+        'ROUTER_DISPATCH_MODE': 'standard',
+        'CREATED_SF_ARN': CREATED_ARN,
+        'DELETED_SF_ARN': DELETED_ARN,
+        'ROUTER_DELETE_BATCH_SIZE': str(delete_batch_size),
+        'ROUTER_CREATE_BATCH_SIZE': str(create_batch_size),
+    })
+    dispatcher = LocalStepFunctions({CREATED_ARN: metadata.metadata_handler, DELETED_ARN: deletion.handler},
+                                    workers)
+    router.sf_client = dispatcher
+
+    queue = [{'messageId': str(i), 'body': json.dumps(entry['event']), 'receives': 0}
+             for i, entry in enumerate(entries)]
+    redelivered = dead_lettered = 0
+    started = time.perf_counter()
+    while queue:
+        batch, queue = queue[:batch_size], queue[batch_size:]
+        for message in batch:
+            message['receives'] += 1
+        dispatcher.received_at = time.perf_counter()
+        response = router.handler({'Records': [{'messageId': m['messageId'], 'body': m['body']} for m in batch]},
+                                  None)
+        failed = {failure['itemIdentifier'] for failure in response['batchItemFailures']}
+        for message in batch:
+            if message['messageId'] not in failed:
+                continue
+            if message['receives'] >= MAX_RECEIVES:
+                dead_lettered += 1
+            else:
+                redelivered += 1
+                queue.append(message)
+    dispatcher.drain()
+    elapsed = time.perf_counter() - started
+
+    tables = table_states(dynamodb, include_items=include_items)
+    latest = {item['filepath'] for item in _scan_all(dynamodb.Table(LATEST_TABLE_NAME))}
+    expected = expected_latest(final)
+    return {
+        'events': len(entries),
+        'executions': len(dispatcher.futures),
+        'seconds': round(elapsed, 3),
+        'events_per_second': round(len(entries) / elapsed, 1) if elapsed else None,
+        'latency_ms': percentiles(dispatcher.latencies),
+        'outcomes': dict(dispatcher.outcomes),
+        'redelivered': redelivered,
+        'dead_lettered': dead_lettered,
+        'missing_from_latest': sorted(expected - latest),
+        'unexpected_in_latest': sorted(latest - expected),
+        'tables': tables,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay S3 events through the router and handlers locally")
+    parser.add_argument('events', nargs='?', help="JSONL file of captured events")
+    parser.add_argument('--synthetic', type=int, help="Generate this many events instead of reading a file")
+    parser.add_argument('--keys', type=int, default=100, help="Key space of --synthetic")
+    parser.add_argument('--duplicates', type=float, default=0.1, help="Share of --synthetic events redelivered")
+    parser.add_argument('--reorder', type=float, default=0.1, help="Share of --synthetic events swapped")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=ROUTER_BATCH_SIZE, help="SQS batch size")
+    parser.add_argument('--delete-batch-size', type=int, default=ROUTER_DELETE_BATCH_SIZE)
+    parser.add_argument('--create-batch-size', type=int, default=ROUTER_CREATE_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=16, help="Concurrent executions")
+    parser.add_argument('--output', help="Write the full report, including table items, as JSON")
+    parser.add_argument('--verbose', action='store_true', help="Show the handlers' own logging")
+    args = parser.parse_args(argv)
+    if not args.events and not args.synthetic:
+        parser.error("give an events file or --synthetic N")
+
+    if args.synthetic:
+        entries = synthetic_events(args.synthetic, keys=args.keys, duplicates=args.duplicates,
+                                   reorder=args.reorder, seed=args.seed)
+    else:
+        entries = read_events(args.events)
+
+    from moto import mock_aws
+    with local_aws.environment({'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'us-east-1')}), \
+            mock_aws():
+        s3 = boto3.client('s3')
+        dynamodb = boto3.resource('dynamodb')
+        logs = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with logs:
+            report = replay(s3, dynamodb, entries, batch_size=args.batch_size, workers=args.workers,
+                            delete_batch_size=args.delete_batch_size, create_batch_size=args.create_batch_size,
+                            include_items=bool(args.output))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    summary = {name: value for name, value in report.items() if name != 'tables'}
+    summary['tables'] = {name: state['count'] for name, state in report['tables'].items()}
+    print(json.dumps(summary, indent=2))
+    return 1 if report['missing_from_latest'] or report['unexpected_in_latest'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())